@@ -1,23 +1,41 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import func, text
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime, timedelta
 import json
 import base64
 import os
+import zlib
 
-from app.db.database import get_db
-from app.db.models import PowerReading, SolarInstallation
+from app.core.metrics import READINGS_INGESTED
+from app.db import aggregation_scheduler
+from app.db.database import get_db, get_read_db
+from app.db.energy import ENERGY_ENGINE, ENERGY_ENGINES, bucket_energies
+from app.db.reading_blocks import block_readings, latest_block_reading
+from app.db.models import DeploymentJob, PendingLease, PowerReading, PowerReadingAggregate, SolarInstallation
+from app.db.onchain import (
+    BATCH_FINALIZED,
+    apply_batch_confirmation,
+    apply_bulk_confirmations,
+    revert_batch_confirmation,
+)
+from app.blockchain.deployments import (
+    JOB_CONFIRMED,
+    deployments_enabled,
+    enqueue_deployment,
+    wake_deployment_workers,
+)
 from pydantic import BaseModel
 
-# Blockchain factory helper (lazy import to avoid circular deps during tests)
-try:
-    from app.blockchain.factory_client import deploy_logger_for_installation  # noqa: E402
-except Exception:
-    deploy_logger_for_installation = None  # type: ignore
-
 router = APIRouter()
 
+# How long a /readings/pending fetch reserves its range before it is handed out again
+PENDING_LEASE_SECONDS = int(os.getenv("PENDING_LEASE_SECONDS", "300"))
+# pg_advisory_xact_lock key serializing pending-range leases
+PENDING_LEASE_LOCK_ID = zlib.crc32(b"pending_leases")
+
 # Pydantic models for API requests/responses
 class InstallationCreate(BaseModel):
     name: str = "Hackathon Test 1"
@@ -89,7 +107,7 @@ def extract_shelly_mac(shelly_payload: str) -> str:
         return ""
 
 @router.get("/installations/", response_model=List[InstallationResponse])
-def get_installations(db: Session = Depends(get_db)):
+def get_installations(db: Session = Depends(get_read_db)):
     """Get all solar installations"""
     installations = db.query(SolarInstallation).filter(
         SolarInstallation.is_active == True
@@ -130,6 +148,57 @@ def get_installation(installation_id: int, db: Session = Depends(get_db)):
         deployment_tx_hash=installation.deployment_tx_hash
     )
 
+class DeploymentStatusResponse(BaseModel):
+    installation_id: int
+    status: str  # pending, sent, confirmed or failed
+    attempts: int
+    tx_hash: str | None
+    logger_contract_address: str | None
+    last_error: str | None
+    next_attempt_at: datetime | None
+    updated_at: datetime | None
+
+def _deployment_status(db: Session, installation: SolarInstallation) -> Optional[str]:
+    """Status of the installation's logger deployment (None if none was requested)"""
+    job = db.query(DeploymentJob).filter(DeploymentJob.installation_id == installation.id).first()
+    if job:
+        return job.status
+    return JOB_CONFIRMED if installation.logger_contract_address else None
+
+@router.get("/installations/{installation_id}/deployment", response_model=DeploymentStatusResponse)
+def get_installation_deployment(installation_id: int, db: Session = Depends(get_db)):
+    """Poll the background logger deployment of an installation"""
+    installation = db.query(SolarInstallation).filter(SolarInstallation.id == installation_id).first()
+    if not installation:
+        raise HTTPException(status_code=404, detail="Installation not found")
+
+    job = db.query(DeploymentJob).filter(DeploymentJob.installation_id == installation_id).first()
+    if not job:
+        if not installation.logger_contract_address:
+            raise HTTPException(status_code=404, detail="No logger deployment for this installation")
+        # Deployed before deployment jobs existed (or set manually)
+        return DeploymentStatusResponse(
+            installation_id=installation.id,
+            status=JOB_CONFIRMED,
+            attempts=0,
+            tx_hash=installation.deployment_tx_hash,
+            logger_contract_address=installation.logger_contract_address,
+            last_error=None,
+            next_attempt_at=None,
+            updated_at=None,
+        )
+
+    return DeploymentStatusResponse(
+        installation_id=installation.id,
+        status=job.status,
+        attempts=job.attempts or 0,
+        tx_hash=job.tx_hash,
+        logger_contract_address=job.logger_contract_address,
+        last_error=job.last_error,
+        next_attempt_at=job.next_attempt_at,
+        updated_at=job.updated_at,
+    )
+
 class InstallationUpdate(BaseModel):
     logger_contract_address: str = None
     deployment_tx_hash: str = None
@@ -165,6 +234,51 @@ def update_installation(installation_id: int, update: InstallationUpdate, db: Se
         deployment_tx_hash=installation.deployment_tx_hash
     )
 
+class LoggerDeploymentRecord(BaseModel):
+    installation_id: int
+    logger_contract_address: str
+    # None when the logger was found in the factory rather than deployed by this run
+    deployment_tx_hash: str | None = None
+
+class BulkDeploymentUpdateRequest(BaseModel):
+    deployments: List[LoggerDeploymentRecord]
+
+@router.post("/installations/deployments/bulk")
+def record_logger_deployments_bulk(request: BulkDeploymentUpdateRequest, db: Session = Depends(get_db)):
+    """Record loggers deployed outside the backend (fleet provisioning) in one transaction"""
+    records = {record.installation_id: record for record in request.deployments}
+    installations = db.query(SolarInstallation).filter(SolarInstallation.id.in_(records)).all() if records else []
+    jobs = {
+        job.installation_id: job
+        for job in db.query(DeploymentJob).filter(DeploymentJob.installation_id.in_(records))
+    } if records else {}
+
+    for installation in installations:
+        record = records[installation.id]
+        installation.logger_contract_address = record.logger_contract_address
+        if record.deployment_tx_hash is not None:
+            installation.deployment_tx_hash = record.deployment_tx_hash
+        # Stop background workers from deploying a second logger
+        job = jobs.get(installation.id)
+        if job is not None:
+            job.status = JOB_CONFIRMED
+            if record.deployment_tx_hash is not None:
+                job.tx_hash = record.deployment_tx_hash
+            job.logger_contract_address = record.logger_contract_address
+            job.last_error = None
+
+    try:
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    found = {installation.id for installation in installations}
+    return {
+        "updated_count": len(found),
+        "missing_installation_ids": sorted(set(records) - found),
+    }
+
 @router.post("/installations/")
 def create_installation(installation: InstallationCreate, db: Session = Depends(get_db)):
     """Create a new solar installation (called once at ESP32 startup)"""
@@ -191,9 +305,16 @@ def create_installation(installation: InstallationCreate, db: Session = Depends(
         existing.shelly_mac = shelly_mac
         if installation.boot_timestamp:
             existing.last_boot_timestamp = installation.boot_timestamp
+
+        # Retry a logger deployment that never completed
+        job = None
+        if not existing.logger_contract_address and deployments_enabled():
+            job = enqueue_deployment(db, existing)
         
         db.commit()
         db.refresh(existing)
+        if job is not None:
+            wake_deployment_workers()
         return {
             "id": existing.id,
             "name": existing.name,
@@ -203,7 +324,8 @@ def create_installation(installation: InstallationCreate, db: Session = Depends(
             "created_at": existing.created_at,
             "is_active": existing.is_active,
             "logger_contract_address": existing.logger_contract_address,
-            "deployment_tx_hash": existing.deployment_tx_hash
+            "deployment_tx_hash": existing.deployment_tx_hash,
+            "deployment_status": job.status if job is not None else _deployment_status(db, existing),
         }
     
     # Create new installation
@@ -219,29 +341,13 @@ def create_installation(installation: InstallationCreate, db: Session = Depends(
         db.add(db_installation)
         db.flush()  # Get auto-generated ID without committing
 
-        # ===== Deploy on-chain logger via factory if helper available =====
-        logger_addr: Optional[str] = None
-        deploy_tx: Optional[str] = None
-        if deploy_logger_for_installation:
-            try:
-                if os.getenv("DISABLE_FACTORY", "0") == "1":
-                    raise RuntimeError("Factory disabled via env")
-                logger_addr, deploy_tx = deploy_logger_for_installation(
-                    installation_id=db_installation.id,
-                    name=db_installation.name,
-                    shelly_mac=db_installation.shelly_mac,
-                    public_key=db_installation.public_key,
-                    created_at=int(db_installation.created_at.timestamp()),
-                    is_active=db_installation.is_active,
-                )
-                db_installation.logger_contract_address = logger_addr
-                db_installation.deployment_tx_hash = deploy_tx
-            except Exception as e:
-                print(f"Factory deployment failed: {e}")
-                # Decide whether to abort or continue; for now, continue without rollback
+        # ===== Queue on-chain logger deployment; workers send and confirm it =====
+        job = enqueue_deployment(db, db_installation) if deployments_enabled() else None
 
         db.commit()
         db.refresh(db_installation)
+        if job is not None:
+            wake_deployment_workers()
         print(f"Successfully created installation: {db_installation.id}")
         return {
             "id": db_installation.id,
@@ -252,7 +358,8 @@ def create_installation(installation: InstallationCreate, db: Session = Depends(
             "created_at": db_installation.created_at,
             "is_active": db_installation.is_active,
             "logger_contract_address": db_installation.logger_contract_address,
-            "deployment_tx_hash": db_installation.deployment_tx_hash
+            "deployment_tx_hash": db_installation.deployment_tx_hash,
+            "deployment_status": job.status if job is not None else None,
         }
     except Exception as e:
         db.rollback()
@@ -261,7 +368,11 @@ def create_installation(installation: InstallationCreate, db: Session = Depends(
 @router.post("/readings/")
 def create_power_reading(reading: PowerReadingCreate, db: Session = Depends(get_db)):
     """Create a new power reading (called every 10 seconds by ESP32)"""
-    
+    return store_power_reading(db, reading)
+
+# Endpoint bodies shared with the async routes (power_async.py runs them through AsyncSession.run_sync)
+def store_power_reading(db: Session, reading: PowerReadingCreate) -> dict:
+    """Store one signed reading for the installation owning the ShellyEM in its payload"""
     # Extract ShellyEM MAC address to find the installation
     shelly_mac = extract_shelly_mac(reading.shelly_payload)
     
@@ -296,6 +407,7 @@ def create_power_reading(reading: PowerReadingCreate, db: Session = Depends(get_
     db.add(db_reading)
     db.commit()
     db.refresh(db_reading)
+    READINGS_INGESTED.labels(str(db_reading.installation_id)).inc()
     
     # TODO: Submit to blockchain
     # This would involve:
@@ -324,56 +436,128 @@ class BlockchainUpdateRequest(BaseModel):
     last_reading_id: int   # Last reading ID in the range to mark as on-chain
     blockchain_tx_hash: str  # Transaction hash from the blockchain
     blockchain_block_number: int = None  # Optional block number
+    merkle_root: str = None  # Optional merkle root from the BatchProcessed event
+    finalized: bool = True  # False while the block is shallower than the listener's confirmation depth
+    removed: bool = False  # True if a reorg dropped the transaction (reverts a pending batch)
+    installation_id: Optional[int] = None  # Installation of the emitting logger; only its readings are marked
 
 class PendingReadingsResponse(BaseModel):
     readings: List[List]  # Array of arrays: [id, power_w, total_wh, timestamp, signature]
-    first_reading_id: int = None  # First reading ID in the batch
-    last_reading_id: int = None   # Last reading ID in the batch
+    first_reading_id: Optional[int] = None  # First reading ID in the batch
+    last_reading_id: Optional[int] = None   # Last reading ID in the batch
     count: int  # Total number of pending readings
+    lease_id: Optional[int] = None  # Lease reserving this range for the caller
+    lease_expires_at: Optional[datetime] = None  # When the range is handed out again if not confirmed
 
 @router.get("/readings/pending", response_model=PendingReadingsResponse)
-def get_pending_readings(db: Session = Depends(get_db)):
-    """
-    Get all power readings that haven't been saved on-chain yet.
-    Returns readings data plus metadata about the range for batch processing.
-    """
-    # Query for readings that are verified but not yet on-chain
-    readings = db.query(PowerReading).filter(
-        PowerReading.is_verified == True,
-        PowerReading.is_on_chain == False
-    ).order_by(PowerReading.id.asc()).all()  # Order by ID for consistent range
-    
+def get_pending_readings(
+    limit: int = None,
+    lease_seconds: int = PENDING_LEASE_SECONDS,
+    lease_key: str = None,
+    db: Session = Depends(get_db)
+):
+    """Get power readings that haven't been saved on-chain yet (see lease_pending_readings)"""
+    return lease_pending_readings(db, limit, lease_seconds, lease_key)
+
+def _pending_response(readings: List[PowerReading], lease: Optional[PendingLease]) -> PendingReadingsResponse:
     if not readings:
-        return PendingReadingsResponse(
-            readings=[],
-            first_reading_id=None,
-            last_reading_id=None,
-            count=0
-        )
-    
+        return PendingReadingsResponse(readings=[], first_reading_id=None, last_reading_id=None, count=0)
     # Convert to array of arrays format
-    result = []
-    for reading in readings:
-        result.append([
-            reading.id,
-            reading.power_w,
-            reading.total_wh,
-            reading.timestamp,
-            reading.signature
-        ])
-    
+    result = [
+        [reading.id, reading.power_w, reading.total_wh, reading.timestamp, reading.signature]
+        for reading in readings
+    ]
     return PendingReadingsResponse(
         readings=result,
-        first_reading_id=readings[0].id,
-        last_reading_id=readings[-1].id,
-        count=len(readings)
+        first_reading_id=result[0][0],
+        last_reading_id=result[-1][0],
+        count=len(result),
+        lease_id=lease.id if lease else None,
+        lease_expires_at=lease.expires_at if lease else None
     )
 
+def lease_pending_readings(db: Session, limit: Optional[int], lease_seconds: int,
+                           lease_key: Optional[str] = None) -> PendingReadingsResponse:
+    """
+    Get power readings that haven't been saved on-chain yet and aren't leased by another fetch.
+    Returns a contiguous ID range and reserves it with a lease, so concurrent oracle
+    requests walk through the backlog instead of receiving the same rows again.
+
+    Every DON node runs the Functions source and fetches on its own, so the source passes
+    the same lease_key on all of them: the first fetch takes the lease, later fetches with
+    that key get the same range back. Pass lease_seconds=0 to peek without reserving.
+    """
+    now = datetime.utcnow()
+
+    if lease_seconds > 0 and db.get_bind().dialect.name == "postgresql":
+        # One lease at a time: each statement below then sees every lease committed before it,
+        # which row locks alone do not give under READ COMMITTED
+        db.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": PENDING_LEASE_LOCK_ID})
+
+    if lease_key and lease_seconds > 0:
+        # An expired lease is dropped below and its key leased afresh
+        lease = db.query(PendingLease).filter(
+            PendingLease.lease_key == lease_key,
+            PendingLease.expires_at > now
+        ).first()
+        if lease is not None:
+            readings = db.query(PowerReading).filter(
+                PowerReading.is_verified == True,
+                PowerReading.id.between(lease.first_reading_id, lease.last_reading_id)
+            ).order_by(PowerReading.id.asc()).all()
+            db.commit()
+            return _pending_response(readings, lease)
+
+    # Drop leases that ran out; their ranges become pending again
+    db.query(PendingLease).filter(PendingLease.expires_at <= now).delete(synchronize_session=False)
+
+    active_lease = db.query(PendingLease.id).filter(
+        PendingLease.expires_at > now,
+        PowerReading.id.between(PendingLease.first_reading_id, PendingLease.last_reading_id)
+    ).exists()
+
+    query = db.query(PowerReading).filter(
+        PowerReading.is_verified == True,
+        PowerReading.is_on_chain == False,
+        ~active_lease
+    ).order_by(PowerReading.id.asc())  # Order by ID for consistent range
+    if limit:
+        query = query.limit(limit)
+    readings = query.all()
+
+    if readings:
+        # Stop before the next leased range so the returned IDs stay contiguous
+        next_lease_start = db.query(func.min(PendingLease.first_reading_id)).filter(
+            PendingLease.expires_at > now,
+            PendingLease.first_reading_id > readings[0].id
+        ).scalar()
+        if next_lease_start is not None:
+            readings = [r for r in readings if r.id < next_lease_start]
+
+    lease = None
+    if readings and lease_seconds > 0:
+        lease = PendingLease(
+            lease_key=lease_key,
+            first_reading_id=readings[0].id,
+            last_reading_id=readings[-1].id,
+            expires_at=now + timedelta(seconds=lease_seconds)
+        )
+        db.add(lease)
+    try:
+        db.commit()
+    except IntegrityError:
+        if not lease_key:
+            raise
+        # Another node of the same request took the lease first: answer with its range
+        db.rollback()
+        return lease_pending_readings(db, limit, lease_seconds, lease_key)
+    return _pending_response(readings, lease)
+
 @router.post("/readings/mark-on-chain")
 def mark_readings_on_chain(request: BlockchainUpdateRequest, db: Session = Depends(get_db)):
     """
     Mark readings as saved on-chain and store the transaction hash.
-    Updates is_on_chain to true and saves blockchain_tx_hash for readings in the specified range.
+    Records the batch in onchain_batches and links every reading in the range to it.
     """
     if not request.blockchain_tx_hash:
         raise HTTPException(status_code=400, detail="Transaction hash is required")
@@ -381,51 +565,85 @@ def mark_readings_on_chain(request: BlockchainUpdateRequest, db: Session = Depen
     if request.first_reading_id > request.last_reading_id:
         raise HTTPException(status_code=400, detail="First reading ID must be less than or equal to last reading ID")
     
-    # Find all readings in the specified range that are verified but not on-chain
-    readings = db.query(PowerReading).filter(
-        PowerReading.id >= request.first_reading_id,
-        PowerReading.id <= request.last_reading_id,
-        PowerReading.is_verified == True,
-        PowerReading.is_on_chain == False
-    ).all()
-    
-    if not readings:
-        raise HTTPException(
-            status_code=404, 
-            detail=f"No verified, non-blockchain readings found in range {request.first_reading_id}-{request.last_reading_id}"
-        )
-    
-    # Update all readings in the range
-    updated_count = 0
-    updated_ids = []
-    for reading in readings:
-        reading.is_on_chain = True
-        reading.blockchain_tx_hash = request.blockchain_tx_hash
-        if request.blockchain_block_number:
-            reading.blockchain_block_number = request.blockchain_block_number
-        updated_count += 1
-        updated_ids.append(reading.id)
-    
     try:
+        if request.removed:
+            previous_status, reverted_count = revert_batch_confirmation(db, request.blockchain_tx_hash)
+            if previous_status is None:
+                raise HTTPException(status_code=404, detail=f"No batch found for transaction {request.blockchain_tx_hash}")
+            if previous_status == BATCH_FINALIZED:
+                raise HTTPException(status_code=409, detail="Finalized batches cannot be reverted")
+            db.commit()
+            return {
+                "message": f"Reverted {reverted_count} readings to pending",
+                "range": f"{request.first_reading_id}-{request.last_reading_id}",
+                "updated_count": reverted_count,
+                "blockchain_tx_hash": request.blockchain_tx_hash
+            }
+        
+        batch, updated_count, promoted = apply_batch_confirmation(
+            db,
+            first_reading_id=request.first_reading_id,
+            last_reading_id=request.last_reading_id,
+            blockchain_tx_hash=request.blockchain_tx_hash,
+            blockchain_block_number=request.blockchain_block_number,
+            merkle_root=request.merkle_root,
+            finalized=request.finalized,
+            installation_id=request.installation_id,
+        )
+        
+        if updated_count == 0 and not promoted:
+            db.rollback()
+            raise HTTPException(
+                status_code=404, 
+                detail=f"No verified, non-blockchain readings found in range {request.first_reading_id}-{request.last_reading_id}"
+            )
+        
         db.commit()
         return {
             "message": f"Successfully marked {updated_count} readings as on-chain",
             "range": f"{request.first_reading_id}-{request.last_reading_id}",
-            "updated_reading_ids": updated_ids,
+            "updated_count": updated_count,
+            "batch_id": batch.id,
+            "batch_status": batch.status,
             "blockchain_tx_hash": request.blockchain_tx_hash,
             "blockchain_block_number": request.blockchain_block_number
         }
+    except HTTPException:
+        raise
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+class BulkBlockchainUpdateRequest(BaseModel):
+    batches: List[BlockchainUpdateRequest]  # Confirmations coalesced by the listener
+
+@router.post("/readings/mark-on-chain/bulk")
+def mark_readings_on_chain_bulk(request: BulkBlockchainUpdateRequest, db: Session = Depends(get_db)):
+    """
+    Mark many on-chain batches in one transaction.
+    Each batch gets its own status instead of failing the whole request, so the listener
+    can drop confirmations that were already applied or can never apply.
+    """
+    try:
+        results, total_updated = apply_bulk_confirmations(db, [item.dict() for item in request.batches])
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    
+    return {
+        "message": f"Successfully marked {total_updated} readings as on-chain in {len(request.batches)} batches",
+        "updated_count": total_updated,
+        "results": results
+    }
+
 @router.get("/readings/{installation_id}", response_model=List[PowerReadingResponse])
 def get_power_readings(
     installation_id: int,
     start_time: datetime = None,
     end_time: datetime = None,
     verified_only: bool = True,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get power readings for a specific installation"""
     # Set default time range if not provided
@@ -453,13 +671,24 @@ def get_power_readings(
     readings = query.order_by(PowerReading.timestamp.desc()).all()
     
     # Convert SQLAlchemy objects to Pydantic models
-    return [PowerReadingResponse.from_orm(reading) for reading in readings]
+    return _with_sealed_readings(
+        [PowerReadingResponse.from_orm(reading) for reading in readings],
+        block_readings(db, installation_id, start_timestamp, end_timestamp, verified_only),
+    )
+
+def _with_sealed_readings(responses: List[PowerReadingResponse], sealed: List[dict]) -> List[PowerReadingResponse]:
+    """Merge readings decoded from reading blocks into row results, newest first"""
+    if not sealed:
+        return responses
+    responses += [PowerReadingResponse(**reading) for reading in sealed]
+    responses.sort(key=lambda r: r.timestamp, reverse=True)
+    return responses
 
 @router.get("/readings/{installation_id}/all", response_model=List[PowerReadingResponse])
 def get_all_power_readings(
     installation_id: int,
     verified_only: bool = True,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get ALL power readings for a specific installation (for lifetime calculations)"""
     
@@ -476,7 +705,10 @@ def get_all_power_readings(
     readings = query.order_by(PowerReading.timestamp.desc()).all()
     
     # Convert SQLAlchemy objects to Pydantic models
-    return [PowerReadingResponse.from_orm(reading) for reading in readings]
+    return _with_sealed_readings(
+        [PowerReadingResponse.from_orm(reading) for reading in readings],
+        block_readings(db, installation_id, verified_only=verified_only),
+    )
 
 @router.get("/readings/latest/{installation_id}", response_model=PowerReadingResponse)
 def get_latest_reading(
@@ -485,6 +717,10 @@ def get_latest_reading(
     db: Session = Depends(get_db)
 ):
     """Get the latest power reading for a specific installation"""
+    return latest_power_reading(db, installation_id, verified_only)
+
+def latest_power_reading(db: Session, installation_id: int, verified_only: bool) -> PowerReadingResponse:
+    """Most recently received reading, falling back to sealed reading blocks"""
     # Build query
     query = db.query(PowerReading).filter(
         PowerReading.installation_id == installation_id
@@ -498,6 +734,10 @@ def get_latest_reading(
     reading = query.order_by(PowerReading.created_at.desc()).first()
     
     if not reading:
+        # Every raw row may already be sealed into reading blocks
+        sealed = latest_block_reading(db, installation_id, verified_only)
+        if sealed:
+            return PowerReadingResponse(**sealed)
         raise HTTPException(status_code=404, detail="No readings found for this installation")
     
     return PowerReadingResponse.from_orm(reading)
@@ -507,6 +747,7 @@ class ChartDataPoint(BaseModel):
     label: str  # Time label (e.g., "14:00", "Mon", "Jan")
     value: float  # Energy production in Wh
     timestamp: int  # Unix timestamp for sorting
+    trapezoid_value: Optional[float] = None  # Power-integrated energy, energy_engine=crosscheck only
 
 class ChartDataResponse(BaseModel):
     data_points: List[ChartDataPoint]
@@ -518,9 +759,15 @@ def get_chart_data(
     installation_id: int,
     time_frame: str = "week",  # hour, day, week, month, year
     verified_only: bool = True,
-    db: Session = Depends(get_db)
+    energy_engine: Optional[str] = None,  # counter, trapezoid or crosscheck (default: ENERGY_ENGINE)
+    db: Session = Depends(get_read_db)
 ):
     """Get aggregated chart data for a specific installation and time frame"""
+    return chart_data(db, installation_id, time_frame, verified_only, energy_engine)
+
+def chart_data(db: Session, installation_id: int, time_frame: str, verified_only: bool,
+               energy_engine: Optional[str]) -> ChartDataResponse:
+    """Energy per bucket over the time frame ending at the installation's latest reading"""
     
     # First, get the latest reading to use as the reference point
     latest_reading_query = db.query(PowerReading).filter(
@@ -584,121 +831,55 @@ def get_chart_data(
         raise HTTPException(status_code=400, detail="Invalid time frame. Use: hour, day, week, month, year")
     
     end_timestamp = reference_timestamp
-    
-    # Get readings in the time range
-    query = db.query(PowerReading).filter(
-        PowerReading.installation_id == installation_id,
-        PowerReading.timestamp >= start_timestamp,
-        PowerReading.timestamp <= end_timestamp
-    )
-    
-    if verified_only:
-        query = query.filter(PowerReading.is_verified == True)
-    
-    readings = query.order_by(PowerReading.timestamp.asc()).all()
-    
-    # Group readings by time intervals and calculate energy production
-    data_points = []
-    total_energy = 0.0
-    
-    # Only create buckets if we have readings data to avoid phantom historical data
-    if not readings:
-        return ChartDataResponse(
-            data_points=[],
-            time_frame=time_frame,
-            total_energy=0.0
-        )
-    
-    # Find the earliest reading to determine when the system actually started
-    first_reading_time = min(r.timestamp for r in readings)
-    
-    # Handle year view with proper month boundaries
+
+    # Bucket edges: [edges[i], edges[i+1]) per data point
+    edges = []
+    labels = []
     if time_frame == "year":
-        # Create month buckets with proper boundaries
+        # Month buckets with proper boundaries
         reference_dt = datetime.utcfromtimestamp(reference_timestamp)
-        start_dt = datetime.utcfromtimestamp(start_timestamp)
-        
-        current_dt = start_dt
+        current_dt = datetime.utcfromtimestamp(start_timestamp)
         while current_dt <= reference_dt:
-            # Calculate month boundaries
-            current_time = int(current_dt.timestamp())
-            
+            edges.append(int(current_dt.timestamp()))
+            labels.append(current_dt.strftime(label_format))
             # Next month
             if current_dt.month == 12:
-                next_dt = datetime(current_dt.year + 1, 1, 1)
+                current_dt = datetime(current_dt.year + 1, 1, 1)
             else:
-                next_dt = datetime(current_dt.year, current_dt.month + 1, 1)
-            
-            bucket_end = min(int(next_dt.timestamp()), end_timestamp)
-            
-            # Find readings in this month bucket
-            bucket_readings = [
-                r for r in readings 
-                if current_time <= r.timestamp < bucket_end
-            ]
-            
-            bucket_energy = 0.0
-            if len(bucket_readings) >= 2:
-                for i in range(1, len(bucket_readings)):
-                    current_reading = bucket_readings[i]
-                    previous_reading = bucket_readings[i-1]
-                    time_diff_hours = (current_reading.timestamp - previous_reading.timestamp) / 3600
-                    average_power = (current_reading.power_w + previous_reading.power_w) / 2
-                    energy = average_power * time_diff_hours
-                    bucket_energy += abs(energy)
-                
-                total_energy += bucket_energy
-            
-            # Create label for this bucket
-            label = current_dt.strftime(label_format)
-            
-            data_points.append(ChartDataPoint(
-                label=label,
-                value=bucket_energy,
-                timestamp=current_time
-            ))
-            
-            # Move to next month
-            current_dt = next_dt
+                current_dt = datetime(current_dt.year, current_dt.month + 1, 1)
     else:
-        # Handle other time frames with fixed intervals
         current_time = start_timestamp
         while current_time < end_timestamp:
-            bucket_end = min(current_time + interval_seconds, end_timestamp)
-            
-            # Find readings in this time bucket
-            bucket_readings = [
-                r for r in readings 
-                if current_time <= r.timestamp < bucket_end
-            ]
-            
-            bucket_energy = 0.0
-            if len(bucket_readings) >= 2:
-                for i in range(1, len(bucket_readings)):
-                    current_reading = bucket_readings[i]
-                    previous_reading = bucket_readings[i-1]
-                    time_diff_hours = (current_reading.timestamp - previous_reading.timestamp) / 3600
-                    average_power = (current_reading.power_w + previous_reading.power_w) / 2
-                    energy = average_power * time_diff_hours
-                    bucket_energy += abs(energy)
-                
-                total_energy += bucket_energy
-            
-            # Create label for this bucket
-            bucket_time = datetime.fromtimestamp(current_time)
-            label = bucket_time.strftime(label_format)
-            
-            data_points.append(ChartDataPoint(
-                label=label,
-                value=bucket_energy,
-                timestamp=current_time
-            ))
-            current_time = bucket_end
-    
+            edges.append(current_time)
+            labels.append(datetime.fromtimestamp(current_time).strftime(label_format))
+            current_time += interval_seconds
+    edges.append(end_timestamp)
+
+    engine = energy_engine or ENERGY_ENGINE
+    if engine not in ENERGY_ENGINES:
+        raise HTTPException(status_code=400, detail=f"Invalid energy engine. Use: {', '.join(ENERGY_ENGINES)}")
+    installation = db.query(SolarInstallation).filter(SolarInstallation.id == installation_id).first()
+    energies, checks = bucket_energies(
+        db, installation_id, edges,
+        boot_timestamp=installation.last_boot_timestamp if installation else None,
+        verified_only=verified_only,
+        engine=engine,
+    )
+
+    data_points = [
+        ChartDataPoint(
+            label=label,
+            value=energy,
+            timestamp=bucket_start,
+            trapezoid_value=checks[i] if checks is not None else None,
+        )
+        for i, (label, energy, bucket_start) in enumerate(zip(labels, energies, edges))
+    ]
+
     return ChartDataResponse(
         data_points=data_points,
         time_frame=time_frame,
-        total_energy=total_energy
+        total_energy=sum(energies)
     )
 
 @router.get("/readings/{installation_id}/optimized", response_model=List[PowerReadingResponse])
@@ -708,7 +889,7 @@ def get_optimized_readings(
     end_time: datetime = None,
     max_points: int = 1000,
     verified_only: bool = True,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get optimized readings using aggregates when available, raw readings when recent"""
     # Set default time range if not provided
@@ -780,4 +961,39 @@ def get_optimized_readings(
         for reading in raw_readings:
             results.append(PowerReadingResponse.from_orm(reading))
     
-    return results 
\ No newline at end of file
+    return results
+
+
+class AggregationLagEntry(BaseModel):
+    installation_id: int
+    last_bucket: int | None       # Last 10-minute bucket aggregated by the scheduler
+    lag_seconds: int | None       # Seconds since the end of that bucket (at least 24h by design)
+    backlog_readings: int         # Eligible readings after the watermark
+
+class AggregationLagResponse(BaseModel):
+    enabled: bool
+    engine: str
+    interval_seconds: float
+    last_tick_at: datetime | None
+    last_tick_seconds: float | None
+    last_tick_readings: int
+    last_error: str | None
+    max_lag_seconds: int | None
+    installations: List[AggregationLagEntry]
+
+@router.get("/aggregation/lag", response_model=AggregationLagResponse)
+def get_aggregation_lag(db: Session = Depends(get_db)):
+    """How far the background aggregation scheduler is behind, per installation"""
+    installations = [AggregationLagEntry(**entry) for entry in aggregation_scheduler.aggregation_lag(db)]
+    lags = [entry.lag_seconds for entry in installations if entry.lag_seconds is not None]
+    return AggregationLagResponse(
+        enabled=aggregation_scheduler.AGGREGATION_SCHEDULER,
+        engine=aggregation_scheduler.AGGREGATION_SCHEDULER_ENGINE,
+        interval_seconds=aggregation_scheduler.AGGREGATION_INTERVAL_SECONDS,
+        last_tick_at=aggregation_scheduler.status["last_tick_at"],
+        last_tick_seconds=aggregation_scheduler.status["last_tick_seconds"],
+        last_tick_readings=aggregation_scheduler.status["last_tick_readings"],
+        last_error=aggregation_scheduler.status["last_error"],
+        max_lag_seconds=max(lags) if lags else None,
+        installations=installations,
+    )
@@ -0,0 +1,65 @@
+"""Async versions of the hot power endpoints, included ahead of power.router when API_DB_MODE=async.
+
+Each route runs the same body as its sync twin in power.py through
+AsyncSession.run_sync: the ORM code is unchanged, but every query is awaited
+on the event loop instead of blocking one of Starlette's worker threads, so
+slow chart queries no longer starve ingest of threads.
+"""
+from typing import Optional
+
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.endpoints.power import (
+    PENDING_LEASE_SECONDS,
+    ChartDataResponse,
+    PendingReadingsResponse,
+    PowerReadingCreate,
+    PowerReadingResponse,
+    chart_data,
+    latest_power_reading,
+    lease_pending_readings,
+    store_power_reading,
+)
+from app.db.async_database import get_async_db, get_async_read_db
+
+router = APIRouter()
+
+
+@router.post("/readings/")
+async def create_power_reading(reading: PowerReadingCreate, db: AsyncSession = Depends(get_async_db)):
+    """Create a new power reading (called every 10 seconds by ESP32)"""
+    return await db.run_sync(store_power_reading, reading)
+
+
+@router.get("/readings/pending", response_model=PendingReadingsResponse)
+async def get_pending_readings(
+    limit: int = None,
+    lease_seconds: int = PENDING_LEASE_SECONDS,
+    lease_key: str = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Get power readings that haven't been saved on-chain yet (see lease_pending_readings)"""
+    return await db.run_sync(lease_pending_readings, limit, lease_seconds, lease_key)
+
+
+@router.get("/readings/latest/{installation_id}", response_model=PowerReadingResponse)
+async def get_latest_reading(
+    installation_id: int,
+    verified_only: bool = True,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Get the latest power reading for a specific installation"""
+    return await db.run_sync(latest_power_reading, installation_id, verified_only)
+
+
+@router.get("/readings/{installation_id}/chart", response_model=ChartDataResponse)
+async def get_chart_data(
+    installation_id: int,
+    time_frame: str = "week",  # hour, day, week, month, year
+    verified_only: bool = True,
+    energy_engine: Optional[str] = None,  # counter, trapezoid or crosscheck (default: ENERGY_ENGINE)
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    """Get aggregated chart data for a specific installation and time frame"""
+    return await db.run_sync(chart_data, installation_id, time_frame, verified_only, energy_engine)
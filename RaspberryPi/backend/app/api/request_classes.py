@@ -0,0 +1,174 @@
+"""Request classes: per-class concurrency limits and load shedding for the API.
+
+Every /api/ request is put in a class (ingest > latest > charts > exports,
+plus "other" for the rest) and must take one of its class's slots before the
+route runs. Starlette runs all sync routes on one shared thread pool, so the
+slots act as the per-class executors: start_request_classes() sizes that pool to the
+sum of all class limits, so a slot always has a thread waiting for it. A
+class can never take more threads than its own limit.
+
+A class with a queue limit sheds load: once that many requests are waiting,
+or a request has waited REQUEST_QUEUE_TIMEOUT_SECONDS, the client gets a 503
+with Retry-After. Ingest has no queue limit. Its reserved slots are never
+used by other classes, so ESP32 posts only ever wait on each other.
+"""
+import asyncio
+import json
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+from anyio import to_thread
+
+from app.core.config import settings
+from app.core.metrics import REQUEST_CLASS_ACTIVE, REQUEST_CLASS_QUEUED, REQUEST_CLASS_SHED
+
+# Spare threads for routes outside /api/ (health, readiness, metrics), which are never limited
+SPARE_THREADS = 4
+
+# (method, path pattern, class); first match wins, unmatched /api/ requests are "other"
+ROUTES: List[Tuple[str, "re.Pattern", str]] = [
+    ("POST", re.compile(r"^/api/v1/readings/$"), "ingest"),
+    ("GET", re.compile(r"^/api/v1/readings/pending$"), "ingest"),
+    ("POST", re.compile(r"^/api/v1/readings/mark-on-chain(/bulk)?$"), "ingest"),
+    ("GET", re.compile(r"^/api/v1/readings/latest/\d+$"), "latest"),
+    ("GET", re.compile(r"^/api/v1/readings/\d+/all$"), "exports"),
+    ("GET", re.compile(r"^/api/v1/readings/\d+(/chart|/optimized)?$"), "charts"),
+]
+
+
+class RequestClass:
+    def __init__(self, name: str, concurrency: int, max_queue: int = 0):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = max_queue  # 0: never shed
+        self.slots = asyncio.Semaphore(concurrency)
+        self.active = 0
+        self.queued = 0
+        self.admitted = 0
+        self.shed = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "wait_seconds_total": self.wait_seconds_total,
+            "wait_seconds_max": self.wait_seconds_max,
+            "wait_seconds_avg": self.wait_seconds_total / self.admitted if self.admitted else 0.0,
+        }
+
+
+def parse_request_classes(spec: str) -> Dict[str, RequestClass]:
+    """"ingest=16,charts=4:16" -> classes with concurrency[:max_queue]"""
+    classes = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, limits = item.partition("=")
+        concurrency, _, max_queue = limits.partition(":")
+        classes[name.strip()] = RequestClass(name.strip(), int(concurrency), int(max_queue or 0))
+    if "other" not in classes:
+        raise ValueError("REQUEST_CLASSES must define an 'other' class")
+    return classes
+
+
+request_classes = parse_request_classes(settings.REQUEST_CLASSES)
+
+
+def classify(method: str, path: str, classes: Dict[str, RequestClass] = None) -> Optional[RequestClass]:
+    """Class of a request, or None for routes outside /api/"""
+    classes = classes or request_classes
+    if not path.startswith("/api/"):
+        return None
+    for route_method, pattern, name in ROUTES:
+        if method == route_method and pattern.match(path) and name in classes:
+            return classes[name]
+    return classes["other"]
+
+
+def request_class_stats(classes: Dict[str, RequestClass] = None) -> Dict[str, dict]:
+    return {name: request_class.stats() for name, request_class in (classes or request_classes).items()}
+
+
+async def start_request_classes(classes: Dict[str, RequestClass] = None) -> None:
+    """Startup hook: fresh slots for this event loop and a pool thread for every slot"""
+    classes = classes or request_classes
+    for request_class in classes.values():
+        request_class.slots = asyncio.Semaphore(request_class.concurrency)
+    limiter = to_thread.current_default_thread_limiter()
+    limiter.total_tokens = max(
+        limiter.total_tokens,
+        sum(request_class.concurrency for request_class in classes.values()) + SPARE_THREADS,
+    )
+
+
+class RequestClassMiddleware:
+    """ASGI middleware admitting each request through its class's slots"""
+
+    def __init__(self, app, classes: Dict[str, RequestClass] = None,
+                 queue_timeout: float = None, retry_after: int = None):
+        self.app = app
+        self.classes = classes or request_classes
+        self.queue_timeout = settings.REQUEST_QUEUE_TIMEOUT_SECONDS if queue_timeout is None else queue_timeout
+        self.retry_after = settings.REQUEST_RETRY_AFTER_SECONDS if retry_after is None else retry_after
+
+    async def __call__(self, scope, receive, send):
+        request_class = classify(scope["method"], scope["path"], self.classes) if scope["type"] == "http" else None
+        if request_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        sheddable = request_class.max_queue > 0
+        if sheddable and request_class.slots.locked() and request_class.queued >= request_class.max_queue:
+            await self._shed(request_class, send, "queue full")
+            return
+
+        request_class.queued += 1
+        REQUEST_CLASS_QUEUED.labels(request_class.name).inc()
+        started = time.perf_counter()
+        try:
+            if sheddable and self.queue_timeout:
+                await asyncio.wait_for(request_class.slots.acquire(), self.queue_timeout)
+            else:
+                await request_class.slots.acquire()
+        except asyncio.TimeoutError:
+            await self._shed(request_class, send, "queue timeout")
+            return
+        finally:
+            request_class.queued -= 1
+            REQUEST_CLASS_QUEUED.labels(request_class.name).dec()
+
+        waited = time.perf_counter() - started
+        request_class.admitted += 1
+        request_class.wait_seconds_total += waited
+        request_class.wait_seconds_max = max(request_class.wait_seconds_max, waited)
+        request_class.active += 1
+        REQUEST_CLASS_ACTIVE.labels(request_class.name).inc()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            request_class.active -= 1
+            REQUEST_CLASS_ACTIVE.labels(request_class.name).dec()
+            request_class.slots.release()
+
+    async def _shed(self, request_class: RequestClass, send, reason: str) -> None:
+        request_class.shed += 1
+        REQUEST_CLASS_SHED.labels(request_class.name).inc()
+        body = json.dumps({
+            "detail": f"Server busy ({request_class.name} requests: {reason}), retry later",
+            "request_class": request_class.name,
+        }).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(self.retry_after).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
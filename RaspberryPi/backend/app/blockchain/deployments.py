@@ -0,0 +1,240 @@
+"""Background deployment of on-chain loggers for new installations.
+
+create_installation only records a DeploymentJob; worker threads started with
+the app broadcast the factory transaction and wait for its receipt outside any
+request. A job moves pending -> sent -> confirmed, or to failed once
+DEPLOYMENT_MAX_ATTEMPTS is reached. Jobs are claimed with a time-limited lease,
+so a job whose worker died (or a "sent" job after a restart) is picked up again
+and resumes waiting on the already broadcast transaction. A "sent" job whose
+receipt wait times out while the node no longer knows the transaction goes
+back to pending, so the stored transaction is broadcast again.
+
+A deployment is never broadcast twice: the signed transaction and its hash are
+committed before it is sent. Every attempt for a pending job first asks the
+factory whether the installation already has a logger, then whether the node
+knows the stored transaction, and only rebroadcasts the same signed
+transaction if it does not. A new transaction is signed only when there is
+none yet, it reverted, or rebroadcasting it failed (its nonce was taken).
+"""
+import importlib.util
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.blockchain.errors import DeploymentReverted
+from app.db.database import SessionLocal
+from app.db.models import DeploymentJob, SolarInstallation
+
+JOB_PENDING = "pending"
+JOB_SENT = "sent"
+JOB_CONFIRMED = "confirmed"
+JOB_FAILED = "failed"
+
+DEPLOYMENT_WORKERS = int(os.getenv("DEPLOYMENT_WORKERS", "1"))
+DEPLOYMENT_MAX_ATTEMPTS = int(os.getenv("DEPLOYMENT_MAX_ATTEMPTS", "5"))
+DEPLOYMENT_RETRY_SECONDS = float(os.getenv("DEPLOYMENT_RETRY_SECONDS", "30"))  # doubled after every failure
+DEPLOYMENT_RECEIPT_TIMEOUT = float(os.getenv("DEPLOYMENT_RECEIPT_TIMEOUT", "180"))
+DEPLOYMENT_POLL_SECONDS = float(os.getenv("DEPLOYMENT_POLL_SECONDS", "10"))
+
+_wakeup = threading.Event()
+_stop = threading.Event()
+_threads: List[threading.Thread] = []
+
+
+def deployments_enabled() -> bool:
+    """True if loggers should be deployed for new installations (checked without importing web3)."""
+    return os.getenv("DISABLE_FACTORY", "0") != "1" and importlib.util.find_spec("web3") is not None
+
+
+# web3/eth_account are only imported when the first deployment runs, keeping app startup light
+def sign_logger_deployment(**kwargs) -> Tuple[str, str]:
+    from app.blockchain.factory_client import sign_logger_deployment as sign
+
+    return sign(**kwargs)
+
+
+def broadcast_logger_deployment(raw_tx: str) -> str:
+    from app.blockchain.factory_client import broadcast_logger_deployment as broadcast
+
+    return broadcast(raw_tx)
+
+
+def release_unsent_deployment() -> None:
+    from app.blockchain.factory_client import release_unsent_deployment as release
+
+    release()
+
+
+def deployment_transaction_known(tx_hash: str) -> bool:
+    from app.blockchain.factory_client import deployment_transaction_known as known
+
+    return known(tx_hash)
+
+
+def find_deployed_logger(installation_id: int) -> Optional[str]:
+    from app.blockchain.factory_client import find_deployed_logger as find
+
+    return find(installation_id)
+
+
+def wait_for_logger_deployment(tx_hash: str, installation_id: int, timeout: float = 120) -> str:
+    from app.blockchain.factory_client import wait_for_logger_deployment as wait
+
+    return wait(tx_hash, installation_id, timeout=timeout)
+
+
+def enqueue_deployment(db: Session, installation: SolarInstallation) -> DeploymentJob:
+    """
+    Create (or restart a failed) deployment job for *installation*.
+    A restarted job keeps its transaction, so the retry checks it instead of sending another.
+    The caller commits, then calls wake_deployment_workers().
+    """
+    job = db.query(DeploymentJob).filter(DeploymentJob.installation_id == installation.id).first()
+    if job is None:
+        job = DeploymentJob(installation_id=installation.id, status=JOB_PENDING, attempts=0,
+                            next_attempt_at=datetime.utcnow())
+        db.add(job)
+    elif job.status == JOB_FAILED:
+        job.status = JOB_PENDING
+        job.attempts = 0
+        job.last_error = None
+        job.next_attempt_at = datetime.utcnow()
+    return job
+
+
+def wake_deployment_workers() -> None:
+    _wakeup.set()
+
+
+def claim_next_job(db: Session) -> Optional[int]:
+    """Lease the next due job to this worker; returns its id or None."""
+    now = datetime.utcnow()
+    job = db.query(DeploymentJob).filter(
+        DeploymentJob.status.in_([JOB_PENDING, JOB_SENT]),
+        DeploymentJob.next_attempt_at <= now,
+        or_(DeploymentJob.locked_until.is_(None), DeploymentJob.locked_until < now),
+    ).order_by(DeploymentJob.id).with_for_update(skip_locked=True).first()
+    if job is None:
+        db.rollback()
+        return None
+    job.locked_until = now + timedelta(seconds=DEPLOYMENT_RECEIPT_TIMEOUT + 60)
+    db.commit()
+    return job.id
+
+
+def run_deployment_job(db: Session, job_id: int) -> DeploymentJob:
+    """Broadcast (unless already sent or deployed) and confirm one job, recording the outcome."""
+    job = db.get(DeploymentJob, job_id)
+    installation = job.installation
+    discard_signed_tx = False
+    resend_signed_tx = False
+    try:
+        logger_addr = None
+        if job.status == JOB_PENDING:
+            # An earlier attempt may have landed even though its outcome was never recorded
+            logger_addr = find_deployed_logger(installation.id)
+            if logger_addr is None and not (job.tx_hash and deployment_transaction_known(job.tx_hash)):
+                if not job.signed_tx:
+                    job.tx_hash, job.signed_tx = sign_logger_deployment(
+                        installation_id=installation.id,
+                        name=installation.name,
+                        shelly_mac=installation.shelly_mac,
+                        public_key=installation.public_key,
+                        created_at=int(installation.created_at.timestamp()),
+                        is_active=installation.is_active,
+                    )
+                    installation.deployment_tx_hash = job.tx_hash
+                    try:
+                        db.commit()
+                    except Exception:
+                        # The rollback discards the signed transaction before it was ever sent
+                        release_unsent_deployment()
+                        raise
+                else:
+                    # Sent before but unknown to the node; if this fails its nonce is gone, sign anew next time
+                    discard_signed_tx = True
+                broadcast_logger_deployment(job.signed_tx)
+                discard_signed_tx = False
+            if logger_addr is None:
+                job.status = JOB_SENT
+                db.commit()
+                print(f"⛓️  Logger deployment for installation {installation.id} sent: {job.tx_hash}")
+
+        if logger_addr is None:
+            try:
+                logger_addr = wait_for_logger_deployment(job.tx_hash, installation.id, timeout=DEPLOYMENT_RECEIPT_TIMEOUT)
+            except DeploymentReverted:
+                raise
+            except Exception:
+                # A transaction dropped from the mempool is never mined; the next attempt rebroadcasts it
+                resend_signed_tx = not deployment_transaction_known(job.tx_hash)
+                raise
+        job.status = JOB_CONFIRMED
+        job.logger_contract_address = logger_addr
+        job.last_error = None
+        job.locked_until = None
+        installation.logger_contract_address = logger_addr
+        db.commit()
+        print(f"✅ Logger for installation {installation.id} deployed at {logger_addr}")
+    except Exception as e:
+        db.rollback()
+        job.attempts = (job.attempts or 0) + 1
+        job.last_error = str(e)[:500]
+        job.locked_until = None
+        if isinstance(e, DeploymentReverted) or discard_signed_tx:
+            # This transaction will never deploy the logger; the next attempt checks the factory, then signs a new one
+            job.status = JOB_PENDING
+            job.tx_hash = None
+            job.signed_tx = None
+        elif resend_signed_tx:
+            job.status = JOB_PENDING
+        if job.attempts >= DEPLOYMENT_MAX_ATTEMPTS:
+            job.status = JOB_FAILED
+            print(f"❌ Logger deployment for installation {installation.id} failed: {e}")
+        else:
+            delay = DEPLOYMENT_RETRY_SECONDS * 2 ** (job.attempts - 1)
+            job.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+            print(f"⚠️  Logger deployment for installation {installation.id} attempt {job.attempts} "
+                  f"failed, retrying in {delay:.0f}s: {e}")
+        db.commit()
+    return job
+
+
+def _worker() -> None:
+    while not _stop.is_set():
+        db = SessionLocal()
+        try:
+            job_id = claim_next_job(db)
+            if job_id is not None:
+                run_deployment_job(db, job_id)
+                continue
+        except Exception as e:
+            print(f"❌ Deployment worker error: {e}")
+        finally:
+            db.close()
+        _wakeup.wait(DEPLOYMENT_POLL_SECONDS)
+        _wakeup.clear()
+
+
+def start_deployment_workers(count: int = DEPLOYMENT_WORKERS) -> None:
+    """Start *count* background deployment workers (no-op if deployments are disabled)."""
+    if not deployments_enabled() or _threads:
+        return
+    _stop.clear()
+    for i in range(count):
+        thread = threading.Thread(target=_worker, name=f"logger-deploy-{i}", daemon=True)
+        thread.start()
+        _threads.append(thread)
+    print(f"⛓️  Started {count} logger deployment worker(s)")
+
+
+def stop_deployment_workers(timeout: float = 5.0) -> None:
+    _stop.set()
+    _wakeup.set()
+    for thread in _threads:
+        thread.join(timeout)
+    _threads.clear()
@@ -0,0 +1,5 @@
+"""Blockchain exceptions that can be imported without loading web3."""
+
+
+class DeploymentReverted(RuntimeError):
+    """The createLogger transaction was mined but reverted."""
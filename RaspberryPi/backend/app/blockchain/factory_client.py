@@ -1,12 +1,20 @@
 """Utility to interact with WattWitnessLoggerFactory contract"""
 
 import os
-from typing import Tuple
+import threading
+import time
+from functools import lru_cache
+from typing import Callable, Optional, Tuple
 from web3 import Web3, HTTPProvider
+from web3.exceptions import TransactionNotFound
 from eth_account import Account
 from eth_account.signers.local import LocalAccount
 import json
 from pathlib import Path
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.blockchain.errors import DeploymentReverted  # noqa: F401 (re-exported)
 
 # Load env variables
 FACTORY_ADDRESS = os.getenv("FACTORY_ADDRESS")
@@ -17,7 +25,13 @@ if not all([FACTORY_ADDRESS, CHAIN_RPC_URL, PRIVATE_KEY]):
     # Helper may be imported in contexts where env isn't set (e.g., unit tests)
     FACTORY_ADDRESS = CHAIN_RPC_URL = PRIVATE_KEY = None  # type: ignore
 
+# Seconds a fetched gas price is reused before asking the node again
+GAS_PRICE_TTL = float(os.getenv("GAS_PRICE_TTL", "15"))
+# HTTP connections kept open to the RPC node
+RPC_POOL_SIZE = int(os.getenv("RPC_POOL_SIZE", "10"))
+
 
+@lru_cache(maxsize=1)
 def _load_abi() -> list:  # type: ignore[override]
     """Load ABI JSON for the factory contract (assumes artifact exists in repo)."""
     abi_path = Path(__file__).resolve().parent.parent.parent / "smart-contracts" / "out" / "WattWitnessLoggerFactory.sol" / "WattWitnessLoggerFactory.json"
@@ -40,10 +54,227 @@ def _load_abi() -> list:  # type: ignore[override]
             "outputs": [{"internalType": "address", "name": "logger", "type": "address"}],
             "stateMutability": "nonpayable",
             "type": "function",
-        }
+        },
+        {
+            "inputs": [{"internalType": "uint32", "name": "", "type": "uint32"}],
+            "name": "loggers",
+            "outputs": [{"internalType": "address", "name": "", "type": "address"}],
+            "stateMutability": "view",
+            "type": "function",
+        },
     ]
 
 
+class NonceAllocator:
+    """Hands out consecutive nonces locally so transactions can be sent back to back.
+
+    The first allocation (and the first after resync()) reads the account's
+    pending transaction count from the node.
+    """
+
+    def __init__(self, fetch_count: Callable[[], int]) -> None:
+        self._fetch_count = fetch_count
+        self._next: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def allocate(self) -> int:
+        with self._lock:
+            if self._next is None:
+                self._next = self._fetch_count()
+            nonce = self._next
+            self._next += 1
+            return nonce
+
+    def resync(self) -> None:
+        """Forget the local counter; the next allocation re-reads it from the node."""
+        with self._lock:
+            self._next = None
+
+
+class FactoryClient:
+    """Long-lived factory client: pooled RPC session, cached contract, local nonces and gas price."""
+
+    def __init__(self, rpc_url: str, factory_address: str, private_key: str,
+                 gas_price_ttl: float = GAS_PRICE_TTL, pool_size: int = RPC_POOL_SIZE) -> None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        self.w3 = Web3(HTTPProvider(rpc_url, session=session))
+        self.account: LocalAccount = Account.from_key(private_key)
+        self.factory = self.w3.eth.contract(address=Web3.to_checksum_address(factory_address), abi=_load_abi())
+        self.nonces = NonceAllocator(lambda: self.w3.eth.get_transaction_count(self.account.address, "pending"))
+        self.gas_price_ttl = gas_price_ttl
+        self._gas_price: Optional[Tuple[int, float]] = None
+        self._gas_lock = threading.Lock()
+
+    def gas_price(self) -> int:
+        with self._gas_lock:
+            now = time.monotonic()
+            if self._gas_price is None or now - self._gas_price[1] > self.gas_price_ttl:
+                self._gas_price = (self.w3.eth.gas_price, now)
+            return self._gas_price[0]
+
+    def sign_create_logger(
+        self,
+        *,
+        installation_id: int,
+        name: str,
+        shelly_mac: str,
+        public_key: str,
+        created_at: int,
+        is_active: bool,
+    ) -> Tuple[str, str]:
+        """Sign createLogger with a locally allocated nonce; return (tx hash, raw signed tx hex) without sending."""
+        nonce = self.nonces.allocate()
+        try:
+            txn = self.factory.functions.createLogger(
+                installation_id,
+                name,
+                shelly_mac,
+                public_key,
+                created_at,
+                is_active,
+            ).build_transaction({
+                "from": self.account.address,
+                "nonce": nonce,
+                "gas": 600000,  # conservative upper bound; factory deployment ~300k
+                "gasPrice": self.gas_price(),
+            })
+            signed = self.account.sign_transaction(txn)
+        except Exception:
+            self.nonces.resync()
+            raise
+        raw = getattr(signed, "raw_transaction", None) or signed.rawTransaction
+        return Web3.to_hex(signed.hash), Web3.to_hex(raw)
+
+    def broadcast(self, raw_tx: str) -> str:
+        """Send a signed transaction; return its hash."""
+        try:
+            tx_hash = self.w3.eth.send_raw_transaction(raw_tx)
+        except Exception:
+            # The nonce may or may not have been consumed; trust the node from here on
+            self.nonces.resync()
+            raise
+        return Web3.to_hex(tx_hash)
+
+    def release_unsent(self) -> None:
+        """Give back the nonce of a signed transaction that will never be broadcast."""
+        # Later transactions would otherwise queue behind the gap it leaves
+        self.nonces.resync()
+
+    def send_create_logger(self, **kwargs) -> str:
+        """Sign and broadcast createLogger with a locally allocated nonce; return the tx hash."""
+        _, raw_tx = self.sign_create_logger(**kwargs)
+        return self.broadcast(raw_tx)
+
+    def transaction_known(self, tx_hash: str) -> bool:
+        """True if the node has *tx_hash*, mined or still in its mempool."""
+        try:
+            self.w3.eth.get_transaction(tx_hash)
+        except TransactionNotFound:
+            return False
+        return True
+
+    def deployed_logger(self, installation_id: int) -> Optional[str]:
+        """Logger the factory has registered for *installation_id*, or None."""
+        address = self.factory.functions.loggers(installation_id).call()
+        return None if int(address, 16) == 0 else address
+
+    def wait_for_logger(self, tx_hash: str, installation_id: int, timeout: float = 120) -> str:
+        """Wait for a createLogger transaction and return the deployed logger address."""
+        receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash, timeout=timeout)
+
+        if receipt.status != 1:
+            raise DeploymentReverted("Logger deployment tx reverted")
+
+        # Decode returned logger address from logs or output
+        return receipt.contractAddress if receipt.contractAddress else self.factory.functions.loggers(installation_id).call()
+
+
+_client: Optional[FactoryClient] = None
+_client_lock = threading.Lock()
+
+
+def get_factory_client() -> FactoryClient:
+    """Process-wide FactoryClient, created on first use from the environment."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            rpc_url = CHAIN_RPC_URL or os.getenv("CHAIN_RPC_URL")
+            factory_address = FACTORY_ADDRESS or os.getenv("FACTORY_ADDRESS")
+            private_key = PRIVATE_KEY or os.getenv("DEPLOYER_PRIVATE_KEY")
+            if not all([factory_address, rpc_url, private_key]):
+                raise RuntimeError("Blockchain env variables not configured")
+            _client = FactoryClient(rpc_url, factory_address, private_key)
+        return _client
+
+
+def send_logger_deployment(
+    *,
+    installation_id: int,
+    name: str,
+    shelly_mac: str,
+    public_key: str,
+    created_at: int,
+    is_active: bool,
+) -> str:
+    """Sign and broadcast the factory createLogger transaction; return its hash without waiting."""
+    return get_factory_client().send_create_logger(
+        installation_id=installation_id,
+        name=name,
+        shelly_mac=shelly_mac,
+        public_key=public_key,
+        created_at=created_at,
+        is_active=is_active,
+    )
+
+
+def sign_logger_deployment(
+    *,
+    installation_id: int,
+    name: str,
+    shelly_mac: str,
+    public_key: str,
+    created_at: int,
+    is_active: bool,
+) -> Tuple[str, str]:
+    """Sign the factory createLogger transaction; return (tx hash, raw signed tx) so it can be stored before sending."""
+    return get_factory_client().sign_create_logger(
+        installation_id=installation_id,
+        name=name,
+        shelly_mac=shelly_mac,
+        public_key=public_key,
+        created_at=created_at,
+        is_active=is_active,
+    )
+
+
+def broadcast_logger_deployment(raw_tx: str) -> str:
+    """Broadcast a transaction signed by sign_logger_deployment; return its hash."""
+    return get_factory_client().broadcast(raw_tx)
+
+
+def release_unsent_deployment() -> None:
+    """Give back the nonce of a transaction signed by sign_logger_deployment that was never broadcast."""
+    get_factory_client().release_unsent()
+
+
+def deployment_transaction_known(tx_hash: str) -> bool:
+    """True if the node has seen the deployment transaction (mined or pending)."""
+    return get_factory_client().transaction_known(tx_hash)
+
+
+def find_deployed_logger(installation_id: int) -> Optional[str]:
+    """Logger already registered in the factory for *installation_id*, or None."""
+    return get_factory_client().deployed_logger(installation_id)
+
+
+def wait_for_logger_deployment(tx_hash: str, installation_id: int, timeout: float = 120) -> str:
+    """Wait for a createLogger transaction to be mined and return the deployed logger address."""
+    return get_factory_client().wait_for_logger(tx_hash, installation_id, timeout=timeout)
+
+
 def deploy_logger_for_installation(
     *,
     installation_id: int,
@@ -54,35 +285,12 @@ def deploy_logger_for_installation(
     is_active: bool,
 ) -> Tuple[str, str]:
     """Deploy logger via factory and return (logger_address, tx_hash)."""
-    if not all([FACTORY_ADDRESS, CHAIN_RPC_URL, PRIVATE_KEY]):
-        raise RuntimeError("Blockchain env variables not configured")
-
-    w3 = Web3(HTTPProvider(CHAIN_RPC_URL))
-    acct: LocalAccount = Account.from_key(PRIVATE_KEY)
-    factory = w3.eth.contract(address=Web3.to_checksum_address(FACTORY_ADDRESS), abi=_load_abi())
-
-    # Build tx
-    txn = factory.functions.createLogger(
-        installation_id,
-        name,
-        shelly_mac,
-        public_key,
-        created_at,
-        is_active,
-    ).build_transaction({
-        "from": acct.address,
-        "nonce": w3.eth.get_transaction_count(acct.address),
-        "gas": 600000,  # conservative upper bound; factory deployment ~300k
-        "gasPrice": w3.eth.gas_price,
-    })
-
-    signed = acct.sign_transaction(txn)
-    tx_hash = w3.eth.send_raw_transaction(signed.rawTransaction)
-    receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
-
-    if receipt.status != 1:
-        raise RuntimeError("Logger deployment tx reverted")
-
-    # Decode returned logger address from logs or output
-    logger_addr = receipt.contractAddress if receipt.contractAddress else factory.functions.loggers(installation_id).call()
-    return logger_addr, tx_hash.hex() 
\ No newline at end of file
+    tx_hash = send_logger_deployment(
+        installation_id=installation_id,
+        name=name,
+        shelly_mac=shelly_mac,
+        public_key=public_key,
+        created_at=created_at,
+        is_active=is_active,
+    )
+    return wait_for_logger_deployment(tx_hash, installation_id), tx_hash
@@ -0,0 +1,249 @@
+"""CLI utility to deploy loggers for many installations at once.
+
+Reads installations from a CSV or JSON file, sends every createLogger
+transaction back to back with locally allocated nonces, then waits for all
+receipts concurrently and records the deployed loggers through the backend
+API in one bulk call. Progress is checkpointed after every step, so a rerun
+after a partial failure resumes: sent transactions are awaited (not re-sent),
+reverted ones are sent again and confirmed ones are only written back. Before
+any (re)send, and when a transaction reverts, the factory is asked whether the
+installation already has a logger (deployed by an earlier run or by the
+backend's own deployment worker); if so it is recorded instead of sent.
+
+Input rows need an ``installation_id``; ``name``, ``shelly_mac``, ``public_key``,
+``created_at`` and ``is_active`` default to the backend's values for that
+installation. Installations that already have a logger are skipped.
+
+Usage:
+    python -m app.blockchain.provision_fleet_cli \
+        --input sites.csv \
+        --api-url http://localhost:8000 \
+        --checkpoint provision-checkpoint.json
+
+Environment variables `FACTORY_ADDRESS`, `CHAIN_RPC_URL`, `DEPLOYER_PRIVATE_KEY` may be set instead of
+--factory/--rpc/--pk.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List
+
+import requests
+
+from .factory_client import DeploymentReverted, FactoryClient
+
+_TRUE = {"1", "true", "yes", "y"}
+
+
+def load_rows(path: Path) -> List[Dict[str, Any]]:
+    """Read installation rows from a .json list or a CSV file with a header."""
+    with open(path) as f:
+        if path.suffix.lower() == ".json":
+            rows = json.load(f)
+        else:
+            rows = list(csv.DictReader(f))
+    return [{k: v for k, v in row.items() if v not in (None, "")} for row in rows]
+
+
+def load_checkpoint(path: Path) -> Dict[str, Dict[str, Any]]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_checkpoint(path: Path, state: Dict[str, Dict[str, Any]]) -> None:
+    """Atomically replace the checkpoint file so an interrupted run never corrupts it."""
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(state, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def fetch_installations(api_url: str) -> Dict[int, Dict[str, Any]]:
+    response = requests.get(f"{api_url.rstrip('/')}/api/v1/installations/", timeout=30)
+    response.raise_for_status()
+    return {inst["id"]: inst for inst in response.json()}
+
+
+def build_jobs(rows: List[Dict[str, Any]], installations: Dict[int, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Merge input rows with backend data into createLogger arguments."""
+    jobs = []
+    for row in rows:
+        installation_id = int(row["installation_id"])
+        known = installations.get(installation_id)
+        if known is None:
+            print(f"⚠️  Installation {installation_id} not found in backend, skipping")
+            continue
+        if known.get("logger_contract_address"):
+            print(f"⏭️  Installation {installation_id} already has logger {known['logger_contract_address']}")
+            continue
+        created_at = row.get("created_at") or known["created_at"]
+        if not str(created_at).isdigit():
+            created_at = datetime.fromisoformat(str(created_at)).timestamp()
+        is_active = row.get("is_active", known.get("is_active", True))
+        if isinstance(is_active, str):
+            is_active = is_active.strip().lower() in _TRUE
+        jobs.append({
+            "installation_id": installation_id,
+            "name": row.get("name") or known["name"],
+            "shelly_mac": row.get("shelly_mac") or known["shelly_mac"],
+            "public_key": row.get("public_key") or known["public_key"],
+            "created_at": int(float(created_at)),
+            "is_active": bool(is_active),
+        })
+    return jobs
+
+
+def send_all(client: FactoryClient, jobs: List[Dict[str, Any]], state: Dict[str, Dict[str, Any]],
+             checkpoint: Path) -> None:
+    """Broadcast every job that has no outstanding transaction, back to back."""
+    for job in jobs:
+        entry = state.setdefault(str(job["installation_id"]), {})
+        if entry.get("status") in ("sent", "confirmed"):
+            continue
+        try:
+            logger_addr = client.deployed_logger(job["installation_id"])
+            if logger_addr is not None:
+                entry.update(status="confirmed", logger_contract_address=logger_addr, written=False)
+                entry.pop("error", None)
+                print(f"✅ Installation {job['installation_id']}: factory already has logger {logger_addr}")
+                save_checkpoint(checkpoint, state)
+                continue
+            entry["tx_hash"] = client.send_create_logger(**job)
+            entry["status"] = "sent"
+            entry.pop("error", None)
+            print(f"⛓️  Installation {job['installation_id']}: sent {entry['tx_hash']}")
+        except Exception as e:
+            entry["status"] = "failed"
+            entry["error"] = str(e)
+            print(f"❌ Installation {job['installation_id']}: send failed: {e}")
+        # Recorded before the next send so a crash never loses a broadcast hash
+        save_checkpoint(checkpoint, state)
+
+
+def await_all(client: FactoryClient, state: Dict[str, Dict[str, Any]], checkpoint: Path,
+              workers: int, timeout: float) -> None:
+    """Wait for every sent transaction concurrently and record the deployed loggers."""
+    sent = {iid: entry for iid, entry in state.items() if entry.get("status") == "sent"}
+    if not sent:
+        return
+    print(f"⏳ Waiting for {len(sent)} receipt(s) with {workers} worker(s)...")
+
+    def wait(item):
+        iid, entry = item
+        try:
+            return iid, client.wait_for_logger(entry["tx_hash"], int(iid), timeout=timeout), None
+        except DeploymentReverted as e:
+            # createLogger reverts when the installation already has a logger
+            try:
+                logger_addr = client.deployed_logger(int(iid))
+            except Exception:
+                # Checked again before the next run resends
+                logger_addr = None
+            return iid, logger_addr, None if logger_addr else e
+        except Exception as e:
+            return iid, None, e
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for iid, logger_addr, error in pool.map(wait, sent.items()):
+            entry = state[iid]
+            if error is None:
+                entry.update(status="confirmed", logger_contract_address=logger_addr, written=False)
+                entry.pop("error", None)
+                print(f"✅ Installation {iid}: logger {logger_addr}")
+            elif isinstance(error, DeploymentReverted):
+                # Resent on the next run
+                entry.update(status="failed", error=str(error))
+                print(f"❌ Installation {iid}: {error}")
+            else:
+                # Still possibly pending; the next run waits on the same transaction
+                entry["error"] = str(error)
+                print(f"⚠️  Installation {iid}: no receipt yet ({error})")
+    save_checkpoint(checkpoint, state)
+
+
+def write_back(api_url: str, state: Dict[str, Dict[str, Any]], checkpoint: Path) -> bool:
+    """Record all confirmed, not yet written deployments in one backend call."""
+    pending = {iid: e for iid, e in state.items() if e.get("status") == "confirmed" and not e.get("written")}
+    if not pending:
+        return True
+    payload = {"deployments": [
+        {
+            "installation_id": int(iid),
+            "logger_contract_address": e["logger_contract_address"],
+            "deployment_tx_hash": e.get("tx_hash"),
+        }
+        for iid, e in pending.items()
+    ]}
+    try:
+        response = requests.post(f"{api_url.rstrip('/')}/api/v1/installations/deployments/bulk", json=payload, timeout=60)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        print(f"❌ Failed to record {len(pending)} deployment(s) in the backend: {e}")
+        return False
+    for entry in pending.values():
+        entry["written"] = True
+    save_checkpoint(checkpoint, state)
+    missing = response.json().get("missing_installation_ids", [])
+    print(f"📝 Recorded {len(pending) - len(missing)} deployment(s) in the backend")
+    if missing:
+        print(f"⚠️  Backend no longer knows installation(s) {missing}")
+    return True
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Deploy loggers for many installations via the factory")
+    parser.add_argument("--input", required=True, type=Path, help="CSV or JSON file of installations")
+    parser.add_argument("--api-url", default=os.getenv("API_BASE_URL", "http://localhost:8000"))
+    parser.add_argument("--checkpoint", type=Path, help="Progress file (default: <input>.checkpoint.json)")
+    parser.add_argument("--factory", help="Factory contract address")
+    parser.add_argument("--rpc", help="RPC URL (Avalanche Fuji)")
+    parser.add_argument("--pk", help="Deployer private key (0xHex)")
+    parser.add_argument("--workers", type=int, default=16, help="Concurrent receipt waits")
+    parser.add_argument("--receipt-timeout", type=float, default=300)
+
+    args = parser.parse_args(argv)
+
+    factory = args.factory or os.getenv("FACTORY_ADDRESS")
+    rpc_url = args.rpc or os.getenv("CHAIN_RPC_URL")
+    private_key = args.pk or os.getenv("DEPLOYER_PRIVATE_KEY")
+    if not all([factory, rpc_url, private_key]):
+        print("❌ Factory address, RPC URL and deployer key are required")
+        sys.exit(1)
+    checkpoint = args.checkpoint or args.input.with_name(args.input.name + ".checkpoint.json")
+
+    state = load_checkpoint(checkpoint)
+    if state:
+        print(f"🔁 Resuming from {checkpoint} ({len(state)} installation(s) tracked)")
+    rows = load_rows(args.input)
+    jobs = build_jobs(rows, fetch_installations(args.api_url))
+    print(f"🚀 {len(jobs)} installation(s) need a logger")
+
+    client = FactoryClient(rpc_url, factory, private_key, pool_size=max(10, args.workers))
+    send_all(client, jobs, state, checkpoint)
+    await_all(client, state, checkpoint, args.workers, args.receipt_timeout)
+    written = write_back(args.api_url, state, checkpoint)
+
+    counts: Dict[str, int] = {}
+    for entry in state.values():
+        counts[entry.get("status", "unknown")] = counts.get(entry.get("status", "unknown"), 0) + 1
+    print(f"📊 {counts}")
+    if not written or any(e.get("status") != "confirmed" for e in state.values()):
+        print(f"Rerun the same command to resume from {checkpoint}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
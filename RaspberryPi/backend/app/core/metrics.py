@@ -0,0 +1,210 @@
+"""Prometheus metrics served by GET /metrics.
+
+Request latency, ingest, request-class and database query metrics are
+recorded as they happen. Reading backlog, aggregation lag and confirmation
+lag are read from the database when scraped, at most every
+METRICS_DB_CACHE_SECONDS, so every worker reports the same values.
+
+Several uvicorn workers: point PROMETHEUS_MULTIPROC_DIR at an empty, writable
+directory (cleared before each start) in the server's environment or .env.
+Each worker then writes its samples there and /metrics merges them, whichever
+worker answers the scrape.
+"""
+import os
+import threading
+import time
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+# prometheus_client picks single- or multi-process storage when first imported
+load_dotenv()
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess)
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event, func
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+from app.db.database import ReplicaSessionLocal, SessionLocal, engines, replica_usable
+from app.db.models import OnchainBatch, PowerReading
+from app.db.onchain import BATCH_PENDING
+
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+HTTP_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DB_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+DB_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "CREATE", "ALTER", "DROP"}
+
+HTTP_REQUESTS = Counter(
+    "wattwitness_http_requests_total", "HTTP requests by route template and status", ["method", "route", "status"])
+HTTP_LATENCY = Histogram(
+    "wattwitness_http_request_duration_seconds", "HTTP request latency, including request-class queueing",
+    ["method", "route"], buckets=HTTP_LATENCY_BUCKETS)
+READINGS_INGESTED = Counter(
+    "wattwitness_readings_ingested_total", "Readings stored through POST /readings/", ["installation_id"])
+DB_QUERIES = Counter(
+    "wattwitness_db_queries_total", "SQL statements executed", ["engine", "operation"])
+DB_QUERY_LATENCY = Histogram(
+    "wattwitness_db_query_duration_seconds", "SQL statement latency", ["engine", "operation"],
+    buckets=DB_LATENCY_BUCKETS)
+DB_ERRORS = Counter("wattwitness_db_errors_total", "SQL statements that raised", ["engine"])
+REQUEST_CLASS_ACTIVE = Gauge(
+    "wattwitness_request_class_active", "Requests holding a request-class slot", ["request_class"],
+    multiprocess_mode="livesum")
+REQUEST_CLASS_QUEUED = Gauge(
+    "wattwitness_request_class_queued", "Requests waiting for a request-class slot", ["request_class"],
+    multiprocess_mode="livesum")
+REQUEST_CLASS_SHED = Counter(
+    "wattwitness_request_class_shed_total", "Requests answered 503 by load shedding", ["request_class"])
+
+
+def _engine_name(engine) -> str:
+    for name, registered in engines.items():
+        if getattr(registered, "sync_engine", registered) is engine:
+            return name
+    return "other"
+
+
+def _operation(statement: str) -> str:
+    keyword = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return keyword if keyword in DB_OPERATIONS else "OTHER"
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["metrics_query_start"].pop()
+    labels = (_engine_name(conn.engine), _operation(statement))
+    DB_QUERIES.labels(*labels).inc()
+    DB_QUERY_LATENCY.labels(*labels).observe(time.perf_counter() - started)
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    if context.connection is not None and context.connection.info.get("metrics_query_start"):
+        context.connection.info["metrics_query_start"].pop()
+    DB_ERRORS.labels(_engine_name(context.engine)).inc()
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request by its route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # FastAPI sets scope["route"] when it matches; templates keep label cardinality bounded
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_REQUESTS.labels(scope["method"], route, str(status)).inc()
+            HTTP_LATENCY.labels(scope["method"], route).observe(time.perf_counter() - started)
+
+
+class DatabaseCollector:
+    """Backlog and lag gauges read from the database (the replica when fresh) at scrape time"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._collected_at = float("-inf")
+        self._families = []
+
+    def describe(self):
+        # Nothing to query when registering
+        return []
+
+    def collect(self):
+        with self._lock:
+            if time.monotonic() - self._collected_at >= settings.METRICS_DB_CACHE_SECONDS:
+                self._families = self._query()
+                self._collected_at = time.monotonic()
+            return self._families
+
+    def _query(self):
+        # Imported here: the scheduler pulls in aggregate_readings
+        from app.db import aggregation_scheduler
+
+        up = GaugeMetricFamily("wattwitness_metrics_db_up", "Whether the last database scrape succeeded")
+        db = (ReplicaSessionLocal if replica_usable() else SessionLocal)()
+        try:
+            now = int(time.time())
+            pending_count, oldest_pending = db.query(
+                func.count(PowerReading.id), func.min(PowerReading.timestamp)
+            ).filter(PowerReading.is_verified == True, PowerReading.is_on_chain == False).one()
+            batch_count, oldest_batch = db.query(
+                func.count(OnchainBatch.id), func.min(OnchainBatch.created_at)
+            ).filter(OnchainBatch.status == BATCH_PENDING).one()
+            lag = aggregation_scheduler.aggregation_lag(db)
+        except Exception as e:
+            print(f"❌ Metrics database scrape failed: {e}")
+            up.add_metric([], 0)
+            return [up]
+        finally:
+            db.close()
+
+        up.add_metric([], 1)
+        families = [up]
+        for name, documentation, value in [
+            ("wattwitness_pending_readings", "Verified readings not yet on-chain", pending_count),
+            ("wattwitness_pending_oldest_age_seconds", "Age of the oldest reading not yet on-chain",
+             now - oldest_pending if oldest_pending is not None else 0),
+            ("wattwitness_onchain_batches_pending", "Batches awaiting the listener's confirmation depth", batch_count),
+            ("wattwitness_confirmation_lag_seconds", "Age of the oldest batch awaiting confirmation",
+             (datetime.utcnow() - oldest_batch).total_seconds() if oldest_batch is not None else 0),
+        ]:
+            family = GaugeMetricFamily(name, documentation)
+            family.add_metric([], value)
+            families.append(family)
+
+        lag_family = GaugeMetricFamily(
+            "wattwitness_aggregation_lag_seconds", "Seconds since the end of the last aggregated bucket",
+            labels=["installation_id"])
+        backlog_family = GaugeMetricFamily(
+            "wattwitness_aggregation_backlog_readings", "Eligible readings not yet aggregated",
+            labels=["installation_id"])
+        for entry in lag:
+            installation_id = str(entry["installation_id"])
+            if entry["lag_seconds"] is not None:
+                lag_family.add_metric([installation_id], entry["lag_seconds"])
+            backlog_family.add_metric([installation_id], entry["backlog_readings"])
+        return families + [lag_family, backlog_family]
+
+
+database_collector = DatabaseCollector()
+if not MULTIPROCESS:
+    REGISTRY.register(database_collector)
+
+
+def render_metrics() -> bytes:
+    """Prometheus text exposition, merged across workers in multiprocess mode"""
+    if not MULTIPROCESS:
+        return generate_latest(REGISTRY)
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    registry.register(database_collector)
+    return generate_latest(registry)
+
+
+def mark_worker_dead() -> None:
+    """Shutdown hook: drop this worker's live gauges from the multiprocess directory"""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,168 @@
+"""Per-request SQL profiling (SQL_PROFILING=true).
+
+Every statement a request runs is timed and grouped by its normalized SQL
+(literals and IN lists folded), so an N+1 pattern shows up as one statement
+run many times. Each response gets a Server-Timing header with the database
+and total time. A request slower than SLOW_REQUEST_MS is logged with its
+statements, most expensive first. The top SLOW_REQUEST_EXPLAIN of them are
+re-run as EXPLAIN with the parameters of their slowest call, after the
+response has been sent. EXPLAIN is skipped on async engines.
+
+Statement time is cursor execute time. psycopg2 fetches the whole result
+inside execute, so its time includes the transfer. SQLite produces rows
+lazily, so for SQLite the time not spent in SQL is mostly fetching.
+"""
+import re
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+
+_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("sql_profile", default=None)
+
+_PLACEHOLDER = r"(?:%\(\w+\)s|%s|\?|\$\d+|:\w+)"
+_IN_LIST = re.compile(rf"\(\s*{_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})+\s*\)")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?\b")
+_EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+# Distinct statements printed per slow request
+REPORTED_STATEMENTS = 20
+
+
+def normalize_sql(statement: str) -> str:
+    """Statement shape: whitespace collapsed, literals and placeholder lists folded"""
+    statement = _STRING.sub("?", statement)
+    statement = _NUMBER.sub("?", statement)
+    statement = " ".join(statement.split())
+    return _IN_LIST.sub("(...)", statement)
+
+
+class StatementStats:
+    def __init__(self, engine, statement, parameters, executemany):
+        self.count = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        # Slowest call, re-run as EXPLAIN for slow requests
+        self.engine = engine
+        self.statement = statement
+        self.parameters = parameters
+        self.executemany = executemany
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements: Dict[str, StatementStats] = {}
+        self.count = 0
+        self.seconds = 0.0
+        self.elapsed_ms = None  # Set when the response is done
+
+    def record(self, engine, statement, parameters, executemany, seconds):
+        key = normalize_sql(statement)
+        stats = self.statements.get(key)
+        if stats is None:
+            stats = self.statements[key] = StatementStats(engine, statement, parameters, executemany)
+        stats.count += 1
+        stats.seconds += seconds
+        if seconds > stats.max_seconds:
+            stats.max_seconds = seconds
+            stats.engine, stats.statement, stats.parameters, stats.executemany = (
+                engine, statement, parameters, executemany)
+        self.count += 1
+        self.seconds += seconds
+
+    def server_timing(self) -> str:
+        total_ms = (time.perf_counter() - self.started) * 1000
+        return f'db;dur={self.seconds * 1000:.1f};desc="{self.count} queries", total;dur={total_ms:.1f}'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _profile.get() is not None:
+        conn.info.setdefault("profile_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _profile.get()
+    if profile is not None and conn.info.get("profile_query_start"):
+        started = conn.info["profile_query_start"].pop()
+        profile.record(conn.engine, statement, parameters, executemany, time.perf_counter() - started)
+
+
+def _handle_error(context):
+    if context.connection is not None and context.connection.info.get("profile_query_start"):
+        context.connection.info["profile_query_start"].pop()
+
+
+def explain(stats: StatementStats) -> List[str]:
+    """Plan of a statement's slowest call, as text lines"""
+    if stats.executemany or not stats.statement.lstrip().upper().startswith(_EXPLAINABLE):
+        return ["(not explainable)"]
+    dialect = stats.engine.dialect
+    if dialect.is_async:
+        return ["(EXPLAIN skipped on async engine)"]
+    prefix = "EXPLAIN QUERY PLAN " if dialect.name == "sqlite" else "EXPLAIN "
+    try:
+        with stats.engine.connect() as conn:
+            rows = conn.exec_driver_sql(prefix + stats.statement, stats.parameters).fetchall()
+    except Exception as e:
+        return [f"(EXPLAIN failed: {e})"]
+    return [" | ".join(str(value) for value in row) for row in rows]
+
+
+def report_slow_request(method: str, path: str, status: int, profile: RequestProfile) -> None:
+    print(f"🐢 Slow request {method} {path} -> {status} in {profile.elapsed_ms:.1f}ms: "
+          f"{profile.count} statements, {profile.seconds * 1000:.1f}ms in SQL")
+    ranked = sorted(profile.statements.items(), key=lambda item: item[1].seconds, reverse=True)
+    if len(ranked) > REPORTED_STATEMENTS:
+        print(f"   (showing {REPORTED_STATEMENTS} of {len(ranked)} distinct statements)")
+    for rank, (sql, stats) in enumerate(ranked[:REPORTED_STATEMENTS]):
+        print(f"   {stats.count:>5}x {stats.seconds * 1000:>9.1f}ms (max {stats.max_seconds * 1000:.1f}ms)  {sql}")
+        if rank < settings.SLOW_REQUEST_EXPLAIN:
+            for line in explain(stats):
+                print(f"          {line}")
+
+
+class SQLProfilingMiddleware:
+    """ASGI middleware profiling the SQL each HTTP request runs"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        profile = RequestProfile()
+        token = _profile.set(profile)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", profile.server_timing().encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            # EXPLAIN runs on its own connection and must not be profiled into this request
+            _profile.reset(token)
+        profile.elapsed_ms = (time.perf_counter() - profile.started) * 1000
+        if profile.elapsed_ms >= settings.SLOW_REQUEST_MS:
+            await run_in_threadpool(report_slow_request, scope["method"], scope["path"], status, profile)
+
+
+def enable_sql_profiling(app) -> None:
+    """Install the statement hooks and the middleware"""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
+    app.add_middleware(SQLProfilingMiddleware)
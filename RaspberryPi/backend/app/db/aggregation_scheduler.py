@@ -0,0 +1,217 @@
+"""Incremental 10-minute aggregation inside the API process.
+
+A background thread ticks every AGGREGATION_INTERVAL_SECONDS. Each installation
+has a watermark (the last bucket the scheduler aggregated) and a tick only
+looks at readings after it, up to the first reading that is not eligible yet
+(not on chain, batch not finalized or newer than the 24h cutoff), so a bucket
+is rolled up once, when all of its readings are final. The work itself is done
+by the aggregate_readings.py engines.
+
+A tick stops taking new installations once AGGREGATION_TICK_BUDGET seconds are
+spent (the most lagging installations go first) and the thread then sleeps long
+enough to stay within AGGREGATION_CPU_SHARE of one core. Readings that arrive
+behind a watermark are left to aggregate_readings.py.
+
+The scheduler is off by default. Every uvicorn worker imports the app and would
+start its own thread, so set AGGREGATION_SCHEDULER=1 in the environment of one
+process only: a single-worker API, or one dedicated instance next to workers
+started with AGGREGATION_SCHEDULER=0. Watermark rows are claimed with SKIP
+LOCKED, so a second scheduler started by mistake skips installations already
+being aggregated instead of doing them twice.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.db.database import SessionLocal
+from app.db.models import AggregationWatermark, OnchainBatch, PowerReading, SolarInstallation
+from app.db.onchain import BATCH_FINALIZED
+
+BUCKET_SECONDS = 600
+
+AGGREGATION_SCHEDULER = os.getenv("AGGREGATION_SCHEDULER", "0") == "1"
+AGGREGATION_INTERVAL_SECONDS = float(os.getenv("AGGREGATION_INTERVAL_SECONDS", "60"))
+AGGREGATION_TICK_BUDGET = float(os.getenv("AGGREGATION_TICK_BUDGET", "10"))
+AGGREGATION_CPU_SHARE = float(os.getenv("AGGREGATION_CPU_SHARE", "0.25"))
+# "sql" keeps the work in the database, off the GIL the request threads share
+AGGREGATION_SCHEDULER_ENGINE = os.getenv("AGGREGATION_SCHEDULER_ENGINE", "sql")
+
+# Last tick, reported by GET /api/v1/aggregation/lag
+status = {
+    "last_tick_at": None,
+    "last_tick_seconds": None,
+    "last_tick_installations": 0,
+    "last_tick_readings": 0,
+    "last_error": None,
+}
+
+_stop = threading.Event()
+_thread: Optional[threading.Thread] = None
+
+
+# aggregate_readings.py lives next to main.py and is only imported once the scheduler runs
+def _aggregation():
+    import aggregate_readings
+
+    return aggregate_readings
+
+
+def _cutoff() -> datetime:
+    return datetime.utcnow() - timedelta(hours=24)
+
+
+def ensure_watermarks(db: Session) -> None:
+    """Add an empty watermark for every installation that has none yet."""
+    missing = db.query(SolarInstallation.id).outerjoin(
+        AggregationWatermark, AggregationWatermark.installation_id == SolarInstallation.id
+    ).filter(AggregationWatermark.installation_id.is_(None)).all()
+    if not missing:
+        return
+    db.add_all(AggregationWatermark(installation_id=row[0], last_bucket=None) for row in missing)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another process added them first
+        db.rollback()
+
+
+def pending_range(db: Session, installation_id: int, last_bucket: Optional[int],
+                  cutoff_time: datetime) -> Optional[Tuple[int, int, int]]:
+    """
+    Bucket-aligned [from, to) timestamps that became eligible after the watermark,
+    plus the last bucket they contain; None if there is nothing new.
+    """
+    aggregation = _aggregation()
+    start = 0 if last_bucket is None else last_bucket + BUCKET_SECONDS
+    # Everything before the first reading that is not final yet can be rolled up
+    frontier = db.query(func.min(PowerReading.timestamp)).filter(
+        PowerReading.installation_id == installation_id,
+        PowerReading.timestamp >= start,
+        or_(
+            PowerReading.is_on_chain == False,
+            ~PowerReading.batch.has(OnchainBatch.status == BATCH_FINALIZED),
+            PowerReading.created_at >= cutoff_time,
+        ),
+    ).scalar()
+    end = aggregation.round_to_10_minutes(frontier) if frontier is not None else aggregation.ALL_TIME[1]
+    last = db.query(func.max(PowerReading.timestamp)).filter(
+        PowerReading.installation_id == installation_id,
+        PowerReading.timestamp >= start,
+        PowerReading.timestamp < end,
+        *aggregation.eligible_readings_filter(cutoff_time),
+    ).scalar()
+    if last is None:
+        return None
+    return start, end, aggregation.round_to_10_minutes(last)
+
+
+def run_tick(session_factory=None, budget: float = AGGREGATION_TICK_BUDGET,
+             engine_name: str = AGGREGATION_SCHEDULER_ENGINE) -> Dict[str, int]:
+    """Aggregate newly eligible buckets, most lagging installation first, until *budget* seconds are spent."""
+    session_factory = session_factory or SessionLocal
+    aggregation = _aggregation()
+    aggregate = aggregation.ENGINES[engine_name]
+    cutoff_time = _cutoff()
+    started = time.monotonic()
+    totals = aggregation.new_stats()
+
+    db = session_factory()
+    try:
+        ensure_watermarks(db)
+        installation_ids = [row[0] for row in db.query(AggregationWatermark.installation_id).order_by(
+            func.coalesce(AggregationWatermark.last_bucket, -1), AggregationWatermark.installation_id
+        )]
+        db.rollback()
+        for installation_id in installation_ids:
+            if time.monotonic() - started >= budget:
+                break
+            watermark = db.query(AggregationWatermark).filter(
+                AggregationWatermark.installation_id == installation_id
+            ).with_for_update(skip_locked=True).first()
+            span = pending_range(db, installation_id, watermark.last_bucket, cutoff_time) if watermark else None
+            if span is None:
+                db.rollback()
+                continue
+            ts_from, ts_to, last_bucket = span
+            stats = aggregate(installation_id, cutoff_time, aggregation.CHUNK_SIZE, session_factory,
+                              time_range=(ts_from, ts_to))
+            watermark.last_bucket = last_bucket
+            db.commit()
+            for key, value in stats.items():
+                totals[key] += value
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    return totals
+
+
+def aggregation_lag(db: Session) -> List[Dict[str, Optional[int]]]:
+    """Per installation: watermark, seconds since its end and eligible readings not yet aggregated."""
+    aggregation = _aggregation()
+    start = func.coalesce(AggregationWatermark.last_bucket + BUCKET_SECONDS, 0)
+    backlog = dict(db.query(PowerReading.installation_id, func.count(PowerReading.id)).outerjoin(
+        AggregationWatermark, AggregationWatermark.installation_id == PowerReading.installation_id
+    ).filter(
+        PowerReading.timestamp >= start,
+        *aggregation.eligible_readings_filter(_cutoff()),
+    ).group_by(PowerReading.installation_id).all())
+
+    watermarks = dict(db.query(AggregationWatermark.installation_id, AggregationWatermark.last_bucket).all())
+    now = int(time.time())
+    return [
+        {
+            "installation_id": installation_id,
+            "last_bucket": watermarks.get(installation_id),
+            "lag_seconds": (now - watermarks[installation_id] - BUCKET_SECONDS)
+            if watermarks.get(installation_id) is not None else None,
+            "backlog_readings": backlog.get(installation_id, 0),
+        }
+        for (installation_id,) in db.query(SolarInstallation.id).order_by(SolarInstallation.id)
+    ]
+
+
+def _loop() -> None:
+    while not _stop.is_set():
+        started = time.monotonic()
+        try:
+            totals = run_tick()
+            status.update(last_tick_installations=totals["installations"], last_tick_readings=totals["readings"],
+                          last_error=None)
+            if totals["aggregates"]:
+                print(f"📦 Aggregated {totals['aggregates']} bucket(s) from {totals['readings']} reading(s) "
+                      f"for {totals['installations']} installation(s)")
+        except Exception as e:
+            status["last_error"] = str(e)[:500]
+            print(f"❌ Aggregation scheduler error: {e}")
+        elapsed = time.monotonic() - started
+        status.update(last_tick_at=datetime.utcnow(), last_tick_seconds=round(elapsed, 3))
+        # Busy for elapsed, idle long enough to keep the average under the CPU share
+        _stop.wait(max(AGGREGATION_INTERVAL_SECONDS, elapsed * (1 / AGGREGATION_CPU_SHARE - 1)))
+
+
+def start_aggregation_scheduler() -> None:
+    """Start the background aggregation thread (no-op unless AGGREGATION_SCHEDULER=1)."""
+    global _thread
+    if not AGGREGATION_SCHEDULER or _thread is not None:
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=_loop, name="aggregation-scheduler", daemon=True)
+    _thread.start()
+    print(f"📦 Aggregation scheduler started ({AGGREGATION_SCHEDULER_ENGINE} engine, "
+          f"every {AGGREGATION_INTERVAL_SECONDS:.0f}s)")
+
+
+def stop_aggregation_scheduler(timeout: float = 5.0) -> None:
+    global _thread
+    _stop.set()
+    if _thread is not None:
+        _thread.join(timeout)
+        _thread = None
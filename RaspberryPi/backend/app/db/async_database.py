@@ -0,0 +1,71 @@
+"""Async engine and sessions for the API's hot endpoints (API_DB_MODE=async).
+
+Uses the same database as database.py through an async driver: asyncpg for
+PostgreSQL, aiosqlite for SQLite. The engine is created on first use, so the
+sync mode never imports either driver.
+"""
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.db.database import DATABASE_URL, engine_options, engines, replica_usable
+
+_ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+_engine = None
+_session_factory = None
+_replica_session_factory = None
+
+
+def async_database_url(url: str = DATABASE_URL) -> str:
+    scheme, sep, rest = url.partition("://")
+    return _ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+
+def get_async_engine():
+    global _engine, _session_factory
+    if _engine is None:
+        url = settings.ASYNC_DATABASE_URL or async_database_url()
+        _engine = create_async_engine(url, **engine_options(url, is_async=True))
+        engines["api_async"] = _engine
+        _session_factory = async_sessionmaker(_engine, expire_on_commit=False, autoflush=False)
+    return _engine
+
+
+async def get_async_db():
+    """Dependency yielding an AsyncSession"""
+    get_async_engine()
+    async with _session_factory() as db:
+        yield db
+
+
+async def get_async_read_db():
+    """Dependency for read-only routes: AsyncSession on the replica when database.replica_usable() allows it"""
+    global _replica_session_factory
+    get_async_engine()
+    factory = _session_factory
+    # The lag probe is sync (and cached), keep it off the event loop
+    if settings.REPLICA_DATABASE_URL and await run_in_threadpool(replica_usable):
+        if _replica_session_factory is None:
+            url = async_database_url(settings.REPLICA_DATABASE_URL)
+            engines["replica_async"] = create_async_engine(url, **engine_options(url, is_async=True))
+            _replica_session_factory = async_sessionmaker(engines["replica_async"], expire_on_commit=False,
+                                                          autoflush=False)
+        factory = _replica_session_factory
+    async with factory() as db:
+        yield db
+
+
+async def dispose_async_engine() -> None:
+    global _engine, _replica_session_factory
+    if _engine is not None:
+        await _engine.dispose()
+        engines.pop("api_async", None)
+        _engine = None
+    if _replica_session_factory is not None:
+        await engines.pop("replica_async").dispose()
+        _replica_session_factory = None
@@ -0,0 +1,166 @@
+"""Per-bucket energy for charts.
+
+The "counter" engine reads the meter's cumulative total_wh at every bucket
+edge instead of integrating power_w over every reading: the counter is
+interpolated between the last reading before and the first reading at or after
+each edge, and a bucket's energy is the difference between its two edges. That
+is two index lookups per edge however many readings a bucket holds.
+
+The counter restarts when the meter loses power. One more query finds every
+consecutive pair of readings in the sampled range whose total_wh drops (a LAG
+window evaluated in the database, returning only those pairs) and adds both
+readings to the samples, so a reset is seen even when the counter climbs back
+above its value at the bucket edge. Between two samples without a reset the
+counter difference is then the sum of the positive steps. A reset pair, or a
+pair that straddles the installation's last_boot_timestamp, is bridged with the
+trapezoid rule on power_w (for the boot case after loading the readings between
+them).
+
+"trapezoid" is the previous integration over every reading pair of a bucket;
+"crosscheck" returns the counter result and reports buckets where the two
+differ by more than ENERGY_CROSSCHECK_TOLERANCE.
+"""
+import os
+from bisect import bisect_right
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, select, union
+from sqlalchemy.orm import Session
+
+from app.db.models import PowerReading
+
+ENERGY_ENGINES = ("counter", "trapezoid", "crosscheck")
+ENERGY_ENGINE = os.getenv("ENERGY_ENGINE", "counter")
+# Relative difference (of the larger value) above which crosscheck reports a bucket
+ENERGY_CROSSCHECK_TOLERANCE = float(os.getenv("ENERGY_CROSSCHECK_TOLERANCE", "0.05"))
+
+# (id, timestamp, total_wh, power_w)
+Sample = Tuple[int, int, float, float]
+
+
+def _columns():
+    return PowerReading.id, PowerReading.timestamp, PowerReading.total_wh, PowerReading.power_w
+
+
+def _readings(installation_id: int, verified_only: bool):
+    query = select(*_columns()).where(PowerReading.installation_id == installation_id)
+    if verified_only:
+        query = query.where(PowerReading.is_verified == True)
+    return query
+
+
+def _pair_energy(a: Sample, b: Sample) -> float:
+    """Trapezoid energy (Wh) between two readings"""
+    return abs((a[3] + b[3]) / 2 * (b[1] - a[1]) / 3600)
+
+
+def trapezoid_bucket_energies(db: Session, installation_id: int, edges: Sequence[int],
+                              verified_only: bool = True) -> List[float]:
+    """Energy of each [edges[i], edges[i+1]) bucket, integrating power over every reading pair inside it"""
+    rows = db.execute(_readings(installation_id, verified_only).where(
+        PowerReading.timestamp >= edges[0],
+        PowerReading.timestamp < edges[-1],
+    ).order_by(PowerReading.timestamp, PowerReading.id)).all()
+    energies = [0.0] * (len(edges) - 1)
+    for a, b in zip(rows, rows[1:]):
+        bucket = bisect_right(edges, a[1]) - 1
+        if bucket == bisect_right(edges, b[1]) - 1:
+            energies[bucket] += _pair_energy(a, b)
+    return energies
+
+
+def _reset_samples(db: Session, installation_id: int, start: int, end: int, verified_only: bool) -> List[Sample]:
+    """Both readings of every consecutive pair in [start, end] whose total_wh drops"""
+    order = (PowerReading.timestamp, PowerReading.id)
+    stepped = _readings(installation_id, verified_only).add_columns(
+        *(func.lag(column).over(order_by=order).label(f"prev_{column.key}") for column in _columns())
+    ).where(PowerReading.timestamp >= start, PowerReading.timestamp <= end).subquery()
+    rows = db.execute(select(stepped).where(stepped.c.total_wh < stepped.c.prev_total_wh)).all()
+    samples = []
+    for row in rows:
+        samples.append((row.prev_id, row.prev_timestamp, row.prev_total_wh, row.prev_power_w))
+        samples.append((row.id, row.timestamp, row.total_wh, row.power_w))
+    return samples
+
+
+def _is_reset(a: Sample, b: Sample, boot_timestamp: Optional[int]) -> bool:
+    return b[2] < a[2] or (boot_timestamp is not None and a[1] < boot_timestamp <= b[1])
+
+
+def _counter_curve(db: Session, installation_id: int, samples: List[Sample], boot_timestamp: Optional[int],
+                   verified_only: bool) -> List[Tuple[int, float]]:
+    """(timestamp, cumulative Wh) through the samples, with counter resets stitched out"""
+    curve: List[Tuple[int, float]] = []
+    total = 0.0
+    prev = None
+    for sample in samples:
+        if prev is not None:
+            if not _is_reset(prev, sample, boot_timestamp):
+                total += sample[2] - prev[2]
+            else:
+                # Walk every reading between the two samples; only the reset pair itself uses power
+                between = db.execute(_readings(installation_id, verified_only).where(
+                    PowerReading.timestamp >= prev[1],
+                    PowerReading.timestamp <= sample[1],
+                ).order_by(PowerReading.timestamp, PowerReading.id)).all()
+                between = [row for row in between if (row[1], row[0]) > (prev[1], prev[0])
+                           and (row[1], row[0]) < (sample[1], sample[0])]
+                a = prev
+                for b in [*between, sample]:
+                    total += _pair_energy(a, b) if _is_reset(a, b, boot_timestamp) else b[2] - a[2]
+                    curve.append((b[1], total))
+                    a = b
+                prev = sample
+                continue
+        curve.append((sample[1], total))
+        prev = sample
+    return curve
+
+
+def _counter_at(curve: List[Tuple[int, float]], timestamp: int) -> float:
+    """Cumulative Wh at *timestamp*, linear between readings and flat outside them"""
+    i = bisect_right(curve, (timestamp, float("inf")))
+    if i == 0:
+        return curve[0][1]
+    if i == len(curve):
+        return curve[-1][1]
+    (t0, e0), (t1, e1) = curve[i - 1], curve[i]
+    return e0 + (e1 - e0) * (timestamp - t0) / (t1 - t0)
+
+
+def counter_bucket_energies(db: Session, installation_id: int, edges: Sequence[int],
+                            boot_timestamp: Optional[int] = None, verified_only: bool = True) -> List[float]:
+    """Energy of each [edges[i], edges[i+1]) bucket as the counter difference between its edges"""
+    base = _readings(installation_id, verified_only)
+    probes = []
+    for edge in edges:
+        probes.append(base.where(PowerReading.timestamp < edge).order_by(
+            PowerReading.timestamp.desc(), PowerReading.id.desc()).limit(1).subquery())
+        probes.append(base.where(PowerReading.timestamp >= edge).order_by(
+            PowerReading.timestamp, PowerReading.id).limit(1).subquery())
+    samples = {tuple(s) for s in db.execute(union(*(select(probe) for probe in probes))).all()}
+    if not samples:
+        return [0.0] * (len(edges) - 1)
+    first, last = min(s[1] for s in samples), max(s[1] for s in samples)
+    samples.update(_reset_samples(db, installation_id, first, last, verified_only))
+    samples = sorted(samples, key=lambda s: (s[1], s[0]))
+    curve = _counter_curve(db, installation_id, samples, boot_timestamp, verified_only)
+    at_edges = [_counter_at(curve, edge) for edge in edges]
+    return [end - start for start, end in zip(at_edges, at_edges[1:])]
+
+
+def bucket_energies(db: Session, installation_id: int, edges: Sequence[int], boot_timestamp: Optional[int] = None,
+                    verified_only: bool = True, engine: str = ENERGY_ENGINE) -> Tuple[List[float], Optional[List[float]]]:
+    """Energy per bucket with the chosen engine, plus the trapezoid values in crosscheck mode"""
+    if engine == "trapezoid":
+        return trapezoid_bucket_energies(db, installation_id, edges, verified_only), None
+    energies = counter_bucket_energies(db, installation_id, edges, boot_timestamp, verified_only)
+    if engine != "crosscheck":
+        return energies, None
+
+    checks = trapezoid_bucket_energies(db, installation_id, edges, verified_only)
+    for start, counter, trapezoid in zip(edges, energies, checks):
+        if abs(counter - trapezoid) > ENERGY_CROSSCHECK_TOLERANCE * max(counter, trapezoid, 1.0):
+            print(f"⚠️  Energy crosscheck: installation {installation_id} bucket {start}: "
+                  f"counter {counter:.2f} Wh vs trapezoid {trapezoid:.2f} Wh")
+    return energies, checks
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, Float, String, DateTime, ForeignKey, Boolean, BigInteger
+from sqlalchemy import Column, Integer, Float, String, Text, DateTime, ForeignKey, Boolean, BigInteger, Index, LargeBinary
+from sqlalchemy import DDL, UniqueConstraint, event
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
@@ -24,6 +25,11 @@ class SolarInstallation(Base):
 
 class PowerReading(Base):
     __tablename__ = "power_readings"
+    __table_args__ = (
+        # Same index as migrate_add_counter_index.py; edge lookups of the counter energy engine
+        Index("idx_power_readings_counter", "installation_id", "timestamp",
+              postgresql_include=["total_wh", "power_w", "is_verified"]),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     installation_id = Column(Integer, ForeignKey("solar_installations.id"))
@@ -37,7 +43,8 @@ class PowerReading(Base):
     verification_timestamp = Column(DateTime)
     
     # Blockchain fields
-    blockchain_tx_hash = Column(String, unique=True)  # Transaction hash on blockchain
+    batch_id = Column(Integer, ForeignKey("onchain_batches.id"), index=True)  # Batch that carried this reading on-chain
+    blockchain_tx_hash = Column(String, index=True)  # Transaction hash on blockchain (shared by the whole batch)
     blockchain_block_number = Column(Integer)  # Block number where data is stored
     is_on_chain = Column(Boolean, default=False)
     
@@ -46,6 +53,105 @@ class PowerReading(Base):
     
     # Relationships
     installation = relationship("SolarInstallation", back_populates="power_readings")
+    batch = relationship("OnchainBatch", back_populates="readings")
+
+class OnchainBatch(Base):
+    __tablename__ = "onchain_batches"
+
+    id = Column(Integer, primary_key=True, index=True)
+    first_reading_id = Column(Integer, index=True)  # First reading ID in the batch range
+    last_reading_id = Column(Integer)               # Last reading ID in the batch range
+    reading_count = Column(Integer)                 # Number of readings marked by this batch
+    merkle_root = Column(String)                    # Merkle root emitted in BatchProcessed
+    blockchain_tx_hash = Column(String, unique=True)  # Oracle fulfillment transaction
+    blockchain_block_number = Column(Integer)
+    status = Column(String, default="finalized", index=True)  # "pending" until the listener's confirmation depth is reached
+    finalized_at = Column(DateTime)
+    
+    # Metadata
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    readings = relationship("PowerReading", back_populates="batch")
+
+class PendingLease(Base):
+    __tablename__ = "pending_leases"
+
+    id = Column(Integer, primary_key=True, index=True)
+    lease_key = Column(String, unique=True)         # Idempotency key shared by every DON node of one request
+    first_reading_id = Column(Integer, index=True)  # First reading ID reserved by this lease
+    last_reading_id = Column(Integer)               # Last reading ID reserved by this lease
+    expires_at = Column(DateTime, index=True)       # Range becomes pending again after this
+    
+    # Metadata
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+# PostgreSQL refuses overlapping leased ranges, whatever the application does (see migrate_add_pending_leases.py)
+PENDING_LEASE_EXCLUSION_SQL = """
+    ALTER TABLE pending_leases ADD CONSTRAINT pending_leases_no_overlap
+    EXCLUDE USING gist (int4range(first_reading_id, last_reading_id, '[]') WITH &&)
+"""
+event.listen(PendingLease.__table__, "after_create", DDL(PENDING_LEASE_EXCLUSION_SQL).execute_if(dialect="postgresql"))
+
+class DeploymentJob(Base):
+    __tablename__ = "deployment_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    installation_id = Column(Integer, ForeignKey("solar_installations.id"), unique=True)
+    status = Column(String, default="pending", index=True)  # pending -> sent -> confirmed, or failed
+    attempts = Column(Integer, default=0)      # Failed attempts so far
+    tx_hash = Column(String)                   # createLogger transaction, stored before it is broadcast
+    signed_tx = Column(String)                 # Raw signed transaction, rebroadcast instead of signing a new one
+    logger_contract_address = Column(String)   # Deployed logger once confirmed
+    last_error = Column(String)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, index=True)  # Retry backoff
+    locked_until = Column(DateTime)            # Worker lease; an expired lease lets another worker resume the job
+
+    # Metadata
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Relationships
+    installation = relationship("SolarInstallation")
+
+class ReadingBlock(Base):
+    """One installation hour of sealed raw readings (see app/db/reading_blocks.py)"""
+    __tablename__ = "reading_blocks"
+    __table_args__ = (
+        Index("idx_reading_blocks_range", "installation_id", "first_timestamp", "last_timestamp"),
+        # Same constraint as migrate_add_reading_block_hours.py; later chunks of an hour merge into its block
+        UniqueConstraint("installation_id", "hour_start", name="uq_reading_blocks_hour"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    installation_id = Column(Integer, ForeignKey("solar_installations.id"))
+    hour_start = Column(BigInteger)       # Unix timestamp rounded down to the hour
+    first_timestamp = Column(BigInteger)  # First reading in block
+    last_timestamp = Column(BigInteger)   # Last reading in block
+    reading_count = Column(Integer)
+
+    # Delta encoded varint columns, one value per reading
+    reading_ids = Column(LargeBinary)
+    timestamps = Column(LargeBinary)
+    power_scale = Column(Integer)    # Decimals kept for power_w, -1 for raw float64
+    power_w = Column(LargeBinary)
+    total_scale = Column(Integer)    # Decimals kept for total_wh, -1 for raw float64
+    total_wh = Column(LargeBinary)
+    created_at_us = Column(LargeBinary)
+    verified_at_us = Column(LargeBinary)  # Microseconds after created_at plus one, 0 if unverified
+    flags = Column(LargeBinary)      # One byte per reading: 1 verified, 2 on chain
+    batch_ids = Column(LargeBinary)
+    signatures = Column(Text)        # Newline separated
+
+    # Metadata
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class AggregationWatermark(Base):
+    __tablename__ = "aggregation_watermarks"
+
+    installation_id = Column(Integer, ForeignKey("solar_installations.id"), primary_key=True)
+    last_bucket = Column(BigInteger)  # Start of the last 10-minute bucket aggregated by the scheduler
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 class Token(Base):
     __tablename__ = "tokens"
@@ -62,6 +168,10 @@ class Token(Base):
 
 class PowerReadingAggregate(Base):
     __tablename__ = "power_reading_aggregates"
+    __table_args__ = (
+        # Same index as migrate_add_aggregates.py; target of the SQL engine's ON CONFLICT
+        Index("idx_aggregates_unique_bucket", "installation_id", "time_bucket", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     installation_id = Column(Integer, ForeignKey("solar_installations.id"))
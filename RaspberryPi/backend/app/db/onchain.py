@@ -0,0 +1,194 @@
+"""On-chain batch confirmation logic shared by the API and the co-located listener.
+
+A batch is recorded as "pending" when its event is first seen near the chain head
+and promoted to "finalized" once the listener's confirmation depth is reached.
+Pending batches can be reverted if a reorg drops their transaction; only
+finalized readings are eligible for aggregation (and deletion of raw rows).
+"""
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.orm import Session
+
+from app.db.models import OnchainBatch, PendingLease, PowerReading
+
+BATCH_PENDING = "pending"
+BATCH_FINALIZED = "finalized"
+
+
+def apply_batch_confirmation(
+    db: Session,
+    first_reading_id: int,
+    last_reading_id: int,
+    blockchain_tx_hash: str,
+    blockchain_block_number: Optional[int] = None,
+    merkle_root: Optional[str] = None,
+    finalized: bool = True,
+    installation_id: Optional[int] = None,
+) -> Tuple[OnchainBatch, int, bool]:
+    """
+    Record an on-chain batch and mark its reading range in one set-based UPDATE.
+    Confirming an existing pending batch with finalized=True promotes it.
+    With installation_id (the installation owning the emitting logger) only that
+    installation's readings in the range are marked.
+    Returns (batch, updated_count, promoted); batch is None if a new batch would
+    mark no readings. The caller is responsible for committing.
+    """
+    promoted = False
+    created = False
+    batch = db.query(OnchainBatch).filter(
+        OnchainBatch.blockchain_tx_hash == blockchain_tx_hash
+    ).first()
+    if not batch:
+        batch = OnchainBatch(
+            first_reading_id=first_reading_id,
+            last_reading_id=last_reading_id,
+            reading_count=last_reading_id - first_reading_id + 1,
+            merkle_root=merkle_root,
+            blockchain_tx_hash=blockchain_tx_hash,
+            blockchain_block_number=blockchain_block_number,
+            status=BATCH_FINALIZED if finalized else BATCH_PENDING,
+            finalized_at=datetime.utcnow() if finalized else None
+        )
+        db.add(batch)
+        db.flush()  # Get batch ID for the readings' foreign key
+        created = True
+    else:
+        if blockchain_block_number and batch.blockchain_block_number != blockchain_block_number:
+            # Same transaction re-included in another block after a reorg
+            batch.blockchain_block_number = blockchain_block_number
+            db.query(PowerReading).filter(PowerReading.batch_id == batch.id).update(
+                {PowerReading.blockchain_block_number: blockchain_block_number}, synchronize_session=False
+            )
+        if finalized and batch.status != BATCH_FINALIZED:
+            batch.status = BATCH_FINALIZED
+            batch.finalized_at = datetime.utcnow()
+            promoted = True
+        db.flush()
+    
+    values = {
+        PowerReading.is_on_chain: True,
+        PowerReading.batch_id: batch.id,
+        PowerReading.blockchain_tx_hash: blockchain_tx_hash
+    }
+    if blockchain_block_number:
+        values[PowerReading.blockchain_block_number] = blockchain_block_number
+    
+    # Single UPDATE ... WHERE id BETWEEN, no rows loaded into Python
+    query = db.query(PowerReading).filter(
+        PowerReading.id.between(first_reading_id, last_reading_id),
+        PowerReading.is_verified == True,
+        PowerReading.is_on_chain == False
+    )
+    if installation_id is not None:
+        query = query.filter(PowerReading.installation_id == installation_id)
+    updated_count = query.update(values, synchronize_session=False)
+    
+    if created and updated_count == 0:
+        # Nothing to mark (already on-chain or unknown range): don't keep an empty batch
+        db.delete(batch)
+        db.flush()
+        return None, 0, False
+    
+    # Confirmed ranges no longer need their lease
+    db.query(PendingLease).filter(
+        PendingLease.first_reading_id <= last_reading_id,
+        PendingLease.last_reading_id >= first_reading_id
+    ).delete(synchronize_session=False)
+    
+    return batch, updated_count, promoted
+
+
+def revert_batch_confirmation(db: Session, blockchain_tx_hash: str) -> Tuple[Optional[str], int]:
+    """
+    Undo a pending batch whose transaction was dropped by a reorg.
+    Its readings become pending again so the oracle can resubmit them.
+    Returns (status, reverted_count); finalized batches are never reverted.
+    """
+    batch = db.query(OnchainBatch).filter(
+        OnchainBatch.blockchain_tx_hash == blockchain_tx_hash
+    ).first()
+    if not batch:
+        return None, 0
+    if batch.status == BATCH_FINALIZED:
+        return BATCH_FINALIZED, 0
+    
+    reverted_count = db.query(PowerReading).filter(
+        PowerReading.batch_id == batch.id
+    ).update({
+        PowerReading.is_on_chain: False,
+        PowerReading.batch_id: None,
+        PowerReading.blockchain_tx_hash: None,
+        PowerReading.blockchain_block_number: None
+    }, synchronize_session=False)
+    db.delete(batch)
+    db.flush()
+    return BATCH_PENDING, reverted_count
+
+
+def _apply_bulk_item(db: Session, item: dict, result: dict) -> None:
+    """Apply one bulk confirmation and fill in its result"""
+    if item.get("removed"):
+        previous_status, reverted_count = revert_batch_confirmation(db, item["blockchain_tx_hash"])
+        if previous_status == BATCH_PENDING:
+            result["status"] = "reverted"
+            result["updated_count"] = reverted_count
+        elif previous_status == BATCH_FINALIZED:
+            result["status"] = "already_finalized"
+        else:
+            result["status"] = "unknown_batch"
+        return
+
+    batch, updated_count, promoted = apply_batch_confirmation(
+        db,
+        first_reading_id=item["first_reading_id"],
+        last_reading_id=item["last_reading_id"],
+        blockchain_tx_hash=item["blockchain_tx_hash"],
+        blockchain_block_number=item.get("blockchain_block_number"),
+        merkle_root=item.get("merkle_root"),
+        finalized=item.get("finalized", True),
+        installation_id=item.get("installation_id"),
+    )
+    if updated_count == 0 and not promoted:
+        result["status"] = "already_marked"
+    else:
+        result["status"] = "finalized" if promoted and updated_count == 0 else "marked"
+        result["batch_id"] = batch.id
+        result["updated_count"] = updated_count
+
+
+def apply_bulk_confirmations(db: Session, batches: List[dict]) -> Tuple[List[dict], int]:
+    """
+    Apply many confirmations (dicts shaped like the mark-on-chain payload).
+    Items with removed=True revert a pending batch instead.
+    Each item runs in its own savepoint: one the database rejects (constraint or
+    data error) is rolled back alone and reported as "rejected". Other errors
+    (e.g. a lost connection) propagate and the caller rolls back everything.
+    Returns (per-batch results, total updated readings); the caller is responsible for committing.
+    """
+    results = []
+    total_updated = 0
+    for item in batches:
+        result = {
+            "first_reading_id": item["first_reading_id"],
+            "last_reading_id": item["last_reading_id"],
+            "blockchain_tx_hash": item.get("blockchain_tx_hash"),
+            "batch_id": None,
+            "updated_count": 0
+        }
+        if not item.get("blockchain_tx_hash") or item["first_reading_id"] > item["last_reading_id"]:
+            result["status"] = "invalid"
+            results.append(result)
+            continue
+
+        try:
+            with db.begin_nested():
+                _apply_bulk_item(db, item, result)
+        except (DataError, IntegrityError) as e:
+            result.update(status="rejected", batch_id=None, updated_count=0, error=str(e.orig))
+        if result["status"] == "marked":
+            total_updated += result["updated_count"]
+        results.append(result)
+
+    return results, total_updated
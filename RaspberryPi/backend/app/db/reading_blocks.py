@@ -0,0 +1,277 @@
+"""Compact storage of finalized raw readings, one row per installation hour.
+
+With READING_STORAGE=blocks, aggregation seals the raw readings it retires
+into ReadingBlock rows instead of dropping them, so full signed readings stay
+available after the 24h window. Every numeric field is a column of its own,
+delta encoded and written as zigzag LEB128 varints (the idea behind
+compressReadings in the Chainlink source): at a 10s cadence a timestamp or id
+delta is one byte. power_w and total_wh are stored as integers at the fewest
+decimals that reproduce every value of the block exactly (float64 otherwise).
+Signatures are kept alongside, newline separated.
+
+There is exactly one block per installation hour (a unique constraint on
+installation_id, hour_start): readings of an hour sealed by a later
+aggregation chunk are decoded together with the existing block and the block
+is re-encoded in place.
+"""
+import os
+import struct
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.db.models import OnchainBatch, PowerReading, ReadingBlock
+
+# "rows" drops raw readings once aggregated; "blocks" seals them into reading_blocks first
+READING_STORAGE = os.getenv("READING_STORAGE", "rows")
+BLOCK_SECONDS = 3600
+FLOAT64_SCALE = -1
+MAX_SCALE = 6
+
+_EPOCH = datetime(1970, 1, 1)
+FLAG_VERIFIED = 1
+FLAG_ON_CHAIN = 2
+
+
+def blocks_enabled() -> bool:
+    return READING_STORAGE == "blocks"
+
+
+def encode_varints(values: Iterable[int]) -> bytes:
+    """Zigzag LEB128 varints of signed integers"""
+    out = bytearray()
+    for value in values:
+        value = (value << 1) ^ (value >> 63)
+        while value >= 0x80:
+            out.append((value & 0x7F) | 0x80)
+            value >>= 7
+        out.append(value)
+    return bytes(out)
+
+
+def decode_varints(data: bytes) -> List[int]:
+    values = []
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        values.append((value >> 1) ^ -(value & 1))
+        value = shift = 0
+    return values
+
+
+def encode_deltas(values: Sequence[int]) -> bytes:
+    return encode_varints(b - a for a, b in zip([0, *values], values))
+
+
+def decode_deltas(data: bytes) -> List[int]:
+    values, total = [], 0
+    for delta in decode_varints(data):
+        total += delta
+        values.append(total)
+    return values
+
+
+def encode_floats(values: Sequence[float]):
+    """(scale, bytes): delta varints of value * 10**scale if that is exact, else raw float64"""
+    for scale in range(MAX_SCALE + 1):
+        factor = 10 ** scale
+        scaled = [round(value * factor) for value in values]
+        if all(s / factor == value for s, value in zip(scaled, values)):
+            return scale, encode_deltas(scaled)
+    return FLOAT64_SCALE, struct.pack(f"<{len(values)}d", *values)
+
+
+def decode_floats(scale: int, data: bytes) -> List[float]:
+    if scale == FLOAT64_SCALE:
+        return list(struct.unpack(f"<{len(data) // 8}d", data))
+    factor = 10 ** scale
+    return [value / factor for value in decode_deltas(data)]
+
+
+def _micros(value: datetime) -> int:
+    return (value - _EPOCH) // timedelta(microseconds=1)
+
+
+def _from_micros(value: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=value)
+
+
+def encode_block(installation_id: int, readings: Sequence[PowerReading]) -> ReadingBlock:
+    """One block from readings of a single hour, in (timestamp, id) order"""
+    power_scale, power = encode_floats([r.power_w for r in readings])
+    total_scale, total = encode_floats([r.total_wh for r in readings])
+    created = [_micros(r.created_at) for r in readings]
+    return ReadingBlock(
+        installation_id=installation_id,
+        hour_start=readings[0].timestamp // BLOCK_SECONDS * BLOCK_SECONDS,
+        first_timestamp=readings[0].timestamp,
+        last_timestamp=readings[-1].timestamp,
+        reading_count=len(readings),
+        reading_ids=encode_deltas([r.id for r in readings]),
+        timestamps=encode_deltas([r.timestamp for r in readings]),
+        power_scale=power_scale,
+        power_w=power,
+        total_scale=total_scale,
+        total_wh=total,
+        created_at_us=encode_deltas(created),
+        # Offset from created_at plus one; 0 for readings never verified
+        verified_at_us=encode_varints(
+            _micros(r.verification_timestamp) - c + 1 if r.verification_timestamp else 0
+            for r, c in zip(readings, created)
+        ),
+        flags=bytes((FLAG_VERIFIED if r.is_verified else 0) | (FLAG_ON_CHAIN if r.is_on_chain else 0)
+                    for r in readings),
+        batch_ids=encode_deltas([r.batch_id or 0 for r in readings]),
+        signatures="\n".join(r.signature or "" for r in readings),
+    )
+
+
+def _decode_rows(block: ReadingBlock) -> List[SimpleNamespace]:
+    """Readings of a block with the PowerReading attributes encode_block reads, in (timestamp, id) order"""
+    verified_at = decode_varints(block.verified_at_us)
+    created = decode_deltas(block.created_at_us)
+    rows = []
+    for reading_id, timestamp, power_w, total_wh, created_us, verified_us, flags, batch_id, signature in zip(
+        decode_deltas(block.reading_ids),
+        decode_deltas(block.timestamps),
+        decode_floats(block.power_scale, block.power_w),
+        decode_floats(block.total_scale, block.total_wh),
+        created,
+        verified_at,
+        block.flags,
+        decode_deltas(block.batch_ids),
+        block.signatures.split("\n"),
+    ):
+        rows.append(SimpleNamespace(
+            id=reading_id,
+            timestamp=timestamp,
+            power_w=power_w,
+            total_wh=total_wh,
+            signature=signature or None,
+            is_verified=bool(flags & FLAG_VERIFIED),
+            verification_timestamp=_from_micros(created_us + verified_us - 1) if verified_us else None,
+            is_on_chain=bool(flags & FLAG_ON_CHAIN),
+            batch_id=batch_id or None,
+            created_at=_from_micros(created_us),
+        ))
+    return rows
+
+
+def decode_block(block: ReadingBlock, batches: Dict[int, OnchainBatch]) -> List[dict]:
+    """Readings of a block as PowerReadingResponse fields, in timestamp order"""
+    readings = []
+    for row in _decode_rows(block):
+        batch = batches.get(row.batch_id)
+        readings.append({
+            "id": row.id,
+            "installation_id": block.installation_id,
+            "power_w": row.power_w,
+            "total_wh": row.total_wh,
+            "timestamp": row.timestamp,
+            "signature": row.signature,
+            "is_verified": row.is_verified,
+            "verification_timestamp": row.verification_timestamp,
+            "is_on_chain": row.is_on_chain,
+            "blockchain_tx_hash": batch.blockchain_tx_hash if batch else None,
+            "blockchain_block_number": batch.blockchain_block_number if batch else None,
+            "created_at": row.created_at,
+        })
+    return readings
+
+
+def _merge_into(block: ReadingBlock, readings: Sequence) -> None:
+    """Re-encode *block* in place with *readings* added"""
+    rows = sorted([*_decode_rows(block), *readings], key=lambda r: (r.timestamp, r.id))
+    merged = encode_block(block.installation_id, rows)
+    for column in ReadingBlock.__table__.columns.keys():
+        if column not in ("id", "installation_id", "hour_start"):
+            setattr(block, column, getattr(merged, column))
+
+
+def seal_readings(db: Session, installation_id: int, readings: Sequence[PowerReading]) -> int:
+    """Seal *readings* into their hours' blocks; the caller deletes the rows and commits. Returns blocks added.
+
+    An hour that already has a block (sealed by an earlier chunk) is merged into it.
+    """
+    hours: Dict[int, List[PowerReading]] = {}
+    for reading in sorted(readings, key=lambda r: (r.timestamp, r.id)):
+        hours.setdefault(reading.timestamp // BLOCK_SECONDS * BLOCK_SECONDS, []).append(reading)
+    if not hours:
+        return 0
+    existing = {
+        block.hour_start: block
+        for block in db.query(ReadingBlock).filter(
+            ReadingBlock.installation_id == installation_id,
+            ReadingBlock.hour_start.in_(hours),
+        ).with_for_update()
+    }
+    blocks = 0
+    for hour_start, hour_readings in hours.items():
+        if hour_start in existing:
+            _merge_into(existing[hour_start], hour_readings)
+        else:
+            db.add(encode_block(installation_id, hour_readings))
+            blocks += 1
+    return blocks
+
+
+def merge_duplicate_blocks(db: Session) -> int:
+    """Merge blocks written for the same installation hour before hours were unique; the caller commits.
+
+    Returns the number of blocks removed.
+    """
+    duplicates = db.query(ReadingBlock.installation_id, ReadingBlock.hour_start).group_by(
+        ReadingBlock.installation_id, ReadingBlock.hour_start
+    ).having(func.count(ReadingBlock.id) > 1).all()
+    removed = 0
+    for installation_id, hour_start in duplicates:
+        keep, *rest = db.query(ReadingBlock).filter(
+            ReadingBlock.installation_id == installation_id,
+            ReadingBlock.hour_start == hour_start,
+        ).order_by(ReadingBlock.id).with_for_update().all()
+        _merge_into(keep, [row for block in rest for row in _decode_rows(block)])
+        for block in rest:
+            db.delete(block)
+        removed += len(rest)
+    return removed
+
+
+def block_readings(db: Session, installation_id: int, start_timestamp: Optional[int] = None,
+                   end_timestamp: Optional[int] = None, verified_only: bool = True) -> List[dict]:
+    """Decoded readings of all blocks overlapping [start_timestamp, end_timestamp], filtered like the row queries"""
+    query = db.query(ReadingBlock).filter(ReadingBlock.installation_id == installation_id)
+    if start_timestamp is not None:
+        query = query.filter(ReadingBlock.last_timestamp >= start_timestamp)
+    if end_timestamp is not None:
+        query = query.filter(ReadingBlock.first_timestamp <= end_timestamp)
+    blocks = query.order_by(ReadingBlock.first_timestamp).all()
+    if not blocks:
+        return []
+
+    batch_ids = {batch_id for block in blocks for batch_id in set(decode_deltas(block.batch_ids))} - {0}
+    batches = {b.id: b for b in db.query(OnchainBatch).filter(OnchainBatch.id.in_(batch_ids))} if batch_ids else {}
+    return [
+        reading
+        for block in blocks
+        for reading in decode_block(block, batches)
+        if (start_timestamp is None or reading["timestamp"] >= start_timestamp)
+        and (end_timestamp is None or reading["timestamp"] <= end_timestamp)
+        and (reading["is_verified"] or not verified_only)
+    ]
+
+
+def latest_block_reading(db: Session, installation_id: int, verified_only: bool = True) -> Optional[dict]:
+    """Most recently created sealed reading, for installations with no raw rows left"""
+    block = db.query(ReadingBlock).filter(
+        ReadingBlock.installation_id == installation_id
+    ).order_by(ReadingBlock.last_timestamp.desc()).first()
+    if block is None:
+        return None
+    readings = block_readings(db, installation_id, block.first_timestamp, block.last_timestamp, verified_only)
+    return max(readings, key=lambda r: r["created_at"], default=None)
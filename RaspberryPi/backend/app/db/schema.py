@@ -0,0 +1,23 @@
+"""Explicit schema step, run at startup or via init_db.py instead of at import time."""
+from typing import List
+
+from sqlalchemy import inspect
+
+from app.db.database import engine
+from app.db.models import Base
+
+
+def missing_tables() -> List[str]:
+    """Model tables that do not exist in the database yet."""
+    existing = set(inspect(engine).get_table_names())
+    return sorted(name for name in Base.metadata.tables if name not in existing)
+
+
+def ensure_schema(create: bool = True) -> List[str]:
+    """Create missing tables (if *create*) and return the ones still missing.
+
+    New columns on existing tables still need their migrate_add_*.py script.
+    """
+    if create and missing_tables():
+        Base.metadata.create_all(bind=engine)
+    return missing_tables()
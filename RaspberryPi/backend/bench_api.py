@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Concurrency benchmark for the API: sync (thread pool) vs async (AsyncSession) hot endpoints.
+
+For every mode, starts `uvicorn main:app` with API_DB_MODE set accordingly, keeps
+--chart-clients clients hammering a slow chart query and --ingest-clients ESP32-like
+clients posting readings, and reports throughput plus ingest latency percentiles.
+A week of readings is seeded once for a dedicated benchmark installation.
+
+Usage:
+    python bench_api.py --modes sync async --duration 20 --chart-clients 64
+    DATABASE_URL=sqlite:////tmp/bench.db python bench_api.py --seed 50000
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+from dotenv import load_dotenv
+from sqlalchemy import insert
+
+load_dotenv()
+
+BENCH_MAC = "BENCHMARK0001"
+SHELLY_PAYLOAD = base64.b64encode(json.dumps({"mac": BENCH_MAC}).encode()).decode()
+
+def seed(count):
+    """Create the benchmark installation with *count* readings over the last week (once)"""
+    from app.db.models import PowerReading, SolarInstallation
+    from app.db.schema import ensure_schema
+    from app.db.database import SessionLocal
+
+    ensure_schema(create=True)
+    db = SessionLocal()
+    try:
+        installation = db.query(SolarInstallation).filter(SolarInstallation.shelly_mac == BENCH_MAC).first()
+        if installation is None:
+            installation = SolarInstallation(name="Benchmark", shelly_mac=BENCH_MAC, public_key="benchmark-key")
+            db.add(installation)
+            db.commit()
+        existing = db.query(PowerReading).filter(PowerReading.installation_id == installation.id).count()
+        if existing < count:
+            print(f"🌱 Seeding {count - existing} readings...")
+            rng = random.Random(7)
+            step = 604800 // count
+            now = int(time.time())
+            rows = [
+                {
+                    "installation_id": installation.id,
+                    "power_w": round(rng.uniform(0, 3500), 1),
+                    "total_wh": float(i),
+                    "timestamp": now - 604800 + i * step,
+                    "signature": "benchmark",
+                    "is_verified": True,
+                    "is_on_chain": True,
+                }
+                for i in range(existing, count)
+            ]
+            for start in range(0, len(rows), 5000):
+                db.execute(insert(PowerReading), rows[start:start + 5000])
+            db.commit()
+        return installation.id
+    finally:
+        db.close()
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+async def run_load(base_url, installation_id, args):
+    stop = time.monotonic() + args.duration
+    ingest_latencies, chart_latencies, errors = [], [], 0
+
+    async def chart_client(client):
+        nonlocal errors
+        while time.monotonic() < stop:
+            started = time.monotonic()
+            response = await client.get(f"/api/v1/readings/{installation_id}/chart?{args.chart_query}")
+            if response.status_code == 200:
+                chart_latencies.append(time.monotonic() - started)
+            else:
+                errors += 1
+
+    async def ingest_client(client, offset):
+        nonlocal errors
+        timestamp = int(time.time()) + offset * 1_000_000
+        while time.monotonic() < stop:
+            timestamp += 10
+            started = time.monotonic()
+            response = await client.post("/api/v1/readings/", json={
+                "power": 1200.0, "total": 1.0, "timestamp": timestamp,
+                "signature": "benchmark", "shelly_payload": SHELLY_PAYLOAD,
+            })
+            if response.status_code == 200:
+                ingest_latencies.append(time.monotonic() - started)
+            else:
+                errors += 1
+            await asyncio.sleep(args.ingest_interval)
+
+    limits = httpx.Limits(max_connections=args.chart_clients + args.ingest_clients + 4)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        await asyncio.gather(
+            *(chart_client(client) for _ in range(args.chart_clients)),
+            *(ingest_client(client, i) for i in range(args.ingest_clients)),
+        )
+    return ingest_latencies, chart_latencies, errors
+
+def start_server(mode, port):
+    env = {**os.environ, "API_DB_MODE": mode, "AGGREGATION_SCHEDULER": "0", "DISABLE_FACTORY": "1",
+           "SCHEMA_ON_STARTUP": "check"}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/ready", timeout=2).status_code == 200:
+                return server
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.3)
+    server.terminate()
+    raise RuntimeError(f"{mode} server did not become ready")
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync vs async API concurrency benchmark")
+    parser.add_argument("--modes", nargs="+", choices=["sync", "async"], default=["sync", "async"])
+    parser.add_argument("--seed", type=int, default=100000, help="Readings in the benchmark installation")
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--chart-clients", type=int, default=64)
+    parser.add_argument("--ingest-clients", type=int, default=4)
+    parser.add_argument("--ingest-interval", type=float, default=0.05, help="Pause between one client's posts")
+    parser.add_argument("--chart-query", default="time_frame=week&energy_engine=trapezoid")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    print("🚀 WattWitness API Concurrency Benchmark")
+    print("=" * 50)
+    installation_id = seed(args.seed)
+
+    results = {}
+    for mode in args.modes:
+        server = start_server(mode, args.port)
+        try:
+            print(f"⏱️  {mode}: {args.chart_clients} chart + {args.ingest_clients} ingest clients "
+                  f"for {args.duration:.0f}s")
+            results[mode] = asyncio.run(run_load(f"http://127.0.0.1:{args.port}", installation_id, args))
+        finally:
+            server.terminate()
+            server.wait()
+
+    print()
+    print(f"{'mode':<6} {'chart/s':>8} {'ingest/s':>9} {'ingest p50':>11} {'p95':>8} {'p99':>8} {'max':>8} {'errors':>7}")
+    for mode, (ingest, chart, errors) in results.items():
+        ms = [value * 1000 for value in ingest]
+        print(f"{mode:<6} {len(chart) / args.duration:>8.1f} {len(ingest) / args.duration:>9.1f} "
+              f"{percentile(ms, 50):>9.1f}ms {percentile(ms, 95):>6.1f}ms {percentile(ms, 99):>6.1f}ms "
+              f"{max(ms, default=float('nan')):>6.1f}ms {errors:>7}")
+        if ingest:
+            print(f"       ingest mean {statistics.mean(ms):.1f}ms over {len(ingest)} requests")
+
+if __name__ == "__main__":
+    main()
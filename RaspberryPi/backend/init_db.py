@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+"""
+Create any missing tables for the WattWitness backend.
+Run this once after installing or upgrading, or leave SCHEMA_ON_STARTUP=create
+to let the API do it in the background when it starts.
+"""
+
+import sys
+
+from app.db.schema import ensure_schema, missing_tables
+
+if __name__ == "__main__":
+    print("🗄️  WattWitness Database Setup")
+    print("=" * 40)
+    before = missing_tables()
+    if not before:
+        print("✅ All tables already exist")
+        sys.exit(0)
+    print(f"📋 Creating table(s): {', '.join(before)}")
+    still_missing = ensure_schema(create=True)
+    if still_missing:
+        print(f"❌ Could not create: {', '.join(still_missing)}")
+        sys.exit(1)
+    print("✅ Schema is up to date")
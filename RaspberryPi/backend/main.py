@@ -1,16 +1,31 @@
 import os
+import threading
+import time
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy import text
 import httpx
 from app.api.endpoints import power
-from app.db.database import engine
-from app.db.models import Base
-
-# Create database tables
-Base.metadata.create_all(bind=engine)
+from app.api.request_classes import RequestClassMiddleware, request_class_stats, start_request_classes
+from app.blockchain.deployments import start_deployment_workers, stop_deployment_workers
+from app.db.aggregation_scheduler import start_aggregation_scheduler, stop_aggregation_scheduler
+from app.db.database import engine, pool_stats, replica_status
+from app.core.config import settings
+from app.core.profiling import enable_sql_profiling
+from app.core.metrics import CONTENT_TYPE_LATEST, MetricsMiddleware, mark_worker_dead, render_metrics
+from app.db.schema import ensure_schema
 
 # Configuration
 TUNNEL_URL = os.getenv("TUNNEL_URL", "https://wattwitness.loca.lt")
+# "sync" serves every endpoint from the thread pool; "async" serves ingest, latest, pending and chart
+# from app/api/endpoints/power_async.py, awaiting the database instead of holding a worker thread
+API_DB_MODE = os.getenv("API_DB_MODE", "sync")
+# Schema step after startup: "create" missing tables, only "check" them, or "skip" (use init_db.py)
+SCHEMA_ON_STARTUP = os.getenv("SCHEMA_ON_STARTUP", "create")
+
+# Set once the startup schema step has passed; reported by /ready
+readiness = {"ready": False, "detail": "starting"}
 
 app = FastAPI(
     title="WattWitness Backend",
@@ -18,6 +33,17 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Statement counts and SQL time per request, innermost so request-class queueing is excluded
+# (see app/core/profiling.py)
+if settings.SQL_PROFILING:
+    enable_sql_profiling(app)
+
+# Per-class concurrency limits, ingest first (see app/api/request_classes.py); added
+# before CORS so shed responses still carry CORS headers
+if settings.REQUEST_SCHEDULING:
+    app.add_middleware(RequestClassMiddleware)
+    app.add_event_handler("startup", start_request_classes)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -25,11 +51,50 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After"],
 )
 
+# Outermost, so /metrics latencies include request-class queueing and shed responses
+app.add_middleware(MetricsMiddleware)
+
 # Include routers
+if API_DB_MODE == "async":
+    # Registered first so they take over the matching sync routes
+    from app.api.endpoints import power_async
+    from app.db.async_database import dispose_async_engine
+
+    app.include_router(power_async.router, prefix="/api/v1", tags=["power"])
+    app.add_event_handler("shutdown", dispose_async_engine)
 app.include_router(power.router, prefix="/api/v1", tags=["power"])
 
+def _prepare():
+    """Schema step and background workers, run off the startup path so the server binds at once"""
+    while True:
+        try:
+            missing = ensure_schema(create=SCHEMA_ON_STARTUP == "create") if SCHEMA_ON_STARTUP != "skip" else []
+            if not missing:
+                break
+            readiness["detail"] = f"missing tables: {', '.join(missing)} (run init_db.py)"
+        except Exception as e:
+            readiness["detail"] = f"schema step failed: {e}"
+        print(f"❌ {readiness['detail']}, retrying in 10s")
+        time.sleep(10)
+    readiness.update(ready=True, detail="ok")
+    # Logger deployments run outside requests (see app/blockchain/deployments.py)
+    start_deployment_workers()
+    # Incremental 10-minute rollups (see app/db/aggregation_scheduler.py)
+    start_aggregation_scheduler()
+
+@app.on_event("startup")
+def start_background_workers():
+    threading.Thread(target=_prepare, name="startup-prepare", daemon=True).start()
+
+@app.on_event("shutdown")
+def stop_background_workers():
+    stop_deployment_workers()
+    stop_aggregation_scheduler()
+    mark_worker_dead()
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to WattWitness Backend"}
@@ -39,6 +104,38 @@ async def root():
 async def health_check():
     return {"status": "healthy", "tunnel_url": TUNNEL_URL}
 
+@app.get("/ready")
+def readiness_check():
+    """Readiness probe: schema step done and database reachable"""
+    if not readiness["ready"]:
+        return JSONResponse(status_code=503, content={"status": "starting", "detail": readiness["detail"]})
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except Exception as e:
+        return JSONResponse(status_code=503, content={"status": "unavailable", "detail": str(e)})
+    return {"status": "ready"}
+
+@app.get("/db/pool")
+def db_pool():
+    """Connection pool state and checkout wait times per engine (this process only)"""
+    return pool_stats()
+
+@app.get("/db/replica")
+def db_replica():
+    """Read-replica lag and how many read sessions went to the replica vs. fell back to the primary"""
+    return replica_status()
+
+@app.get("/request-classes")
+def request_classes():
+    """Per-class limits, active and queued requests, shed count and queue wait times (this process only)"""
+    return request_class_stats()
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus metrics, merged across workers when PROMETHEUS_MULTIPROC_DIR is set"""
+    return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
 @app.get("/tunnel-status")
 async def tunnel_status():
     """
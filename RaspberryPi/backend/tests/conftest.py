@@ -0,0 +1,44 @@
+import sys
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Ensure backend package is importable before other imports
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app.db.models import Base
+
+
+@pytest.fixture
+def make_sqlite_engine(tmp_path):
+    """Factory for SQLite databases in tmp_path with every model table created"""
+    engines = []
+
+    def make(name: str = "test"):
+        engine = create_engine(f"sqlite:///{tmp_path / (name + '.db')}", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=engine)
+        engines.append(engine)
+        return engine
+
+    yield make
+    for engine in engines:
+        engine.dispose()
+
+
+@pytest.fixture
+def sqlite_engine(make_sqlite_engine):
+    return make_sqlite_engine()
+
+
+@pytest.fixture
+def session_factory(sqlite_engine):
+    return sessionmaker(autocommit=False, autoflush=False, bind=sqlite_engine)
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
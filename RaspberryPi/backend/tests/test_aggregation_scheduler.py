@@ -0,0 +1,76 @@
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+
+# Ensure backend package is importable before other imports
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app.db import aggregation_scheduler
+from app.db.models import (AggregationWatermark, OnchainBatch, PowerReading, PowerReadingAggregate,
+                           SolarInstallation)
+
+START = 1_700_000_400  # bucket aligned
+
+
+def _seed(session_factory):
+    """One installation, 30 buckets of 20 readings; bucket 10 holds a reading awaiting finality"""
+    db = session_factory()
+    finalized = OnchainBatch(blockchain_tx_hash="0xfinal", status="finalized")
+    pending = OnchainBatch(blockchain_tx_hash="0xpending", status="pending")
+    db.add_all([finalized, pending, SolarInstallation(id=1, name="Site", shelly_mac="MAC", public_key="key")])
+    db.flush()
+    old = datetime.utcnow() - timedelta(days=2)
+    for i in range(600):
+        db.add(PowerReading(installation_id=1, power_w=float(i % 50) * 10, total_wh=0.0,
+                            timestamp=START + i * 30, is_verified=True, is_on_chain=True,
+                            batch_id=pending.id if i == 205 else finalized.id, created_at=old))
+    db.commit()
+    pending_id = pending.id
+    db.close()
+    return pending_id
+
+
+def _watermark(session_factory):
+    db = session_factory()
+    try:
+        return db.get(AggregationWatermark, 1).last_bucket
+    finally:
+        db.close()
+
+
+def test_tick_stops_at_first_unfinalized_reading_and_resumes(session_factory):
+    pending_id = _seed(session_factory)
+
+    totals = aggregation_scheduler.run_tick(session_factory, engine_name="python")
+    assert totals["aggregates"] == 10
+    assert _watermark(session_factory) == START + 9 * 600
+
+    # Nothing became eligible since
+    assert aggregation_scheduler.run_tick(session_factory, engine_name="sql")["readings"] == 0
+
+    db = session_factory()
+    db.get(OnchainBatch, pending_id).status = "finalized"
+    db.commit()
+    db.close()
+
+    totals = aggregation_scheduler.run_tick(session_factory, engine_name="sql")
+    assert totals["aggregates"] == 20
+    assert _watermark(session_factory) == START + 29 * 600
+
+    db = session_factory()
+    try:
+        assert db.query(PowerReading).count() == 0
+        assert db.query(PowerReadingAggregate).count() == 30
+        assert {a.reading_count for a in db.query(PowerReadingAggregate)} == {20}
+        [lag] = aggregation_scheduler.aggregation_lag(db)
+        assert lag["last_bucket"] == START + 29 * 600
+        assert lag["backlog_readings"] == 0
+    finally:
+        db.close()
+
+
+def test_tick_budget_leaves_installations_for_next_tick(session_factory):
+    _seed(session_factory)
+    assert aggregation_scheduler.run_tick(session_factory, budget=0)["installations"] == 0
+    assert _watermark(session_factory) is None
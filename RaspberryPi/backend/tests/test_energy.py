@@ -0,0 +1,61 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Ensure backend package is importable before other imports
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app.db import energy
+from app.db.models import PowerReading, SolarInstallation
+
+START = 1_700_002_800  # hour aligned
+POWER_W = 1200.0
+
+
+def _seed(db, boot_timestamp=None, offset=5000.0):
+    """Three hours at constant power every 10s from *offset* Wh; the meter counter restarts from 0 at boot_timestamp"""
+    db.add(SolarInstallation(id=1, name="Site", shelly_mac="MAC", public_key="key"))
+    for i in range(3 * 360 + 1):
+        timestamp = START + i * 10 + 3  # readings never sit on an edge
+        since = timestamp - boot_timestamp if boot_timestamp and timestamp >= boot_timestamp else timestamp - START
+        base = 0.0 if boot_timestamp and timestamp >= boot_timestamp else offset
+        db.add(PowerReading(installation_id=1, power_w=POWER_W, total_wh=base + POWER_W * since / 3600,
+                            timestamp=timestamp, is_verified=True))
+    db.commit()
+
+
+def test_counter_interpolates_bucket_edges(db):
+    _seed(db)
+    edges = [START + 3600, START + 7200, START + 10800]
+    energies = energy.counter_bucket_energies(db, 1, edges)
+    assert energies == pytest.approx([POWER_W, POWER_W])
+    # The trapezoid rule loses the reading pair straddling each edge
+    trapezoid = energy.trapezoid_bucket_energies(db, 1, edges)
+    assert trapezoid == pytest.approx([POWER_W - POWER_W * 10 / 3600] * 2)
+
+
+def test_counter_reset_at_boot_is_stitched(db):
+    boot = START + 5405
+    _seed(db, boot_timestamp=boot)
+    edges = [START + 3600, START + 7200, START + 10800]
+    energies = energy.counter_bucket_energies(db, 1, edges, boot_timestamp=boot)
+    assert energies == pytest.approx([POWER_W, POWER_W])
+
+
+def test_counter_reset_mid_bucket_is_detected_without_boot_timestamp(db):
+    # The counter restarts mid-bucket and ends above its value at the bucket start
+    boot = START + 5405
+    _seed(db, boot_timestamp=boot, offset=0.0)
+    edges = [START + 3600, START + 10800]
+    energies = energy.counter_bucket_energies(db, 1, edges)
+    assert energies == pytest.approx([2 * POWER_W])
+
+
+def test_crosscheck_returns_trapezoid_values(db):
+    _seed(db)
+    edges = [START, START + 3600]
+    energies, checks = energy.bucket_energies(db, 1, edges, engine="crosscheck")
+    assert energies[0] == pytest.approx(POWER_W * (3600 - 3) / 3600)
+    assert checks[0] == pytest.approx(POWER_W * (3593 - 3) / 3600)
+    assert energy.bucket_energies(db, 1, edges, engine="counter")[1] is None
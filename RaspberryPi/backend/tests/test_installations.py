@@ -1,35 +1,249 @@
+import base64
+import json
 import os
 import sys
+import time
 from pathlib import Path
 
-# Disable on-chain factory for test environment
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+
+# Disable on-chain factory for test environment (deployments are driven by hand below)
 os.environ["DISABLE_FACTORY"] = "1"
 
 # Ensure backend package is importable before other imports
-root = Path(__file__).resolve().parents[3]
-sys.path.append(str(root / "RaspberryPi" / "backend"))
+sys.path.append(str(Path(__file__).resolve().parents[1]))
 
-from fastapi.testclient import TestClient
-from app.main import app
+import main
 from app.api.endpoints import power
+from app.blockchain import deployments
+from app.blockchain.errors import DeploymentReverted
+from app.db import aggregation_scheduler, database, schema
+from app.db.database import SessionLocal
+
+LOGGER = "0x000000000000000000000000000000000000dEaD"
+PAYLOAD = {
+    "name": "Test Site",
+    "public_key": "deadbeef",
+    "shelly_payload": base64.b64encode(json.dumps({"mac": "AABBCCDDEEFF"}).encode()).decode(),
+    "boot_timestamp": 0,
+}
+
+
+class FakeFactory:
+    """Stands in for the factory and node; records what was signed and broadcast"""
+
+    def __init__(self):
+        self.signed = []
+        self.broadcasts = []
+        self.known_txs = set()
+        self.loggers = {}
+        self.fail_broadcast = None
+        self.wait_error = None
+        self.released = 0
+
+    def sign(self, **kwargs):
+        tx_hash = f"0xhash{len(self.signed)}"
+        self.signed.append(tx_hash)
+        return tx_hash, f"0xraw-{tx_hash}"
+
+    def broadcast(self, raw_tx):
+        tx_hash = raw_tx.split("-", 1)[1]
+        self.broadcasts.append(tx_hash)
+        self.known_txs.add(tx_hash)
+        if self.fail_broadcast:
+            raise self.fail_broadcast
+        return tx_hash
+
+    def release(self):
+        self.released += 1
 
-client = TestClient(app)
+    def wait(self, tx_hash, installation_id, timeout=None):
+        if self.wait_error:
+            raise self.wait_error
+        self.loggers[installation_id] = LOGGER
+        return LOGGER
 
-def test_create_installation_stub_factory(monkeypatch):
-    # Monkeypatch deploy_logger_for_installation to avoid blockchain
-    def _fake_deploy(**kwargs):
-        return ("0x000000000000000000000000000000000000dEaD", "0xhash")
 
-    monkeypatch.setattr(power, "deploy_logger_for_installation", _fake_deploy)
+@pytest.fixture
+def factory(monkeypatch):
+    fake = FakeFactory()
+    monkeypatch.setattr(power, "deployments_enabled", lambda: True)
+    monkeypatch.setattr(deployments, "sign_logger_deployment", fake.sign)
+    monkeypatch.setattr(deployments, "broadcast_logger_deployment", fake.broadcast)
+    monkeypatch.setattr(deployments, "release_unsent_deployment", fake.release)
+    monkeypatch.setattr(deployments, "deployment_transaction_known", lambda tx_hash: tx_hash in fake.known_txs)
+    monkeypatch.setattr(deployments, "find_deployed_logger", lambda installation_id: fake.loggers.get(installation_id))
+    monkeypatch.setattr(deployments, "wait_for_logger_deployment", fake.wait)
+    # Failed attempts are due again at once
+    monkeypatch.setattr(deployments, "DEPLOYMENT_RETRY_SECONDS", 0)
+    return fake
 
-    payload = {
-        "name": "Test Site",
-        "public_key": "deadbeef",
-        "shelly_payload": "{}".encode().hex(),  # minimal base64 placeholder ignored by stub
-        "boot_timestamp": 0
-    }
-    response = client.post("/api/v1/installations/", json=payload)
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'installations.db'}", connect_args={"check_same_thread": False})
+    # The app's engine is bound at import; point the startup schema step and every session at this database
+    monkeypatch.setattr(schema, "engine", engine)
+    monkeypatch.setattr(main, "engine", engine)
+    monkeypatch.setattr(aggregation_scheduler, "AGGREGATION_SCHEDULER", False)
+    monkeypatch.setitem(main.readiness, "ready", False)
+    SessionLocal.configure(bind=engine)
+    try:
+        with TestClient(main.app) as client:
+            deadline = time.monotonic() + 10
+            while client.get("/ready").status_code != 200:
+                assert time.monotonic() < deadline, "startup schema step did not finish"
+                time.sleep(0.05)
+            yield client
+    finally:
+        SessionLocal.configure(bind=database.engine)
+
+
+def run_due_job():
+    db = SessionLocal()
+    try:
+        job_id = deployments.claim_next_job(db)
+        assert job_id is not None
+        deployments.run_deployment_job(db, job_id)
+    finally:
+        db.close()
+
+
+def deployment(client, installation_id):
+    response = client.get(f"/api/v1/installations/{installation_id}/deployment")
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_deployment_pending_sent_confirmed(client, factory):
+    response = client.post("/api/v1/installations/", json=PAYLOAD)
     assert response.status_code == 200
     data = response.json()
-    assert data["logger_contract_address"] == "0x000000000000000000000000000000000000dEaD"
-    assert data["deployment_tx_hash"] == "0xhash" 
\ No newline at end of file
+    # Deployment is queued, not performed inside the request
+    assert data["deployment_status"] == "pending"
+    assert data["logger_contract_address"] is None
+    assert deployment(client, data["id"])["status"] == "pending"
+
+    # Broadcast, but the receipt wait times out: the job stays sent
+    factory.wait_error = TimeoutError("receipt not found")
+    run_due_job()
+    status = deployment(client, data["id"])
+    assert status["status"] == "sent"
+    assert status["tx_hash"] == "0xhash0"
+    assert status["attempts"] == 1
+
+    # The retry waits on the same transaction instead of sending another
+    factory.wait_error = None
+    run_due_job()
+    status = deployment(client, data["id"])
+    assert status["status"] == "confirmed"
+    assert status["logger_contract_address"] == LOGGER
+    assert status["tx_hash"] == "0xhash0"
+    assert factory.broadcasts == ["0xhash0"]
+    assert client.get(f"/api/v1/installations/{data['id']}").json()["logger_contract_address"] == LOGGER
+
+
+def test_dropped_transaction_is_rebroadcast(client, factory):
+    installation_id = client.post("/api/v1/installations/", json=PAYLOAD).json()["id"]
+    factory.wait_error = TimeoutError("receipt not found")
+    run_due_job()
+    assert deployment(client, installation_id)["status"] == "sent"
+
+    # The node dropped the transaction from its mempool: waiting on it again cannot succeed
+    factory.known_txs.clear()
+    run_due_job()
+    status = deployment(client, installation_id)
+    assert status["status"] == "pending"
+    assert status["tx_hash"] == "0xhash0"
+
+    # The same signed transaction is sent again rather than a second deployment
+    factory.wait_error = None
+    run_due_job()
+    assert deployment(client, installation_id)["status"] == "confirmed"
+    assert factory.signed == ["0xhash0"]
+    assert factory.broadcasts == ["0xhash0", "0xhash0"]
+
+
+def test_broadcast_error_does_not_send_twice(client, factory):
+    installation_id = client.post("/api/v1/installations/", json=PAYLOAD).json()["id"]
+
+    # The node accepted the transaction but the call failed before we heard back
+    factory.fail_broadcast = ConnectionError("connection reset")
+    run_due_job()
+    status = deployment(client, installation_id)
+    assert status["status"] == "pending"
+    assert status["tx_hash"] == "0xhash0"
+
+    factory.fail_broadcast = None
+    run_due_job()
+    assert deployment(client, installation_id)["status"] == "confirmed"
+    assert factory.signed == ["0xhash0"]
+    assert factory.broadcasts == ["0xhash0"]
+
+
+def test_unstored_signed_transaction_releases_its_nonce(client, factory, monkeypatch):
+    installation_id = client.post("/api/v1/installations/", json=PAYLOAD).json()["id"]
+    failing = []
+
+    def fail_commit(session):
+        if failing:
+            failing.clear()
+            raise ConnectionError("database went away")
+
+    def sign_then_fail_commit(**kwargs):
+        # Only the commit storing the signed transaction fails
+        failing.append(True)
+        return factory.sign(**kwargs)
+
+    monkeypatch.setattr(deployments, "sign_logger_deployment", sign_then_fail_commit)
+    event.listen(SessionLocal, "before_commit", fail_commit)
+    try:
+        run_due_job()
+    finally:
+        event.remove(SessionLocal, "before_commit", fail_commit)
+    # The signed transaction was never stored, so it is never sent and its nonce is given back
+    status = deployment(client, installation_id)
+    assert status["status"] == "pending"
+    assert status["tx_hash"] is None
+    assert factory.released == 1
+    assert factory.broadcasts == []
+
+    run_due_job()
+    assert deployment(client, installation_id)["status"] == "confirmed"
+    assert factory.broadcasts == ["0xhash1"]
+
+
+def test_restarted_failed_job_uses_factory_logger(client, factory, monkeypatch):
+    monkeypatch.setattr(deployments, "DEPLOYMENT_MAX_ATTEMPTS", 1)
+    installation_id = client.post("/api/v1/installations/", json=PAYLOAD).json()["id"]
+    factory.wait_error = TimeoutError("receipt not found")
+    run_due_job()
+    assert deployment(client, installation_id)["status"] == "failed"
+
+    # The transaction was mined after all; the ESP32 re-registering restarts the job
+    factory.loggers[installation_id] = LOGGER
+    assert client.post("/api/v1/installations/", json=PAYLOAD).json()["deployment_status"] == "pending"
+    run_due_job()
+    status = deployment(client, installation_id)
+    assert status["status"] == "confirmed"
+    assert status["logger_contract_address"] == LOGGER
+    assert factory.signed == ["0xhash0"]
+    assert factory.broadcasts == ["0xhash0"]
+
+
+def test_reverted_deployment_signs_a_new_transaction(client, factory):
+    installation_id = client.post("/api/v1/installations/", json=PAYLOAD).json()["id"]
+    factory.wait_error = DeploymentReverted("Logger deployment tx reverted")
+    run_due_job()
+    status = deployment(client, installation_id)
+    assert status["status"] == "pending"
+    assert status["tx_hash"] is None
+
+    factory.wait_error = None
+    run_due_job()
+    status = deployment(client, installation_id)
+    assert status["status"] == "confirmed"
+    assert status["tx_hash"] == "0xhash1"
+    assert factory.broadcasts == ["0xhash0", "0xhash1"]
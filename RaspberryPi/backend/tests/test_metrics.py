@@ -0,0 +1,49 @@
+import sys
+from pathlib import Path
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+# Ensure backend package is importable before other imports
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app.core import metrics
+from app.db import database
+
+
+def _sample(name, labels):
+    return metrics.REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_requests_labelled_by_route_template():
+    app = FastAPI()
+    app.add_middleware(metrics.MetricsMiddleware)
+
+    @app.get("/api/v1/things/{thing_id}")
+    def thing(thing_id: int):
+        return {"id": thing_id}
+
+    labels = {"method": "GET", "route": "/api/v1/things/{thing_id}", "status": "200"}
+    before = _sample("wattwitness_http_requests_total", labels)
+    with TestClient(app) as client:
+        client.get("/api/v1/things/1")
+        client.get("/api/v1/things/2")
+        client.get("/elsewhere")
+    assert _sample("wattwitness_http_requests_total", labels) == before + 2
+    assert _sample("wattwitness_http_requests_total", {"method": "GET", "route": "unmatched", "status": "404"}) >= 1
+
+
+def test_queries_counted_per_engine_and_operation(sqlite_engine, monkeypatch):
+    monkeypatch.setitem(database.engines, "test", sqlite_engine)
+    labels = {"engine": "test", "operation": "SELECT"}
+    with sqlite_engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        conn.execute(text("  select 2"))
+        try:
+            conn.execute(text("SELECT * FROM missing_table"))
+        except Exception:
+            pass
+    assert _sample("wattwitness_db_queries_total", labels) == 2
+    assert _sample("wattwitness_db_query_duration_seconds_count", labels) == 2
+    assert _sample("wattwitness_db_errors_total", {"engine": "test"}) == 1
@@ -0,0 +1,68 @@
+import sys
+from pathlib import Path
+
+import pytest
+from sqlalchemy import text
+
+# Ensure backend package is importable before other imports
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app.db.models import OnchainBatch, PowerReading, SolarInstallation
+from app.db.onchain import apply_batch_confirmation, apply_bulk_confirmations
+
+
+@pytest.fixture
+def db(db):
+    db.add(SolarInstallation(id=1, name="Site A", shelly_mac="MAC-A", public_key="key-a"))
+    db.add(SolarInstallation(id=2, name="Site B", shelly_mac="MAC-B", public_key="key-b"))
+    # Interleaved ids: 1, 3, 5 belong to installation 1 and 2, 4, 6 to installation 2
+    for i in range(6):
+        db.add(PowerReading(installation_id=1 + i % 2, power_w=100.0, total_wh=float(i),
+                            timestamp=1_700_000_000 + i * 10, signature="sig",
+                            is_verified=True, is_on_chain=False))
+    db.commit()
+    return db
+
+
+def on_chain_ids(db):
+    return [r.id for r in db.query(PowerReading).filter(PowerReading.is_on_chain == True).order_by(PowerReading.id)]
+
+
+def test_confirmation_marks_only_its_installation(db):
+    _, updated, _ = apply_batch_confirmation(db, 1, 6, "0xaaa", 100, installation_id=2)
+    db.commit()
+    assert updated == 3
+    assert on_chain_ids(db) == [2, 4, 6]
+
+
+def test_confirmation_without_installation_marks_whole_range(db):
+    _, updated, _ = apply_batch_confirmation(db, 1, 6, "0xaaa", 100)
+    db.commit()
+    assert updated == 6
+
+
+def test_bulk_confirmations_pass_installation(db):
+    results, total = apply_bulk_confirmations(db, [
+        {"first_reading_id": 1, "last_reading_id": 6, "blockchain_tx_hash": "0xaaa", "installation_id": 1},
+    ])
+    db.commit()
+    assert total == 3
+    assert on_chain_ids(db) == [1, 3, 5]
+    assert db.query(OnchainBatch).count() == 1
+
+
+def test_bulk_rejected_batch_does_not_roll_back_the_others(db):
+    db.execute(text(
+        "CREATE TRIGGER reject_bad BEFORE INSERT ON onchain_batches WHEN NEW.blockchain_tx_hash = '0xbad' "
+        "BEGIN SELECT RAISE(ABORT, 'bad batch'); END"
+    ))
+    db.commit()
+    results, total = apply_bulk_confirmations(db, [
+        {"first_reading_id": 1, "last_reading_id": 2, "blockchain_tx_hash": "0xaaa"},
+        {"first_reading_id": 3, "last_reading_id": 4, "blockchain_tx_hash": "0xbad"},
+        {"first_reading_id": 5, "last_reading_id": 6, "blockchain_tx_hash": "0xccc"},
+    ])
+    db.commit()
+    assert [r["status"] for r in results] == ["marked", "rejected", "marked"]
+    assert total == 4
+    assert on_chain_ids(db) == [1, 2, 5, 6]
@@ -0,0 +1,54 @@
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+# Ensure backend package is importable before other imports
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app.api.endpoints.power import lease_pending_readings
+from app.db.models import PendingLease, PowerReading, SolarInstallation
+
+
+@pytest.fixture
+def db(db):
+    db.add(SolarInstallation(id=1, name="Site", shelly_mac="MAC", public_key="key"))
+    for i in range(10):
+        db.add(PowerReading(installation_id=1, power_w=100.0, total_wh=float(i), timestamp=1_700_000_000 + i * 10,
+                            signature="sig", is_verified=True, is_on_chain=False))
+    db.commit()
+    return db
+
+
+def test_same_lease_key_returns_same_range(db):
+    first = lease_pending_readings(db, 4, 300, "request-a")
+    # Other DON nodes of the same request, possibly after more readings arrived
+    db.add(PowerReading(installation_id=1, power_w=1.0, total_wh=0.0, timestamp=1, signature="sig",
+                        is_verified=True, is_on_chain=False))
+    db.commit()
+    again = lease_pending_readings(db, 4, 300, "request-a")
+    assert again.readings == first.readings and again.lease_id == first.lease_id
+    assert db.query(PendingLease).count() == 1
+
+
+def test_different_lease_keys_get_disjoint_ranges(db):
+    a = lease_pending_readings(db, 4, 300, "request-a")
+    b = lease_pending_readings(db, 4, 300, "request-b")
+    assert (a.first_reading_id, a.last_reading_id) == (1, 4)
+    assert (b.first_reading_id, b.last_reading_id) == (5, 8)
+
+
+def test_peek_does_not_lease(db):
+    peek = lease_pending_readings(db, None, 0, "request-a")
+    assert peek.count == 10 and peek.lease_id is None
+    assert db.query(PendingLease).count() == 0
+
+
+def test_expired_lease_key_is_leased_afresh(db):
+    lease_pending_readings(db, 4, 300, "request-a")
+    db.query(PendingLease).update({PendingLease.expires_at: datetime.utcnow() - timedelta(seconds=1)})
+    db.commit()
+    again = lease_pending_readings(db, 4, 300, "request-a")
+    assert again.lease_expires_at > datetime.utcnow()
+    assert db.query(PendingLease).count() == 1
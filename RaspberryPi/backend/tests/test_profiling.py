@@ -0,0 +1,54 @@
+import sys
+from pathlib import Path
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+# Ensure backend package is importable before other imports
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app.core import profiling
+from app.core.config import settings
+
+
+def test_normalize_sql_folds_literals_and_in_lists():
+    assert profiling.normalize_sql(
+        "SELECT a\n  FROM t_1 WHERE id IN (%(id_1_1)s, %(id_1_2)s, %(id_1_3)s) AND name = 'x' LIMIT 10"
+    ) == "SELECT a FROM t_1 WHERE id IN (...) AND name = ? LIMIT ?"
+    assert profiling.normalize_sql("SELECT * FROM t WHERE id = ?") == profiling.normalize_sql(
+        "SELECT *  FROM t WHERE id = ?")
+
+
+def test_slow_request_logged_with_explain(sqlite_engine, session_factory, monkeypatch, capsys):
+    with sqlite_engine.begin() as conn:
+        conn.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, owner INTEGER)"))
+        conn.execute(text("INSERT INTO items (owner) VALUES (1), (1), (2)"))
+
+    def get_session():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app = FastAPI()
+    profiling.enable_sql_profiling(app)
+
+    @app.get("/items")
+    def items(db=Depends(get_session)):
+        # N+1: one lookup per id
+        ids = [row[0] for row in db.execute(text("SELECT id FROM items"))]
+        return [db.execute(text("SELECT owner FROM items WHERE id = :id"), {"id": i}).scalar() for i in ids]
+
+    monkeypatch.setattr(settings, "SLOW_REQUEST_MS", 0.0)
+    monkeypatch.setattr(settings, "SLOW_REQUEST_EXPLAIN", 1)
+    with TestClient(app) as client:
+        response = client.get("/items")
+
+    assert response.json() == [1, 1, 2]
+    assert 'desc="4 queries"' in response.headers["server-timing"]
+    log = capsys.readouterr().out
+    assert "🐢 Slow request GET /items -> 200" in log
+    assert "3x" in log and "SELECT owner FROM items WHERE id = ?" in log
+    assert "SEARCH items USING INTEGER PRIMARY KEY" in log or "SCAN items" in log
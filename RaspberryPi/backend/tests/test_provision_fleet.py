@@ -0,0 +1,70 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Ensure backend package is importable before other imports
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app.blockchain.errors import DeploymentReverted
+from app.blockchain.provision_fleet_cli import await_all, load_checkpoint, send_all
+
+LOGGER = "0x000000000000000000000000000000000000dEaD"
+
+
+class FakeClient:
+    """Stands in for FactoryClient; loggers maps installation ids registered in the factory"""
+
+    def __init__(self):
+        self.loggers = {}
+        self.sent = []
+        self.revert = False
+
+    def deployed_logger(self, installation_id):
+        return self.loggers.get(installation_id)
+
+    def send_create_logger(self, **job):
+        self.sent.append(job["installation_id"])
+        return f"0xhash{job['installation_id']}"
+
+    def wait_for_logger(self, tx_hash, installation_id, timeout=None):
+        if self.revert:
+            raise DeploymentReverted("Logger deployment tx reverted")
+        return LOGGER
+
+
+def job(installation_id):
+    return {"installation_id": installation_id, "name": "Site", "shelly_mac": "MAC", "public_key": "key",
+            "created_at": 0, "is_active": True}
+
+
+@pytest.fixture
+def checkpoint(tmp_path):
+    return tmp_path / "checkpoint.json"
+
+
+def test_logger_in_factory_is_recorded_instead_of_sent(checkpoint):
+    client = FakeClient()
+    client.loggers[1] = LOGGER
+    # Installation 1 reverted on an earlier run; the logger was deployed by the backend meanwhile
+    state = {"1": {"status": "failed", "tx_hash": "0xold", "error": "Logger deployment tx reverted"}}
+    send_all(client, [job(1), job(2)], state, checkpoint)
+    assert client.sent == [2]
+    assert state["1"] == {"status": "confirmed", "tx_hash": "0xold", "logger_contract_address": LOGGER,
+                          "written": False}
+    assert state["2"]["status"] == "sent"
+    assert load_checkpoint(checkpoint) == state
+
+
+def test_revert_with_logger_in_factory_is_confirmed(checkpoint):
+    client = FakeClient()
+    state = {}
+    send_all(client, [job(1), job(2)], state, checkpoint)
+
+    # Both revert; installation 1 already had a logger registered by someone else
+    client.revert = True
+    client.loggers[1] = LOGGER
+    await_all(client, state, checkpoint, workers=2, timeout=1)
+    assert state["1"]["status"] == "confirmed"
+    assert state["1"]["logger_contract_address"] == LOGGER
+    assert state["2"]["status"] == "failed"
@@ -0,0 +1,77 @@
+import random
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+# Ensure backend package is importable before other imports
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import aggregate_readings
+from app.db import reading_blocks
+from app.db.models import OnchainBatch, PowerReading, ReadingBlock, SolarInstallation
+
+FIELDS = ("id", "installation_id", "power_w", "total_wh", "timestamp", "signature", "is_verified",
+          "verification_timestamp", "is_on_chain", "blockchain_tx_hash", "blockchain_block_number", "created_at")
+
+
+def test_varint_and_float_codecs_round_trip():
+    values = [0, 1, -1, 63, -64, 64, 2 ** 40, -(2 ** 52), 1_700_000_000_123_456]
+    assert reading_blocks.decode_varints(reading_blocks.encode_varints(values)) == values
+    assert reading_blocks.decode_deltas(reading_blocks.encode_deltas(values)) == values
+
+    decimals = [1234.5, 0.0, 17.25, 3001.75]
+    scale, data = reading_blocks.encode_floats(decimals)
+    assert scale == 2
+    assert reading_blocks.decode_floats(scale, data) == decimals
+
+    irrational = [1 / 3, 2 / 7]
+    scale, data = reading_blocks.encode_floats(irrational)
+    assert scale == reading_blocks.FLOAT64_SCALE
+    assert reading_blocks.decode_floats(scale, data) == irrational
+
+
+@pytest.mark.parametrize("engine_name", ["python", "sql"])
+def test_aggregation_seals_readings_losslessly(session_factory, monkeypatch, engine_name):
+    monkeypatch.setattr(reading_blocks, "READING_STORAGE", "blocks")
+
+    rng = random.Random(3)
+    db = session_factory()
+    batch = OnchainBatch(blockchain_tx_hash="0xfinal", blockchain_block_number=42, status="finalized")
+    db.add_all([batch, SolarInstallation(id=1, name="Site", shelly_mac="MAC", public_key="key")])
+    db.flush()
+    created = datetime.utcnow() - timedelta(days=2)
+    timestamp, total = 1_700_000_000, 123456.78
+    for i in range(1000):
+        timestamp += rng.choice([10, 10, 10, 11, 300])
+        total = round(total + rng.uniform(0, 5), 2)
+        created += timedelta(microseconds=rng.randint(9_000_000, 11_000_000))
+        db.add(PowerReading(
+            installation_id=1, power_w=round(rng.uniform(0, 3500), 1), total_wh=total, timestamp=timestamp,
+            signature=f"sig{i:04d}" * 8, is_verified=i % 17 != 0,
+            verification_timestamp=created + timedelta(milliseconds=rng.randint(1, 900)) if i % 17 else None,
+            is_on_chain=True, batch_id=batch.id, blockchain_tx_hash="0xfinal", blockchain_block_number=42,
+            created_at=created,
+        ))
+    db.commit()
+    original = [{field: getattr(r, field) for field in FIELDS}
+                for r in db.query(PowerReading).order_by(PowerReading.timestamp, PowerReading.id)]
+    db.close()
+
+    stats = aggregate_readings.aggregate_readings(chunk_size=333, engine_name=engine_name,
+                                                  session_factory=session_factory)
+    assert stats["deleted"] == 1000
+    assert stats["blocks"] > 0
+
+    db = session_factory()
+    try:
+        assert db.query(PowerReading).count() == 0
+        assert db.query(ReadingBlock).count() == stats["blocks"]
+        # Hours split across aggregation chunks are merged into one block
+        assert stats["blocks"] == len({r["timestamp"] // reading_blocks.BLOCK_SECONDS for r in original})
+        assert reading_blocks.block_readings(db, 1, verified_only=False) == original
+        verified = reading_blocks.block_readings(db, 1, original[100]["timestamp"], original[200]["timestamp"])
+        assert verified == [r for r in original[100:201] if r["is_verified"]]
+    finally:
+        db.close()
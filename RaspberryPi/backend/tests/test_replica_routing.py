@@ -0,0 +1,64 @@
+import sys
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Ensure backend package is importable before other imports
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app.core.config import settings
+from app.db import database
+
+
+@pytest.fixture
+def replica(tmp_path, monkeypatch):
+    """Point the module at separate primary and replica SQLite files"""
+    primary_engine = create_engine(f"sqlite:///{tmp_path / 'primary.db'}")
+    replica_engine = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(bind=primary_engine))
+    monkeypatch.setattr(database, "replica_engine", replica_engine)
+    monkeypatch.setattr(database, "ReplicaSessionLocal", sessionmaker(bind=replica_engine))
+    monkeypatch.setattr(database, "replica_state", {**database.replica_state, "checked_at": 0.0,
+                                                    "replica_sessions": 0, "primary_fallbacks": 0})
+    monkeypatch.setattr(settings, "REPLICA_MAX_LAG_SECONDS", 30.0)
+    return primary_engine, replica_engine
+
+
+def _bound_engine():
+    dependency = database.get_read_db()
+    db = next(dependency)
+    try:
+        return db.get_bind()
+    finally:
+        dependency.close()
+
+
+def test_reads_go_to_fresh_replica(replica):
+    _, replica_engine = replica
+    assert _bound_engine() is replica_engine
+    assert database.replica_state["lag_seconds"] == 0.0
+    assert database.replica_state["replica_sessions"] == 1
+
+
+def test_lagging_replica_falls_back_to_primary(replica):
+    primary_engine, _ = replica
+    database.replica_state.update(lag_seconds=120.0, checked_at=float("inf"))
+    assert _bound_engine() is primary_engine
+    assert database.replica_state["primary_fallbacks"] == 1
+
+
+def test_unreachable_replica_falls_back_to_primary(replica, monkeypatch, tmp_path):
+    primary_engine, _ = replica
+    monkeypatch.setattr(database, "replica_engine", create_engine(f"sqlite:///{tmp_path / 'missing' / 'r.db'}"))
+    assert _bound_engine() is primary_engine
+    assert database.replica_state["lag_seconds"] is None
+    assert database.replica_state["error"]
+
+
+def test_no_replica_uses_primary(replica, monkeypatch):
+    primary_engine, _ = replica
+    monkeypatch.setattr(database, "replica_engine", None)
+    assert _bound_engine() is primary_engine
+    assert database.replica_state["primary_fallbacks"] == 0
@@ -0,0 +1,91 @@
+import asyncio
+import sys
+from pathlib import Path
+
+# Ensure backend package is importable before other imports
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from app.api.request_classes import RequestClassMiddleware, classify, parse_request_classes, request_class_stats
+
+
+def test_classify_routes():
+    classes = parse_request_classes("ingest=2,latest=1:1,charts=1:1,exports=1:1,other=1:1")
+    assert classify("POST", "/api/v1/readings/", classes).name == "ingest"
+    assert classify("GET", "/api/v1/readings/pending", classes).name == "ingest"
+    assert classify("POST", "/api/v1/readings/mark-on-chain/bulk", classes).name == "ingest"
+    assert classify("GET", "/api/v1/readings/latest/3", classes).name == "latest"
+    assert classify("GET", "/api/v1/readings/3/chart", classes).name == "charts"
+    assert classify("GET", "/api/v1/readings/3", classes).name == "charts"
+    assert classify("GET", "/api/v1/readings/3/all", classes).name == "exports"
+    assert classify("GET", "/api/v1/installations/", classes).name == "other"
+    assert classify("GET", "/ready", classes) is None
+
+
+def _run(middleware, method, path, responses):
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            responses.append((path, message["status"], dict(message["headers"])))
+
+    return middleware({"type": "http", "method": method, "path": path}, receive, send)
+
+
+def test_low_priority_is_shed_while_ingest_keeps_its_slots():
+    classes = parse_request_classes("ingest=1,exports=1:1,other=1:1")
+    release = asyncio.Event()
+
+    async def app(scope, receive, send):
+        if scope["path"].endswith("/all"):
+            await release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    async def scenario():
+        middleware = RequestClassMiddleware(app, classes, queue_timeout=5, retry_after=7)
+        responses = []
+        running = asyncio.create_task(_run(middleware, "GET", "/api/v1/readings/1/all", responses))
+        queued = asyncio.create_task(_run(middleware, "GET", "/api/v1/readings/2/all", responses))
+        await asyncio.sleep(0.01)
+        # One export running, one waiting: the next one is shed, ingest still goes through
+        await _run(middleware, "GET", "/api/v1/readings/3/all", responses)
+        await _run(middleware, "POST", "/api/v1/readings/", responses)
+        assert classes["exports"].stats()["queued"] == 1
+        release.set()
+        await asyncio.gather(running, queued)
+        return responses
+
+    responses = asyncio.run(scenario())
+    shed = [r for r in responses if r[1] == 503]
+    assert [r[0] for r in shed] == ["/api/v1/readings/3/all"]
+    assert shed[0][2][b"retry-after"] == b"7"
+    assert sorted(r[0] for r in responses if r[1] == 200) == [
+        "/api/v1/readings/", "/api/v1/readings/1/all", "/api/v1/readings/2/all"]
+    stats = request_class_stats(classes)
+    assert stats["exports"]["shed"] == 1 and stats["exports"]["admitted"] == 2
+    assert stats["ingest"]["shed"] == 0 and stats["ingest"]["admitted"] == 1
+
+
+def test_queue_timeout_sheds():
+    classes = parse_request_classes("charts=1:5,other=1:1")
+    release = asyncio.Event()
+
+    async def app(scope, receive, send):
+        await release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    async def scenario():
+        middleware = RequestClassMiddleware(app, classes, queue_timeout=0.05, retry_after=1)
+        responses = []
+        running = asyncio.create_task(_run(middleware, "GET", "/api/v1/readings/1/chart", responses))
+        await asyncio.sleep(0.01)
+        await _run(middleware, "GET", "/api/v1/readings/2/chart", responses)
+        release.set()
+        await running
+        return responses
+
+    responses = asyncio.run(scenario())
+    assert [status for _, status, _ in responses] == [503, 200]
+    assert classes["charts"].stats()["queued"] == 0
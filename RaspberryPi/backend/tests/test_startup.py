@@ -0,0 +1,39 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+# Seconds `import main` may take; generous for a Pi, far below what web3 + create_all cost
+STARTUP_IMPORT_BUDGET = float(os.getenv("STARTUP_IMPORT_BUDGET", "3.0"))
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+heavy = sorted(m for m in ("web3", "eth_account", "eth_abi") if m in sys.modules)
+print(elapsed, ",".join(heavy))
+"""
+
+
+def _import_main():
+    env = dict(os.environ, DISABLE_FACTORY="0")
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=BACKEND_DIR, env=env,
+        capture_output=True, text=True, timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
+    elapsed, _, heavy = result.stdout.strip().splitlines()[-1].partition(" ")
+    return float(elapsed), heavy
+
+
+def test_import_does_not_load_blockchain_stack():
+    _, heavy = _import_main()
+    assert heavy == "", f"blockchain modules imported at startup: {heavy}"
+
+
+def test_import_within_startup_budget():
+    elapsed, _ = _import_main()
+    assert elapsed < STARTUP_IMPORT_BUDGET, f"import main took {elapsed:.2f}s (budget {STARTUP_IMPORT_BUDGET}s)"
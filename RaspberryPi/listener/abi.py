@@ -37,4 +37,6 @@ ABI = [
         "name": "BatchProcessed",
         "type": "event",
     }
-] 
\ No newline at end of file
+] 
+# Canonical signature of BatchProcessed, hashed to obtain its log topic
+BATCH_PROCESSED_SIGNATURE = "BatchProcessed(bytes32,bytes32,uint32,uint16,uint256)"
@@ -0,0 +1,214 @@
+"""Throughput and latency benchmark for the listener against the offline fake chain.
+
+Starts a FakeChain (see fakechain.py), points the listener's event loop at it
+and measures how fast BatchProcessed events turn into accepted confirmations:
+
+* ``--mode catchup``: the chain is prefilled and the listener starts from block 1;
+  reports catch-up time and events/s.
+* ``--mode poll`` / ``--mode ws``: blocks are mined live for ``--duration`` seconds;
+  reports events/s and the latency from a block being mined to its confirmation
+  being accepted by the sink (first "pending" send and final ``finalized`` send).
+
+Confirmations go to a no-op sink by default, to a local backend with
+``--backend http://localhost:8000`` (bulk endpoint) or straight into the
+backend database with ``--backend db``. Synthetic reading ids start at
+``--first-reading-id``; point them at existing verified readings to exercise
+real updates, otherwise the backend reports them as unknown.
+
+Run:
+    python -m RaspberryPi.listener.bench --mode catchup --prefill-blocks 50000 --events-per-block 0.5
+    python -m RaspberryPi.listener.bench --mode ws --duration 30 --block-time 0.5 --reorg-every 20
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import threading
+import time
+from typing import Any
+
+from . import config
+from . import main as listener
+from .catchup import AdaptiveWindow
+from .confirmations import DatabaseConfirmationSink, HttpConfirmationSink
+from .fakechain import FakeChain, serve_http, serve_ws
+
+
+class NullSink:
+    """Accepts every confirmation without a backend."""
+
+    name = "null"
+
+    def send(self, batches: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        return [{**b, "status": "marked", "updated_count": 0} for b in batches]
+
+
+class MeasuringSink:
+    """Wraps a sink and records when each event's confirmations were accepted."""
+
+    def __init__(self, inner: Any, chain: FakeChain) -> None:
+        self.inner = inner
+        self.name = inner.name
+        self.chain = chain
+        self.first_sent: dict[str, float] = {}
+        self.finalized: dict[str, float] = {}
+        self.removed = 0
+        self.calls = 0
+        self.call_seconds = 0.0
+        self.lock = threading.Lock()
+
+    def send(self, batches: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        started = time.monotonic()
+        results = self.inner.send(batches)
+        now = time.monotonic()
+        with self.lock:
+            self.calls += 1
+            self.call_seconds += now - started
+            for b in batches:
+                tx_hash = b["blockchain_tx_hash"]
+                if b.get("removed"):
+                    self.removed += 1
+                    continue
+                self.first_sent.setdefault(tx_hash, now)
+                if b.get("finalized", True):
+                    self.finalized.setdefault(tx_hash, now)
+        return results
+
+    def latencies(self, sent: dict[str, float]) -> list[float]:
+        emitted = self.chain.emitted_at
+        return sorted(t - emitted[h] for h, t in sent.items() if h in emitted)
+
+
+def _percentile(values: list[float], q: float) -> float:
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def _latency_line(label: str, values: list[float]) -> str:
+    if not values:
+        return f"{label}: n/a"
+    return (f"{label}: p50 {_percentile(values, 0.5) * 1000:.0f} ms, p95 {_percentile(values, 0.95) * 1000:.0f} ms, "
+            f"max {values[-1] * 1000:.0f} ms")
+
+
+def _backend_sink(backend: str | None) -> Any:
+    if not backend:
+        return NullSink()
+    if backend == "db":
+        return DatabaseConfirmationSink(config.BACKEND_DIR, allow_remote=True)
+    return HttpConfirmationSink(backend, config.REQUEST_TIMEOUT)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the listener against an offline fake chain")
+    parser.add_argument("--mode", choices=("catchup", "poll", "ws"), default="poll")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of live mining (poll/ws)")
+    parser.add_argument("--prefill-blocks", type=int, default=0, help="History blocks (catchup default 20000)")
+    parser.add_argument("--block-time", type=float, default=1.0)
+    parser.add_argument("--events-per-block", type=float, default=1.0)
+    parser.add_argument("--contracts", type=int, default=1)
+    parser.add_argument("--first-reading-id", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=20, help="Readings per synthetic batch")
+    parser.add_argument("--max-logs", type=int, default=10000, help="Fake eth_getLogs result limit")
+    parser.add_argument("--max-range", type=int, default=None, help="Fake eth_getLogs block range limit")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every RPC request")
+    parser.add_argument("--reorg-every", type=int, default=0)
+    parser.add_argument("--reorg-depth", type=int, default=3)
+    parser.add_argument("--poll-interval", type=float, default=None, help="Listener poll interval (default: block time)")
+    parser.add_argument("--confirmation-depth", type=int, default=config.CONFIRMATION_DEPTH)
+    parser.add_argument("--window", type=int, default=config.GET_LOGS_BLOCK_RANGE, help="Initial getLogs window")
+    parser.add_argument("--workers", type=int, default=config.CATCHUP_WORKERS)
+    parser.add_argument("--backend", help="Backend base URL, or 'db' for direct database confirmations")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--verbose", action="store_true", help="Keep the listener's own output")
+    args = parser.parse_args(argv)
+
+    chain = FakeChain(
+        contracts=[os.urandom(20).hex() for _ in range(args.contracts)],
+        batch_size=args.batch_size,
+        seed=args.seed,
+        max_logs_per_query=args.max_logs,
+        max_block_range=args.max_range,
+        latency=args.latency,
+    )
+    chain.next_reading_id = args.first_reading_id
+    prefill = args.prefill_blocks or (20000 if args.mode == "catchup" else 0)
+    chain.prefill(prefill, args.events_per_block)
+    # Latency is only meaningful for live blocks
+    prefilled_events = chain.stats["events"]
+    if args.mode != "catchup":
+        chain.emitted_at.clear()
+
+    http_server = serve_http(chain)
+    state_dir = tempfile.mkdtemp(prefix="wattwitness-bench-")
+    config.RPC_URL = f"http://127.0.0.1:{http_server.server_address[1]}"
+    config.WS_RPC_URL = ""
+    if args.mode == "ws":
+        ws_server = serve_ws(chain)
+        config.WS_RPC_URL = f"ws://127.0.0.1:{ws_server.socket.getsockname()[1]}"
+    config.POLL_INTERVAL = args.poll_interval if args.poll_interval is not None else args.block_time
+    config.CHECKPOINT_FILE = os.path.join(state_dir, "checkpoint.json")
+    config.CONFIRMATION_SPOOL_FILE = os.path.join(state_dir, "confirmations.json")
+    config.FINALITY_STATE_FILE = os.path.join(state_dir, "finality.json")
+    config.CONFIRMATION_DEPTH = 0 if args.mode == "catchup" else args.confirmation_depth
+    config.CATCHUP_WORKERS = args.workers
+    listener._window = AdaptiveWindow(args.window, maximum=max(args.window, config.GET_LOGS_MAX_BLOCK_RANGE))
+
+    sink = MeasuringSink(_backend_sink(args.backend), chain)
+    addresses = {address: None for address in chain.contracts}
+    stop = threading.Event()
+    output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+
+    print(f"[BENCH] mode={args.mode} sink={sink.name} contracts={args.contracts} prefill={prefill} blocks "
+          f"({prefilled_events} events) depth={config.CONFIRMATION_DEPTH}")
+    started = time.monotonic()
+    with output:
+        w3 = listener._init_web3()
+        # Errors are injected once connected; the start block is explicit so start-up needs no RPC
+        chain.error_rate = args.error_rate
+        loop = threading.Thread(
+            target=listener._event_loop, args=(w3, addresses, 1 if prefill else chain.head + 1, sink, stop),
+            daemon=True,
+        )
+        loop.start()
+        if args.mode == "catchup":
+            while loop.is_alive() and len(sink.first_sent) < prefilled_events:
+                time.sleep(0.05)
+        else:
+            miner_stop = threading.Event()
+            miner = threading.Thread(
+                target=chain.run_miner,
+                args=(args.block_time, args.events_per_block, miner_stop, args.reorg_every, args.reorg_depth),
+                daemon=True,
+            )
+            miner.start()
+            time.sleep(args.duration)
+            miner_stop.set()
+            # Mine empty blocks so the last events reach the confirmation depth, then drain
+            deadline = time.monotonic() + max(30.0, 4 * config.POLL_INTERVAL)
+            while time.monotonic() < deadline and len(sink.finalized) < len(chain.emitted_at):
+                chain.mine()
+                time.sleep(args.block_time)
+        elapsed = time.monotonic() - started
+        stop.set()
+        loop.join(timeout=config.POLL_INTERVAL + 5)
+
+    confirmed = len(sink.first_sent)
+    print(f"[BENCH] {confirmed} event(s) confirmed in {elapsed:.2f}s -> {confirmed / elapsed:.1f} events/s")
+    if args.mode == "catchup":
+        print(f"[BENCH] {prefill / elapsed:.0f} blocks/s caught up")
+    else:
+        print(f"[BENCH] {_latency_line('first confirmation latency', sink.latencies(sink.first_sent))}")
+        print(f"[BENCH] {_latency_line('finalized latency', sink.latencies(sink.finalized))}")
+        missing = len(set(chain.emitted_at) - set(sink.finalized))
+        if missing:
+            print(f"[BENCH] {missing} canonical event(s) not finalized before the drain deadline")
+    print(f"[BENCH] sink: {sink.calls} call(s), {sink.call_seconds:.2f}s total, {sink.removed} reorg revert(s)")
+    print(f"[BENCH] chain: {chain.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""Chunked, adaptive eth_getLogs catch-up for the listener.
+
+A long outage leaves a block range far beyond what RPC providers accept in one
+eth_getLogs call. The range is split into windows that shrink when the provider
+complains (too many results, range too large, timeouts) and grow again on
+success. Independent windows are fetched by a bounded worker pool, but results
+are always yielded in block order so the checkpoint only moves forward over
+fully processed ranges.
+"""
+from __future__ import annotations
+
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Iterator
+
+# Substrings providers use when a getLogs request is too large or too slow
+_RANGE_ERROR_MARKERS = (
+    "too many",
+    "more than",
+    "limit exceeded",
+    "exceed",
+    "block range",
+    "range is too large",
+    "response size",
+    "timeout",
+    "timed out",
+    "-32005",
+)
+
+
+def is_range_error(exc: BaseException) -> bool:
+    """True if *exc* means the requested block range should be made smaller."""
+    if isinstance(exc, TimeoutError):
+        return True
+    message = str(exc).lower()
+    if any(marker in message for marker in _RANGE_ERROR_MARKERS):
+        return True
+    return "timeout" in type(exc).__name__.lower()
+
+
+class AdaptiveWindow:
+    """Block window size that halves on range errors and grows on success."""
+
+    def __init__(self, initial: int, maximum: int, minimum: int = 1) -> None:
+        self.minimum = minimum
+        self.maximum = max(maximum, minimum)
+        self.size = min(max(initial, minimum), self.maximum)
+
+    def shrink(self) -> None:
+        self.size = max(self.minimum, self.size // 2)
+
+    def grow(self) -> None:
+        self.size = min(self.maximum, self.size * 2)
+
+
+class CatchUpProgress:
+    """Counters for one catch-up run, printed periodically and at the end."""
+
+    def __init__(self, first_block: int, last_block: int, report_every: float = 10.0) -> None:
+        self.first_block = first_block
+        self.total_blocks = last_block - first_block + 1
+        self.blocks_done = 0
+        self.requests = 0
+        self.retries = 0
+        self.logs = 0
+        self.started = time.monotonic()
+        self.report_every = report_every
+        self._last_report = self.started
+
+    def record(self, from_block: int, to_block: int, log_count: int) -> None:
+        self.blocks_done += to_block - from_block + 1
+        self.logs += log_count
+
+    def summary(self, window: AdaptiveWindow) -> str:
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        percent = 100.0 * self.blocks_done / self.total_blocks if self.total_blocks else 100.0
+        return (
+            f"{self.blocks_done}/{self.total_blocks} blocks ({percent:.1f}%), "
+            f"{self.blocks_done / elapsed:.0f} blocks/s, {self.logs} logs, "
+            f"{self.requests} requests, {self.retries} split retries, window {window.size}"
+        )
+
+    def maybe_report(self, window: AdaptiveWindow) -> None:
+        now = time.monotonic()
+        if now - self._last_report >= self.report_every:
+            self._last_report = now
+            print(f"[CATCHUP] {self.summary(window)}")
+
+
+def iter_block_ranges(
+    fetch: Callable[[int, int], list[Any]],
+    first_block: int,
+    last_block: int,
+    window: AdaptiveWindow,
+    workers: int = 1,
+) -> Iterator[tuple[int, int, list[Any]]]:
+    """Yield ``(from_block, to_block, fetch(from_block, to_block))`` covering the range in order.
+
+    Up to *workers* windows are fetched concurrently. A window failing with a
+    range error is split in half and retried; any other error propagates after
+    every range before it has been yielded.
+    """
+    if last_block < first_block:
+        return
+    if last_block - first_block + 1 <= window.size:
+        # Steady state: a handful of new blocks, no pool needed
+        try:
+            result = fetch(first_block, last_block)
+        except Exception as e:
+            if not is_range_error(e) or first_block == last_block:
+                raise
+            window.shrink()
+        else:
+            window.grow()
+            yield first_block, last_block, result
+            return
+
+    progress = CatchUpProgress(first_block, last_block)
+    next_start = first_block
+    cursor = first_block
+    in_flight: dict[Future, tuple[int, int]] = {}
+    done: dict[int, tuple[int, list[Any]]] = {}
+    retry_ranges: list[tuple[int, int]] = []
+    max_buffered = max(1, workers) * 2
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="catchup") as pool:
+        try:
+            while cursor <= last_block:
+                # Keep the pool busy without buffering unbounded out-of-order results
+                while len(in_flight) < max(1, workers) and (
+                    retry_ranges or len(in_flight) + len(done) < max_buffered
+                ):
+                    if retry_ranges:
+                        start, end = retry_ranges.pop()
+                    elif next_start <= last_block:
+                        start, end = next_start, min(next_start + window.size - 1, last_block)
+                        next_start = end + 1
+                    else:
+                        break
+                    in_flight[pool.submit(fetch, start, end)] = (start, end)
+                    progress.requests += 1
+
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    start, end = in_flight.pop(future)
+                    try:
+                        done[start] = (end, future.result())
+                        window.grow()
+                    except Exception as e:
+                        if not is_range_error(e) or start == end:
+                            raise
+                        window.shrink()
+                        progress.retries += 1
+                        mid = start + (end - start) // 2
+                        # Popped from the end, so the lower half is fetched first
+                        retry_ranges.extend([(mid + 1, end), (start, mid)])
+
+                while cursor in done:
+                    end, result = done.pop(cursor)
+                    progress.record(cursor, end, len(result))
+                    yield cursor, end, result
+                    cursor = end + 1
+                progress.maybe_report(window)
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+    print(f"[CATCHUP] Done: {progress.summary(window)}")
@@ -0,0 +1,43 @@
+"""Persistent block checkpoint so listener restarts resume where they left off."""
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Any
+
+
+def load_checkpoint(path: str | Path) -> int | None:
+    """Return the last processed block stored at *path*, or None if there is none."""
+    try:
+        with open(path) as f:
+            return int(json.load(f)["last_processed_block"])
+    except FileNotFoundError:
+        return None
+    except (ValueError, KeyError, TypeError) as e:
+        print(f"[WARN] Ignoring unreadable checkpoint {path}: {e}")
+        return None
+
+
+def save_checkpoint(path: str | Path, block_number: int) -> None:
+    """Atomically write *block_number* to *path*."""
+    write_json_atomic(path, {"last_processed_block": block_number})
+
+
+def write_json_atomic(path: str | Path, data: Any) -> None:
+    """Write *data* as JSON to *path* via temp file + fsync + rename, so readers never see a partial file."""
+    path = Path(path)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
@@ -12,4 +12,29 @@ RPC_URL = os.getenv(
 )
 CONTRACT_ADDRESS = os.getenv("CONTRACT_ADDRESS", "")  # Must be set in .env
 API_BASE_URL = os.getenv("API_BASE_URL", "https://wattwitness-api.loca.lt")
-REQUEST_TIMEOUT = int(os.getenv("REQUEST_TIMEOUT", "10")) 
\ No newline at end of file
+REQUEST_TIMEOUT = int(os.getenv("REQUEST_TIMEOUT", "10"))
+
+# Optional WebSocket endpoint for eth_subscribe push mode (falls back to polling when unset/unreachable)
+WS_RPC_URL = os.getenv("WS_RPC_URL", "")
+POLL_INTERVAL = int(os.getenv("POLL_INTERVAL", "30"))  # seconds between polls / max wait for a push
+WS_RETRY_INTERVAL = int(os.getenv("WS_RETRY_INTERVAL", "300"))  # seconds before retrying a failed subscription
+# File holding the last processed block, written atomically after every processed range
+CHECKPOINT_FILE = os.getenv("CHECKPOINT_FILE") or str(Path(__file__).parent / ".checkpoint.json")
+START_BLOCK_LOOKBACK = int(os.getenv("START_BLOCK_LOOKBACK", "50"))  # used only without a checkpoint
+# Watch every installation's logger contract (from the backend's /installations/) instead of CONTRACT_ADDRESS
+WATCH_ALL_INSTALLATIONS = os.getenv("WATCH_ALL_INSTALLATIONS", "0") == "1"
+INSTALLATIONS_REFRESH_INTERVAL = int(os.getenv("INSTALLATIONS_REFRESH_INTERVAL", "300"))  # seconds
+# eth_getLogs block window: starting size, upper bound, and parallel fetches during catch-up
+GET_LOGS_BLOCK_RANGE = int(os.getenv("GET_LOGS_BLOCK_RANGE", "2000"))
+GET_LOGS_MAX_BLOCK_RANGE = int(os.getenv("GET_LOGS_MAX_BLOCK_RANGE", "10000"))
+CATCHUP_WORKERS = int(os.getenv("CATCHUP_WORKERS", "4"))
+# Local spool of confirmations not yet accepted by the backend (sent in bulk once per cycle)
+CONFIRMATION_SPOOL_FILE = os.getenv("CONFIRMATION_SPOOL_FILE") or str(Path(__file__).parent / ".pending_confirmations.json")
+# Confirmations the backend rejected permanently; kept here for inspection and never resent
+CONFIRMATION_REJECTED_FILE = os.getenv("CONFIRMATION_REJECTED_FILE") or str(Path(__file__).parent / ".rejected_confirmations.json")
+# How confirmations reach the backend: "auto" (database if local, else API), "db" or "http"
+CONFIRMATION_MODE = os.getenv("CONFIRMATION_MODE", "auto").lower()
+BACKEND_DIR = os.getenv("BACKEND_DIR") or str(Path(__file__).resolve().parent.parent / "backend")
+# Blocks an event must be buried under before its batch is finalized (0 = finalize immediately)
+CONFIRMATION_DEPTH = int(os.getenv("CONFIRMATION_DEPTH", "12"))
+FINALITY_STATE_FILE = os.getenv("FINALITY_STATE_FILE") or str(Path(__file__).parent / ".finality_state.json")
@@ -0,0 +1,220 @@
+"""Persistent queue coalescing BatchProcessed confirmations into bulk backend calls.
+
+Events are appended to a local spool file as soon as they are seen, so the
+block checkpoint can advance without waiting for the backend. Once per polling
+cycle the whole queue is handed to a sink in one call: either a single
+POST /readings/mark-on-chain/bulk over a pooled HTTP session, or, when the
+backend database is on the same host, a direct transaction using the backend's
+own set-based update logic. A send that fails in transit leaves the queue
+untouched and is retried with exponential backoff on later cycles instead of
+blocking intake. A send the backend rejects outright (bad request, validation,
+constraint) is split until the offending confirmations are isolated; those are
+parked in a rejected file and logged, and the rest go through.
+"""
+from __future__ import annotations
+
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any
+from urllib.parse import urlparse
+
+import requests
+from dotenv import load_dotenv
+
+from .checkpoint import write_json_atomic
+
+_LOCAL_HOSTS = {"", "localhost", "127.0.0.1", "::1"}
+# Responses that reject the payload itself; resending it unchanged cannot succeed
+_PERMANENT_STATUS = {400, 409, 413, 422}
+
+
+class PermanentConfirmationError(Exception):
+    """The backend rejected the confirmations themselves, not the transport."""
+
+
+def is_local_database_url(url: str) -> bool:
+    """True if *url* points at a database on this host (TCP loopback, Unix socket or SQLite)."""
+    parsed = urlparse(url)
+    if parsed.scheme.startswith("sqlite"):
+        return True
+    return (parsed.hostname or "") in _LOCAL_HOSTS
+
+
+class HttpConfirmationSink:
+    """Send confirmations through the backend API (works wherever the backend is reachable)."""
+
+    name = "api"
+
+    def __init__(self, api_base_url: str, timeout: float) -> None:
+        self.url = f"{api_base_url.rstrip('/')}/api/v1/readings/mark-on-chain/bulk"
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def send(self, batches: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        resp = self.session.post(self.url, json={"batches": batches}, timeout=self.timeout)
+        if resp.status_code in _PERMANENT_STATUS:
+            raise PermanentConfirmationError(f"Backend rejected with {resp.status_code}: {resp.text}")
+        if resp.status_code >= 400:
+            raise requests.HTTPError(f"Backend responded with {resp.status_code}: {resp.text}", response=resp)
+        return resp.json().get("results", [])
+
+
+class DatabaseConfirmationSink:
+    """Apply confirmations straight to the backend database, skipping the tunnel round trip.
+
+    The backend's settings are read from *backend_dir*/.env (variables already in the
+    environment take precedence), not from the listener's working directory.
+    Raises on construction if no DATABASE_URL is configured, the backend package
+    cannot be imported, the database is not local (unless *allow_remote*), or it
+    cannot be reached.
+    """
+
+    name = "db"
+
+    def __init__(self, backend_dir: str | Path, allow_remote: bool = False) -> None:
+        backend_dir = str(Path(backend_dir).resolve())
+        env_file = Path(backend_dir) / ".env"
+        load_dotenv(dotenv_path=env_file, override=False)
+        if not os.getenv("DATABASE_URL"):
+            # The backend settings would otherwise fall back to a built-in default database
+            raise RuntimeError(f"DATABASE_URL is not set in the environment or in {env_file}")
+        if backend_dir not in sys.path:
+            sys.path.append(backend_dir)
+        from sqlalchemy import text
+        from sqlalchemy.exc import DataError, IntegrityError
+        from app.db.database import DATABASE_URL, SessionLocal
+        from app.db.onchain import apply_bulk_confirmations
+
+        if not allow_remote and not is_local_database_url(DATABASE_URL):
+            raise RuntimeError("backend database is not on this host")
+        self._session_factory = SessionLocal
+        self._apply = apply_bulk_confirmations
+        # Malformed payloads and rows the database refuses; anything else (connection, lock) is retried
+        self._permanent_errors = (KeyError, TypeError, ValueError, DataError, IntegrityError)
+        db = SessionLocal()
+        try:
+            db.execute(text("SELECT 1"))
+        finally:
+            db.close()
+
+    def send(self, batches: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        db = self._session_factory()
+        try:
+            results, _ = self._apply(db, batches)
+            db.commit()
+            return results
+        except self._permanent_errors as e:
+            db.rollback()
+            raise PermanentConfirmationError(f"{type(e).__name__}: {e}") from e
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+class ConfirmationQueue:
+    """Ordered, de-duplicated (by tx hash) backlog of mark-on-chain payloads."""
+
+    def __init__(self, spool_path: str | Path, sink: Any, rejected_path: str | Path | None = None,
+                 max_batches: int = 500, max_backoff: float = 300.0) -> None:
+        self.spool_path = Path(spool_path)
+        self.rejected_path = Path(rejected_path) if rejected_path else self.spool_path.with_name(".rejected_confirmations.json")
+        self.sink = sink
+        self.max_batches = max_batches
+        self.max_backoff = max_backoff
+        self._pending: dict[str, dict[str, Any]] = {}
+        self._failures = 0
+        self._next_attempt = 0.0
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def _load(self) -> None:
+        try:
+            with open(self.spool_path) as f:
+                for payload in json.load(f):
+                    self._pending[payload["blockchain_tx_hash"]] = payload
+        except FileNotFoundError:
+            return
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"[WARN] Ignoring unreadable confirmation spool {self.spool_path}: {e}")
+            return
+        if self._pending:
+            print(f"[QUEUE] Restored {len(self._pending)} unsent confirmation(s) from {self.spool_path}")
+
+    def _persist(self) -> None:
+        write_json_atomic(self.spool_path, list(self._pending.values()))
+
+    def extend(self, payloads: list[dict[str, Any]]) -> None:
+        """Queue *payloads* and persist them before the caller advances its checkpoint."""
+        if not payloads:
+            return
+        for payload in payloads:
+            self._pending[payload["blockchain_tx_hash"]] = payload
+        self._persist()
+
+    def _park(self, payloads: list[dict[str, Any]], reason: str) -> None:
+        """Move *payloads* out of the queue into the rejected file, so they are kept but never resent."""
+        try:
+            with open(self.rejected_path) as f:
+                rejected = json.load(f)
+        except FileNotFoundError:
+            rejected = []
+        except ValueError as e:
+            print(f"[WARN] Replacing unreadable rejected file {self.rejected_path}: {e}")
+            rejected = []
+        for payload in payloads:
+            rejected.append({"payload": payload, "reason": reason, "rejected_at": int(time.time())})
+            self._pending.pop(payload["blockchain_tx_hash"], None)
+            print(f"[ERR] Parked confirmation {payload['blockchain_tx_hash']} "
+                  f"({payload['first_reading_id']}-{payload['last_reading_id']}) in {self.rejected_path}: {reason}")
+        write_json_atomic(self.rejected_path, rejected)
+        self._persist()
+
+    def _send(self, chunk: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Send *chunk*, halving it on a permanent rejection until the offending payloads are parked.
+
+        Transport errors propagate; halves already sent are then resent later and reported as already marked.
+        """
+        try:
+            return self.sink.send(chunk)
+        except PermanentConfirmationError as e:
+            if len(chunk) == 1:
+                self._park(chunk, str(e))
+                return []
+            half = len(chunk) // 2
+            return self._send(chunk[:half]) + self._send(chunk[half:])
+
+    def flush(self) -> None:
+        """Send queued confirmations in bulk; keep them for a later cycle on transport failure."""
+        if not self._pending or time.monotonic() < self._next_attempt:
+            return
+        while self._pending:
+            chunk = list(self._pending.values())[: self.max_batches]
+            try:
+                results = self._send(chunk)
+            except Exception as e:
+                self._failures += 1
+                delay = min(self.max_backoff, 2 ** self._failures)
+                self._next_attempt = time.monotonic() + delay
+                print(f"[ERR] Bulk confirmation of {len(self._pending)} batch(es) failed, retrying in {delay:.0f}s: {e}")
+                return
+
+            self._failures = 0
+            by_hash = {p["blockchain_tx_hash"]: p for p in chunk}
+            for r in results:
+                if r.get("status") in ("invalid", "rejected") and r.get("blockchain_tx_hash") in by_hash:
+                    self._park([by_hash[r["blockchain_tx_hash"]]], r.get("error") or r["status"])
+            for payload in chunk:
+                self._pending.pop(payload["blockchain_tx_hash"], None)
+            self._persist()
+            marked = sum(r.get("updated_count", 0) for r in results)
+            skipped = [r for r in results if r.get("status") not in ("marked", "invalid", "rejected")]
+            print(f"[{self.sink.name.upper()}] Confirmed {len(chunk)} batch(es), {marked} readings marked on-chain.")
+            for r in skipped:
+                print(f"[{self.sink.name.upper()}] Batch {r['first_reading_id']}-{r['last_reading_id']} {r['status']}")
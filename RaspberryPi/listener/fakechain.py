@@ -0,0 +1,352 @@
+"""Offline JSON-RPC stand-in serving synthetic BatchProcessed logs.
+
+Implements just enough of the Ethereum JSON-RPC API for the listener
+(``web3_clientVersion``, ``eth_chainId``, ``eth_blockNumber``,
+``eth_getBlockByNumber``, ``eth_getLogs``, batched requests and
+``eth_subscribe("logs")`` over WebSocket). Blocks are mined at a configurable
+rate with a configurable number of events. Provider limits, random errors,
+added latency and chain reorganisations can be injected, so polling,
+subscription and catch-up modes can be tuned and regression-tested without a
+live Fuji RPC.
+
+Run standalone:
+    python -m RaspberryPi.listener.fakechain --port 8545 --block-time 2 --events-per-block 0.5
+"""
+from __future__ import annotations
+
+import argparse
+import bisect
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+from web3 import Web3
+
+from .abi import BATCH_PROCESSED_SIGNATURE
+
+BATCH_PROCESSED_TOPIC = Web3.to_hex(Web3.keccak(text=BATCH_PROCESSED_SIGNATURE))
+FUJI_CHAIN_ID = 43113
+
+
+def _random_hash(rng: random.Random) -> str:
+    return "0x" + rng.getrandbits(256).to_bytes(32, "big").hex()
+
+
+def _word(value: int) -> str:
+    return value.to_bytes(32, "big").hex()
+
+
+class RpcError(Exception):
+    def __init__(self, code: int, message: str) -> None:
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class FakeChain:
+    """In-memory chain of blocks, some of which carry BatchProcessed logs."""
+
+    def __init__(self, contracts: list[str] | None = None, batch_size: int = 20, seed: int | None = None,
+                 max_logs_per_query: int = 10000, max_block_range: int | None = None,
+                 error_rate: float = 0.0, latency: float = 0.0) -> None:
+        self.rng = random.Random(seed)
+        self.contracts = [Web3.to_checksum_address(c) for c in (contracts or [os.urandom(20).hex()])]
+        self.batch_size = batch_size
+        self.max_logs_per_query = max_logs_per_query
+        self.max_block_range = max_block_range
+        self.error_rate = error_rate
+        self.latency = latency
+        self.lock = threading.RLock()
+        self.hashes: list[str] = [_random_hash(self.rng)]  # genesis
+        self.timestamps: list[int] = [int(time.time())]
+        self.logs: dict[int, list[dict[str, Any]]] = {}
+        self.log_blocks: list[int] = []  # sorted block numbers holding logs
+        self.emitted_at: dict[str, float] = {}  # tx hash -> wall clock time the event was mined
+        self.next_reading_id = 1
+        self.subscribers: list[Any] = []
+        self.stats = {"requests": 0, "errors": 0, "reorgs": 0, "events": 0, "dropped_events": 0}
+
+    @property
+    def head(self) -> int:
+        return len(self.hashes) - 1
+
+    # ----- chain production -------------------------------------------------
+    def _make_log(self, number: int, index: int, contract: str, tx_hash: str | None = None) -> dict[str, Any]:
+        first_id = self.next_reading_id
+        self.next_reading_id += self.batch_size
+        return {
+            "address": contract,
+            "topics": [
+                BATCH_PROCESSED_TOPIC,
+                _random_hash(self.rng),             # requestId
+                _random_hash(self.rng),             # merkleRoot
+                "0x" + _word(first_id),             # firstReadingId
+            ],
+            "data": "0x" + _word(self.batch_size) + _word(self.rng.randint(100_000, 400_000)),
+            "blockNumber": hex(number),
+            "blockHash": self.hashes[number],
+            "transactionHash": tx_hash or _random_hash(self.rng),
+            "transactionIndex": hex(index),
+            "logIndex": hex(index),
+            "removed": False,
+        }
+
+    def mine(self, events: int = 0) -> int:
+        """Append a block holding *events* BatchProcessed logs; returns its number."""
+        with self.lock:
+            number = len(self.hashes)
+            self.hashes.append(_random_hash(self.rng))
+            self.timestamps.append(int(time.time()))
+            if events:
+                now = time.monotonic()
+                block_logs = [self._make_log(number, i, self.rng.choice(self.contracts)) for i in range(events)]
+                self.logs[number] = block_logs
+                self.log_blocks.append(number)
+                for log in block_logs:
+                    self.emitted_at[log["transactionHash"]] = now
+                self.stats["events"] += events
+            else:
+                block_logs = []
+        self._notify(block_logs)
+        return number
+
+    def prefill(self, blocks: int, events_per_block: float) -> None:
+        """Create *blocks* of history with on average *events_per_block* events each."""
+        for _ in range(blocks):
+            self.mine(self._event_count(events_per_block))
+
+    def _event_count(self, events_per_block: float) -> int:
+        whole = int(events_per_block)
+        return whole + (1 if self.rng.random() < events_per_block - whole else 0)
+
+    def reorg(self, depth: int, drop_rate: float = 0.5) -> None:
+        """Replace the last *depth* blocks. Each of their events is dropped with *drop_rate*,
+        otherwise re-included (same tx hash) in the replacement block."""
+        with self.lock:
+            depth = min(depth, self.head)
+            for number in range(self.head - depth + 1, self.head + 1):
+                self.hashes[number] = _random_hash(self.rng)
+                kept = []
+                for log in self.logs.get(number, []):
+                    if self.rng.random() < drop_rate:
+                        self.emitted_at.pop(log["transactionHash"], None)
+                        self.stats["dropped_events"] += 1
+                        continue
+                    kept.append({**log, "blockHash": self.hashes[number]})
+                if number in self.logs:
+                    if kept:
+                        self.logs[number] = kept
+                    else:
+                        del self.logs[number]
+                        self.log_blocks.remove(number)
+            self.stats["reorgs"] += 1
+
+    def run_miner(self, block_time: float, events_per_block: float, stop: threading.Event,
+                  reorg_every: int = 0, reorg_depth: int = 3) -> None:
+        """Mine blocks until *stop* is set (use in a thread)."""
+        mined = 0
+        while not stop.wait(block_time):
+            self.mine(self._event_count(events_per_block))
+            mined += 1
+            if reorg_every and mined % reorg_every == 0:
+                self.reorg(reorg_depth)
+
+    # ----- JSON-RPC -----------------------------------------------------------
+    def _block_number(self, tag: Any) -> int:
+        if tag in (None, "latest", "safe", "finalized", "pending"):
+            return self.head
+        if tag == "earliest":
+            return 0
+        return int(tag, 16) if isinstance(tag, str) else int(tag)
+
+    def _block(self, number: int) -> dict[str, Any] | None:
+        if number > self.head:
+            return None
+        return {
+            "number": hex(number),
+            "hash": self.hashes[number],
+            "parentHash": self.hashes[number - 1] if number else "0x" + "00" * 32,
+            "timestamp": hex(self.timestamps[number]),
+            "transactions": [log["transactionHash"] for log in self.logs.get(number, [])],
+        }
+
+    def _get_logs(self, flt: dict[str, Any]) -> list[dict[str, Any]]:
+        from_block = self._block_number(flt.get("fromBlock", "latest"))
+        to_block = min(self._block_number(flt.get("toBlock", "latest")), self.head)
+        if self.max_block_range and to_block - from_block + 1 > self.max_block_range:
+            raise RpcError(-32005, f"block range is too large (max {self.max_block_range})")
+        addresses = flt.get("address")
+        if isinstance(addresses, str):
+            addresses = [addresses]
+        wanted = {Web3.to_checksum_address(a) for a in addresses} if addresses else None
+        topics = flt.get("topics") or []
+        topic0 = topics[0] if topics else None
+        out: list[dict[str, Any]] = []
+        start = bisect.bisect_left(self.log_blocks, from_block)
+        end = bisect.bisect_right(self.log_blocks, to_block)
+        for number in self.log_blocks[start:end]:
+            for log in self.logs[number]:
+                if wanted is not None and log["address"] not in wanted:
+                    continue
+                if topic0 and log["topics"][0] != topic0:
+                    continue
+                out.append(log)
+                if len(out) > self.max_logs_per_query:
+                    raise RpcError(-32005, f"query returned more than {self.max_logs_per_query} results")
+        return out
+
+    def call(self, method: str, params: list[Any]) -> Any:
+        with self.lock:
+            if method == "web3_clientVersion":
+                return "WattWitness/FakeChain"
+            if method == "eth_chainId":
+                return hex(FUJI_CHAIN_ID)
+            if method == "net_version":
+                return str(FUJI_CHAIN_ID)
+            if method == "eth_blockNumber":
+                return hex(self.head)
+            if method == "eth_getBlockByNumber":
+                return self._block(self._block_number(params[0]))
+            if method == "eth_getLogs":
+                return self._get_logs(params[0])
+        raise RpcError(-32601, f"method {method} not supported by FakeChain")
+
+    def handle(self, request: dict[str, Any]) -> dict[str, Any]:
+        self.stats["requests"] += 1
+        try:
+            if self.error_rate and self.rng.random() < self.error_rate:
+                raise RpcError(-32000, "injected internal error")
+            result = self.call(request.get("method", ""), request.get("params") or [])
+            return {"jsonrpc": "2.0", "id": request.get("id"), "result": result}
+        except RpcError as e:
+            self.stats["errors"] += 1
+            return {"jsonrpc": "2.0", "id": request.get("id"), "error": {"code": e.code, "message": e.message}}
+
+    # ----- subscriptions ------------------------------------------------------
+    def _notify(self, block_logs: list[dict[str, Any]]) -> None:
+        for subscriber in list(self.subscribers):
+            subscriber(block_logs)
+
+
+class _RpcHandler(BaseHTTPRequestHandler):
+    chain: FakeChain
+
+    def do_POST(self) -> None:  # noqa: N802
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        if self.chain.latency:
+            time.sleep(self.chain.latency)
+        if isinstance(body, list):
+            response: Any = [self.chain.handle(item) for item in body]
+        else:
+            response = self.chain.handle(body)
+        data = json.dumps(response).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args: Any) -> None:  # silence per-request logging
+        return
+
+
+def serve_http(chain: FakeChain, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Start the JSON-RPC HTTP endpoint in a daemon thread; port 0 picks a free port."""
+    handler = type("FakeChainHandler", (_RpcHandler,), {"chain": chain})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def serve_ws(chain: FakeChain, host: str = "127.0.0.1", port: int = 0) -> Any:
+    """Start an eth_subscribe("logs") WebSocket endpoint in a daemon thread."""
+    from websockets.sync.server import serve
+
+    def session(ws: Any) -> None:
+        subscription_id = None
+        wanted: set[str] | None = None
+
+        def push(block_logs: list[dict[str, Any]]) -> None:
+            for log in block_logs:
+                if wanted is None or log["address"] in wanted:
+                    try:
+                        ws.send(json.dumps({
+                            "jsonrpc": "2.0",
+                            "method": "eth_subscription",
+                            "params": {"subscription": subscription_id, "result": log},
+                        }))
+                    except Exception:
+                        return
+
+        try:
+            for message in ws:
+                request = json.loads(message)
+                if request.get("method") == "eth_subscribe":
+                    flt = request["params"][1] if len(request["params"]) > 1 else {}
+                    addresses = flt.get("address")
+                    if isinstance(addresses, str):
+                        addresses = [addresses]
+                    wanted = {Web3.to_checksum_address(a) for a in addresses} if addresses else None
+                    subscription_id = hex(chain.rng.getrandbits(64))
+                    ws.send(json.dumps({"jsonrpc": "2.0", "id": request.get("id"), "result": subscription_id}))
+                    chain.subscribers.append(push)
+                else:
+                    ws.send(json.dumps(chain.handle(request)))
+        finally:
+            if push in chain.subscribers:
+                chain.subscribers.remove(push)
+
+    server = serve(session, host, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Fake JSON-RPC chain serving synthetic BatchProcessed logs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8545, help="HTTP JSON-RPC port")
+    parser.add_argument("--ws-port", type=int, default=8546, help="WebSocket port (0 disables)")
+    parser.add_argument("--contracts", type=int, default=1, help="Number of logger contracts emitting events")
+    parser.add_argument("--block-time", type=float, default=2.0, help="Seconds between mined blocks")
+    parser.add_argument("--events-per-block", type=float, default=0.5)
+    parser.add_argument("--prefill-blocks", type=int, default=0, help="Blocks of history created at start")
+    parser.add_argument("--max-logs", type=int, default=10000, help="eth_getLogs result limit")
+    parser.add_argument("--max-range", type=int, default=None, help="eth_getLogs block range limit")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failing")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every HTTP request")
+    parser.add_argument("--reorg-every", type=int, default=0, help="Reorganise the chain every N blocks")
+    parser.add_argument("--reorg-depth", type=int, default=3)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    chain = FakeChain(
+        contracts=[os.urandom(20).hex() for _ in range(args.contracts)],
+        seed=args.seed,
+        max_logs_per_query=args.max_logs,
+        max_block_range=args.max_range,
+        error_rate=args.error_rate,
+        latency=args.latency,
+    )
+    chain.prefill(args.prefill_blocks, args.events_per_block)
+    serve_http(chain, args.host, args.port)
+    print(f"[FAKECHAIN] HTTP JSON-RPC on http://{args.host}:{args.port}")
+    if args.ws_port:
+        serve_ws(chain, args.host, args.ws_port)
+        print(f"[FAKECHAIN] WebSocket on ws://{args.host}:{args.ws_port}")
+    for address in chain.contracts:
+        print(f"[FAKECHAIN] Logger contract {address}")
+
+    stop = threading.Event()
+    try:
+        chain.run_miner(args.block_time, args.events_per_block, stop, args.reorg_every, args.reorg_depth)
+    except KeyboardInterrupt:
+        print(f"[FAKECHAIN] Stopped at block {chain.head}: {chain.stats}")
+
+
+if __name__ == "__main__":
+    main()
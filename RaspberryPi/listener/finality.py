@@ -0,0 +1,138 @@
+"""Confirmation-depth tracking and reorg detection for BatchProcessed confirmations.
+
+An event seen within CONFIRMATION_DEPTH blocks of the head is sent to the backend
+as "pending" and remembered together with its block hash. Every cycle the block
+hashes the listener relies on (recent heads and blocks holding pending events)
+are re-read in one batched JSON-RPC call:
+
+* a pending event whose block reached the confirmation depth with an unchanged
+  hash is sent again with ``finalized: True``;
+* a changed hash means a reorg: the fork block is one past the highest tracked
+  block whose hash still matches, pending events at or above it are sent with
+  ``removed: True`` and the caller rescans from the fork block.
+
+Pending events are persisted so a restart can still promote or revert them.
+"""
+from __future__ import annotations
+
+import json
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable
+
+import requests
+
+from .checkpoint import write_json_atomic
+
+
+def fetch_block_hashes(session: requests.Session, rpc_url: str, numbers: list[int],
+                       timeout: float, chunk_size: int = 100) -> dict[int, str]:
+    """Canonical hashes of *numbers*, fetched with batched eth_getBlockByNumber calls."""
+    hashes: dict[int, str] = {}
+    for start in range(0, len(numbers), chunk_size):
+        chunk = numbers[start:start + chunk_size]
+        body = [
+            {"jsonrpc": "2.0", "id": i, "method": "eth_getBlockByNumber", "params": [hex(n), False]}
+            for i, n in enumerate(chunk)
+        ]
+        resp = session.post(rpc_url, json=body, timeout=timeout)
+        resp.raise_for_status()
+        for item in resp.json():
+            block = item.get("result")
+            if block:
+                hashes[int(block["number"], 16)] = block["hash"].lower()
+    return hashes
+
+
+class FinalityTracker:
+    """Holds pending confirmations and a window of recent block hashes."""
+
+    def __init__(self, depth: int, state_path: str | Path) -> None:
+        self.depth = depth
+        self.state_path = Path(state_path)
+        self.block_hashes: OrderedDict[int, str] = OrderedDict()
+        self.pending: dict[str, dict[str, Any]] = {}
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+            self.pending = {e["payload"]["blockchain_tx_hash"]: e for e in state.get("pending", [])}
+            self.block_hashes = OrderedDict(sorted((int(n), h) for n, h in state.get("block_hashes", {}).items()))
+        except FileNotFoundError:
+            return
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"[WARN] Ignoring unreadable finality state {self.state_path}: {e}")
+            return
+        if self.pending:
+            print(f"[FINALITY] Restored {len(self.pending)} confirmation(s) awaiting depth {self.depth}")
+
+    def _persist(self) -> None:
+        write_json_atomic(self.state_path, {
+            "pending": list(self.pending.values()),
+            "block_hashes": {str(n): h for n, h in self.block_hashes.items()},
+        })
+
+    def remember_block(self, number: int, block_hash: str) -> None:
+        """Record the hash of a block the listener has processed up to."""
+        if self.depth:
+            self.block_hashes[number] = block_hash.lower()
+
+    def observe(self, payload: dict[str, Any], block_hash: str, head: int) -> dict[str, Any]:
+        """Return the payload to send now; shallow blocks are sent as pending and tracked."""
+        block_number = payload["blockchain_block_number"]
+        if not self.depth or block_number <= head - self.depth:
+            return {**payload, "finalized": True}
+        self.pending[payload["blockchain_tx_hash"]] = {"payload": payload, "block_hash": block_hash.lower()}
+        self.block_hashes[block_number] = block_hash.lower()
+        self._persist()
+        return {**payload, "finalized": False}
+
+    def _fork_block(self, numbers: list[int], canonical: dict[int, str], known: dict[int, str],
+                    first_mismatch: int, head: int) -> int:
+        """First block that may have been replaced: one past the highest tracked block still on the chain.
+
+        Tracked blocks are sparse, so the fork can lie anywhere between that block and
+        *first_mismatch*; without a matching block below it, assume the deepest reorg
+        the confirmation depth allows.
+        """
+        matching = [n for n in numbers if n < first_mismatch and canonical.get(n) == known.get(n)]
+        if matching:
+            return matching[-1] + 1
+        return max(0, min(first_mismatch, head - self.depth))
+
+    def verify(self, head: int, fetch_hashes: Callable[[list[int]], dict[int, str]]) -> tuple[list[dict[str, Any]], int | None]:
+        """Check tracked hashes against the chain.
+
+        Returns (payloads to send, fork block or None). Payloads promote pending
+        events that reached the depth or revert those removed by a reorg.
+        """
+        if not self.depth or (not self.pending and not self.block_hashes):
+            return [], None
+
+        numbers = sorted(set(self.block_hashes) | {e["payload"]["blockchain_block_number"] for e in self.pending.values()})
+        canonical = fetch_hashes(numbers)
+        known = dict(self.block_hashes)
+        for entry in self.pending.values():
+            known[entry["payload"]["blockchain_block_number"]] = entry["block_hash"]
+        mismatched = [n for n in numbers if n in canonical and canonical[n] != known.get(n)]
+        fork = self._fork_block(numbers, canonical, known, mismatched[0], head) if mismatched else None
+
+        to_send = []
+        for tx_hash, entry in list(self.pending.items()):
+            payload = entry["payload"]
+            block_number = payload["blockchain_block_number"]
+            if fork is not None and block_number >= fork:
+                to_send.append({**payload, "finalized": False, "removed": True})
+                del self.pending[tx_hash]
+            elif block_number <= head - self.depth and canonical.get(block_number) == entry["block_hash"]:
+                to_send.append({**payload, "finalized": True})
+                del self.pending[tx_hash]
+
+        # Keep only hashes that can still change: above the fork and within depth of the head
+        for n in list(self.block_hashes):
+            if (fork is not None and n >= fork) or n < head - self.depth:
+                del self.block_hashes[n]
+        self._persist()
+        return to_send, fork
@@ -1,21 +1,26 @@
 """WattWitness BatchProcessed listener (inside RaspberryPi folder).
 Run with:
-   python -m RaspberryPi.listener.main [--once] [--address CONTRACT_ADDRESS]
+   python -m RaspberryPi.listener.main [--once] [--address CONTRACT_ADDRESS | --all-installations] [--from-block N]
 """
 from __future__ import annotations
 
 import argparse
+import json
 import sys
+import threading
+import time
 from typing import Any
 
 import requests
-from tenacity import retry, wait_exponential, stop_after_attempt, retry_if_exception_type
 from web3 import Web3
-from web3.contract import Contract
 from web3.types import LogReceipt
 
 from . import config
-from .abi import ABI
+from .abi import ABI, BATCH_PROCESSED_SIGNATURE
+from .catchup import AdaptiveWindow, iter_block_ranges
+from .checkpoint import load_checkpoint, save_checkpoint
+from .confirmations import ConfirmationQueue, DatabaseConfirmationSink, HttpConfirmationSink
+from .finality import FinalityTracker, fetch_block_hashes
 
 
 def _init_web3() -> Web3:
@@ -27,24 +32,12 @@ def _init_web3() -> Web3:
     return w3
 
 
-def _load_contract(w3: Web3, contract_address: str) -> Contract:
-    return w3.eth.contract(address=Web3.to_checksum_address(contract_address), abi=ABI)
-
-
-@retry(wait=wait_exponential(multiplier=1, min=2, max=30), stop=stop_after_attempt(5), retry=retry_if_exception_type((requests.RequestException,)))
-def _post_mark_on_chain(payload: dict[str, Any]) -> None:
-    url = f"{config.API_BASE_URL.rstrip('/')}/api/v1/readings/mark-on-chain"
-    resp = requests.post(url, json=payload, timeout=config.REQUEST_TIMEOUT)
-    if resp.status_code >= 400:
-        raise requests.HTTPError(f"Backend responded with {resp.status_code}: {resp.text}", response=resp)
-    print(f"[API] Marked readings {payload['first_reading_id']}-{payload['last_reading_id']} on-chain.")
-
-
-def _process_event(event: LogReceipt) -> None:
+def _process_event(event: LogReceipt, installation_id: int | None = None) -> dict[str, Any]:
+    """Turn a decoded BatchProcessed event into a mark-on-chain payload."""
     args = event["args"]
     first_id = args["firstReadingId"]
     reading_count = args["readingCount"]
-    tx_hash = event["transactionHash"].hex()
+    tx_hash = Web3.to_hex(event["transactionHash"])
     block_number = event["blockNumber"]
     last_id = first_id + reading_count - 1
     payload = {
@@ -52,45 +45,265 @@ def _process_event(event: LogReceipt) -> None:
         "last_reading_id": last_id,
         "blockchain_tx_hash": tx_hash,
         "blockchain_block_number": block_number,
+        "merkle_root": "0x" + bytes(args["merkleRoot"]).hex(),
+    }
+    if installation_id is not None:
+        # The backend marks only this installation's readings in the range
+        payload["installation_id"] = installation_id
+    source = f"installation={installation_id} " if installation_id is not None else ""
+    print(f"[EVENT] {source}BatchProcessed first={first_id} count={reading_count} block={block_number}")
+    return payload
+
+
+def _confirmation_sink() -> Any:
+    """Apply confirmations directly to a co-located backend database, else through the API."""
+    if config.CONFIRMATION_MODE in ("db", "auto"):
+        try:
+            sink = DatabaseConfirmationSink(config.BACKEND_DIR, allow_remote=config.CONFIRMATION_MODE == "db")
+            print("[CONFIG] Confirming batches directly in the backend database")
+            return sink
+        except Exception as e:
+            if config.CONFIRMATION_MODE == "db":
+                raise RuntimeError(f"CONFIRMATION_MODE=db but the backend database is unusable: {e}") from e
+            print(f"[CONFIG] Direct database confirmations unavailable, using {config.API_BASE_URL}: {e}")
+    return HttpConfirmationSink(config.API_BASE_URL, config.REQUEST_TIMEOUT)
+
+
+def _initial_last_processed(w3: Web3, from_block: int | None = None) -> int:
+    """Resume from the checkpoint file, an explicit start block or a short lookback."""
+    if from_block is not None:
+        print(f"[CHECKPOINT] Starting from requested block {from_block}")
+        return from_block - 1
+    checkpoint = load_checkpoint(config.CHECKPOINT_FILE)
+    if checkpoint is not None:
+        print(f"[CHECKPOINT] Resuming after block {checkpoint} ({config.CHECKPOINT_FILE})")
+        return checkpoint
+    start_block = max(0, w3.eth.block_number - config.START_BLOCK_LOOKBACK)
+    print(f"[CHECKPOINT] No checkpoint found, starting from block {start_block}")
+    return start_block - 1
+
+
+BATCH_PROCESSED_TOPIC = Web3.to_hex(Web3.keccak(text=BATCH_PROCESSED_SIGNATURE))
+
+# Shared across passes so a window learned during backfill carries over
+_window = AdaptiveWindow(config.GET_LOGS_BLOCK_RANGE, maximum=config.GET_LOGS_MAX_BLOCK_RANGE)
+
+
+def _fetch_logger_addresses() -> dict[str, int]:
+    """Map every installation's logger contract (checksum address) to its installation id."""
+    url = f"{config.API_BASE_URL.rstrip('/')}/api/v1/installations/"
+    resp = requests.get(url, timeout=config.REQUEST_TIMEOUT)
+    resp.raise_for_status()
+    return {
+        Web3.to_checksum_address(inst["logger_contract_address"]): inst["id"]
+        for inst in resp.json()
+        if inst.get("logger_contract_address")
     }
-    print(f"[EVENT] BatchProcessed first={first_id} count={reading_count} block={block_number}")
+
+
+def _get_batch_logs(w3: Web3, addresses: dict[str, int | None], from_block: int, to_block: int) -> list[LogReceipt]:
+    """One eth_getLogs call for BatchProcessed logs of all *addresses* in the block range."""
+    return w3.eth.get_logs({
+        "fromBlock": from_block,
+        "toBlock": to_block,
+        "address": list(addresses),
+        "topics": [BATCH_PROCESSED_TOPIC],
+    })
+
+
+def _route_logs(decoder: Any, addresses: dict[str, int | None], logs: list[LogReceipt], queue: ConfirmationQueue,
+                tracker: FinalityTracker, head: int) -> None:
+    """Decode *logs*, attribute them to their installation and queue the confirmations."""
+    payloads = []
+    for log in logs:
+        installation_id = addresses.get(Web3.to_checksum_address(log["address"]))
+        payload = _process_event(decoder.process_log(log), installation_id)
+        payloads.append(tracker.observe(payload, Web3.to_hex(log["blockHash"]), head))
+    queue.extend(payloads)
+
+
+def _process_range(w3: Web3, decoder: Any, addresses: dict[str, int | None], from_block: int, to_block: int,
+                   queue: ConfirmationQueue, tracker: FinalityTracker) -> None:
+    """Fetch and route BatchProcessed logs of *addresses* between two blocks (no checkpoint)."""
+    if not addresses:
+        return
+    fetch = lambda a, b: _get_batch_logs(w3, addresses, a, b)  # noqa: E731
+    for _, _, logs in iter_block_ranges(fetch, from_block, to_block, _window, config.CATCHUP_WORKERS):
+        _route_logs(decoder, addresses, logs, queue, tracker, to_block)
+
+
+def _check_finality(tracker: FinalityTracker, queue: ConfirmationQueue, head: int, last_processed: int,
+                    fetch_hashes: Any) -> int:
+    """Promote/revert pending confirmations; on a reorg, rewind *last_processed* to before the fork."""
+    to_send, fork = tracker.verify(head, fetch_hashes)
+    queue.extend(to_send)
+    promoted = sum(1 for p in to_send if p.get("finalized"))
+    if promoted:
+        print(f"[FINALITY] {promoted} batch(es) reached {tracker.depth} confirmations")
+    if fork is not None:
+        reverted = len(to_send) - promoted
+        print(f"[REORG] Chain reorganised at block {fork}: reverting {reverted} pending batch(es), rescanning")
+        if last_processed >= fork:
+            last_processed = fork - 1
+            save_checkpoint(config.CHECKPOINT_FILE, last_processed)
+    return last_processed
+
+
+def _catch_up(w3: Web3, decoder: Any, addresses: dict[str, int | None], last_processed: int,
+              queue: ConfirmationQueue, tracker: FinalityTracker, fetch_hashes: Any) -> int:
+    """Process every BatchProcessed log after *last_processed*, checkpointing after each chunk.
+
+    Returns the last fully processed block, which may be short of the chain head if
+    a chunk failed; the next pass resumes from there.
+    """
+    head = w3.eth.get_block("latest")
+    latest = head["number"]
+    last_processed = _check_finality(tracker, queue, latest, last_processed, fetch_hashes)
+    if latest <= last_processed:
+        return last_processed
+    if not addresses:
+        save_checkpoint(config.CHECKPOINT_FILE, latest)
+        return latest
+    fetch = lambda a, b: _get_batch_logs(w3, addresses, a, b)  # noqa: E731
     try:
-        _post_mark_on_chain(payload)
+        for _, to_block, logs in iter_block_ranges(fetch, last_processed + 1, latest, _window, config.CATCHUP_WORKERS):
+            # Confirmations are spooled to disk before the checkpoint moves past them
+            _route_logs(decoder, addresses, logs, queue, tracker, latest)
+            save_checkpoint(config.CHECKPOINT_FILE, to_block)
+            last_processed = to_block
     except Exception as e:
-        print(f"[ERR] Backend update failed: {e}")
+        print(f"[ERR] Catch-up stopped after block {last_processed}: {e}")
+    if last_processed == latest:
+        # Lets the next pass notice a reorg that replaced blocks without pending events
+        tracker.remember_block(latest, Web3.to_hex(head["hash"]))
+    return last_processed
 
 
-def _event_loop(contract: Contract) -> None:
-    poll_interval = 30
-    w3 = contract.w3
-    start_block = max(0, w3.eth.block_number - 50)
-    last_processed = start_block - 1
-    print(f"Starting polling from block {start_block} (current {w3.eth.block_number})")
-    import time
+def _open_subscription(addresses: dict[str, int | None]) -> Any:
+    """Subscribe to BatchProcessed logs of *addresses* over WebSocket; returns the open connection."""
+    from websockets.sync.client import connect
+
+    ws = connect(config.WS_RPC_URL, open_timeout=config.REQUEST_TIMEOUT)
+    try:
+        ws.send(json.dumps({
+            "jsonrpc": "2.0",
+            "id": 1,
+            "method": "eth_subscribe",
+            "params": ["logs", {"address": list(addresses), "topics": [BATCH_PROCESSED_TOPIC]}],
+        }))
+        reply = json.loads(ws.recv(timeout=config.REQUEST_TIMEOUT))
+        if "error" in reply:
+            raise RuntimeError(f"eth_subscribe rejected: {reply['error']}")
+    except Exception:
+        ws.close()
+        raise
+    print(f"[WS] Subscribed to BatchProcessed logs of {len(addresses)} contract(s) (subscription {reply.get('result')})")
+    return ws
+
+
+def _wait_for_push(ws: Any, timeout: float) -> None:
+    """Block until a subscription notification arrives or *timeout* seconds pass."""
+    try:
+        ws.recv(timeout=timeout)
+    except TimeoutError:
+        return
+    # Drain notifications that arrived together; one catch-up pass covers them all
     while True:
         try:
-            latest = w3.eth.block_number
-            if latest > last_processed:
-                logs = contract.events.BatchProcessed.get_logs(from_block=last_processed + 1, to_block=latest)
-                for log in logs:
-                    _process_event(log)
-                last_processed = latest
+            ws.recv(timeout=0)
+        except TimeoutError:
+            return
+
+
+def _event_loop(w3: Web3, addresses: dict[str, int | None] | None, from_block: int | None = None,
+                sink: Any = None, stop: threading.Event | None = None) -> None:
+    """Catch up on new blocks whenever a push arrives, or every POLL_INTERVAL seconds.
+
+    Notifications are only used as a wake-up signal: every pass re-reads the range
+    from the checkpoint with get_logs, so a dropped socket can never lose events.
+    With *addresses* None the watch list is every installation's logger, reloaded
+    from the backend every INSTALLATIONS_REFRESH_INTERVAL seconds. *sink* overrides
+    the configured confirmation sink and *stop* ends the loop once set (both used
+    by the offline benchmark).
+    """
+    decoder = w3.eth.contract(abi=ABI).events.BatchProcessed()
+    queue = ConfirmationQueue(config.CONFIRMATION_SPOOL_FILE, sink or _confirmation_sink(),
+                              config.CONFIRMATION_REJECTED_FILE)
+    tracker = FinalityTracker(config.CONFIRMATION_DEPTH, config.FINALITY_STATE_FILE)
+    rpc_session = requests.Session()
+    fetch_hashes = lambda numbers: fetch_block_hashes(rpc_session, config.RPC_URL, numbers, config.REQUEST_TIMEOUT)  # noqa: E731
+    watch_all = addresses is None
+    last_processed = _initial_last_processed(w3, from_block)
+    listed_at_block = last_processed
+    next_refresh = 0.0
+    addresses = addresses or {}
+    ws = None
+    next_ws_attempt = 0.0
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        try:
+            if watch_all and time.monotonic() >= next_refresh:
+                fresh = _fetch_logger_addresses()
+                next_refresh = time.monotonic() + config.INSTALLATIONS_REFRESH_INTERVAL
+                added = {a: i for a, i in fresh.items() if a not in addresses}
+                if fresh != addresses:
+                    print(f"[CONFIG] Watching {len(fresh)} logger contract(s) ({len(added)} new)")
+                    # Loggers deployed since the last refresh (the first ones too) may already have emitted events
+                    if added and last_processed > listed_at_block:
+                        _process_range(w3, decoder, added, listed_at_block + 1, last_processed, queue, tracker)
+                    addresses = fresh
+                    if ws is not None:
+                        ws.close()
+                        ws = None
+                        next_ws_attempt = 0.0
+                listed_at_block = last_processed
+            last_processed = _catch_up(w3, decoder, addresses, last_processed, queue, tracker, fetch_hashes)
+            # All events of this cycle go to the backend in one bulk call
+            queue.flush()
         except KeyboardInterrupt:
             print("Interrupted, exiting.")
             break
         except Exception as e:
             print(f"[ERR] Polling error: {e}")
-        time.sleep(poll_interval)
+
+        try:
+            if config.WS_RPC_URL and addresses and ws is None and time.monotonic() >= next_ws_attempt:
+                try:
+                    ws = _open_subscription(addresses)
+                except Exception as e:
+                    print(f"[WS] Subscription unavailable, polling every {config.POLL_INTERVAL}s: {e}")
+                    next_ws_attempt = time.monotonic() + config.WS_RETRY_INTERVAL
+            if ws is not None:
+                try:
+                    _wait_for_push(ws, config.POLL_INTERVAL)
+                except Exception as e:
+                    print(f"[WS] Connection lost, falling back to polling: {e}")
+                    ws.close()
+                    ws = None
+                    next_ws_attempt = time.monotonic() + config.WS_RETRY_INTERVAL
+            else:
+                stop.wait(config.POLL_INTERVAL)
+        except KeyboardInterrupt:
+            print("Interrupted, exiting.")
+            break
+    if ws is not None:
+        ws.close()
 
 
 def main(argv: list[str] | None = None) -> None:
     parser = argparse.ArgumentParser(description="Listener for WattWitness BatchProcessed events")
     parser.add_argument("--once", action="store_true", help="connectivity test")
     parser.add_argument("--address", help="Override contract address")
+    parser.add_argument("--from-block", type=int, help="Ignore the checkpoint and start at this block")
+    parser.add_argument("--all-installations", action="store_true", default=config.WATCH_ALL_INSTALLATIONS,
+                        help="Watch every installation's logger contract listed by the backend")
     args = parser.parse_args(argv)
 
-    # Determine contract address
-    if args.address:
+    # Determine contract address(es)
+    if args.all_installations:
+        contract_address = None
+        print("[CONFIG] Watching logger contracts of all installations")
+    elif args.address:
         contract_address = args.address
         print(f"[CONFIG] Using provided contract address: {contract_address}")
     elif config.CONTRACT_ADDRESS:
@@ -100,17 +313,22 @@ def main(argv: list[str] | None = None) -> None:
         print("[ERR] No contract address configured!")
         print("[ERR] Please set CONTRACT_ADDRESS in .env file or use --address flag")
         print("[ERR] Example .env entry: CONTRACT_ADDRESS=0x6A4E5cD0C47c006D95d6e360Ff5d7Af8a09538D8")
+        print("[ERR] Or set WATCH_ALL_INSTALLATIONS=1 / --all-installations to watch every installation")
         sys.exit(1)
 
     w3 = _init_web3()
-    contract = _load_contract(w3, contract_address)
-    print(f"[CONFIG] Monitoring contract: {contract_address}")
+    if contract_address:
+        addresses = {Web3.to_checksum_address(contract_address): None}
+        print(f"[CONFIG] Monitoring contract: {contract_address}")
+    else:
+        addresses = None
+        print(f"[CONFIG] Monitoring {len(_fetch_logger_addresses())} logger contract(s) from {config.API_BASE_URL}")
     
     if args.once:
         print("Connectivity OK. Exiting.")
         return
-    _event_loop(contract)
+    _event_loop(w3, addresses, args.from_block)
 
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
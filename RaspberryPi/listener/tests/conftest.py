@@ -0,0 +1,58 @@
+import sys
+from pathlib import Path
+
+import pytest
+from web3 import Web3
+
+# Ensure the RaspberryPi package is importable before other imports
+sys.path.append(str(Path(__file__).resolve().parents[3]))
+
+from RaspberryPi.listener import config
+from RaspberryPi.listener.fakechain import FakeChain, serve_http
+
+
+@pytest.fixture
+def chain():
+    """Seeded fake chain with one logger contract and no history yet"""
+    return FakeChain(contracts=["0x" + "11" * 20], seed=1)
+
+
+@pytest.fixture
+def rpc_url(chain):
+    server = serve_http(chain)
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def w3(rpc_url):
+    return Web3(Web3.HTTPProvider(rpc_url, request_kwargs={"timeout": 5}))
+
+
+@pytest.fixture
+def state_files(tmp_path, monkeypatch):
+    """Point the listener's checkpoint, spool and finality files at tmp_path"""
+    monkeypatch.setattr(config, "CHECKPOINT_FILE", str(tmp_path / "checkpoint.json"))
+    monkeypatch.setattr(config, "CONFIRMATION_SPOOL_FILE", str(tmp_path / "confirmations.json"))
+    monkeypatch.setattr(config, "CONFIRMATION_REJECTED_FILE", str(tmp_path / "rejected.json"))
+    monkeypatch.setattr(config, "FINALITY_STATE_FILE", str(tmp_path / "finality.json"))
+    return tmp_path
+
+
+class RecordingSink:
+    """Accepts every confirmation and remembers what was sent"""
+
+    name = "test"
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, batches):
+        self.sent.extend(batches)
+        return [{**b, "status": "marked", "updated_count": 0} for b in batches]
+
+
+@pytest.fixture
+def sink():
+    return RecordingSink()
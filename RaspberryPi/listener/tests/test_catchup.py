@@ -0,0 +1,80 @@
+import pytest
+
+from RaspberryPi.listener import config
+from RaspberryPi.listener import main as listener
+from RaspberryPi.listener.abi import ABI
+from RaspberryPi.listener.catchup import AdaptiveWindow, iter_block_ranges
+from RaspberryPi.listener.checkpoint import load_checkpoint
+from RaspberryPi.listener.confirmations import ConfirmationQueue
+from RaspberryPi.listener.finality import FinalityTracker
+
+
+def test_window_shrinks_on_too_many_results_and_grows_back(chain):
+    # One event per block, at most 5 logs per eth_getLogs call
+    chain.max_logs_per_query = 5
+    chain.prefill(100, 1)
+    calls = []
+    sizes = []
+
+    def fetch(from_block, to_block):
+        calls.append((from_block, to_block))
+        sizes.append(window.size)
+        return chain.call("eth_getLogs", [{"fromBlock": hex(from_block), "toBlock": hex(to_block)}])
+
+    window = AdaptiveWindow(64, maximum=64)
+    ranges = list(iter_block_ranges(fetch, 1, 100, window))
+    # Ranges come back in order, without gaps, and every event is fetched once
+    assert ranges[0][0] == 1 and ranges[-1][1] == 100
+    assert all(prev[1] + 1 == nxt[0] for prev, nxt in zip(ranges, ranges[1:]))
+    assert sum(len(logs) for _, _, logs in ranges) == 100
+    assert all(to_block - from_block < 5 for from_block, to_block, _ in ranges)
+    assert (1, 64) in calls
+    assert min(sizes) < 5
+
+    # Once the provider stops complaining the window grows back to its maximum
+    chain.max_logs_per_query = 10000
+    chain.prefill(400, 1)
+    assert sum(len(logs) for _, _, logs in iter_block_ranges(fetch, 101, 500, window)) == 400
+    assert window.size == 64
+
+
+@pytest.fixture
+def catch_up(w3, chain, state_files, sink, monkeypatch):
+    monkeypatch.setattr(listener, "_window", AdaptiveWindow(10, maximum=10))
+    monkeypatch.setattr(config, "CATCHUP_WORKERS", 1)
+    decoder = w3.eth.contract(abi=ABI).events.BatchProcessed()
+    addresses = {chain.contracts[0]: 7}
+    queue = ConfirmationQueue(config.CONFIRMATION_SPOOL_FILE, sink, config.CONFIRMATION_REJECTED_FILE)
+    tracker = FinalityTracker(0, config.FINALITY_STATE_FILE)
+
+    def run(last_processed):
+        return listener._catch_up(w3, decoder, addresses, last_processed, queue, tracker, lambda numbers: {})
+
+    run.queue = queue
+    return run
+
+
+def test_failed_chunk_keeps_the_checkpoint(chain, catch_up, monkeypatch):
+    chain.prefill(50, 1)
+    get_batch_logs = listener._get_batch_logs
+    failing = {"from": 31}
+
+    def flaky_get_batch_logs(w3, addresses, from_block, to_block):
+        if failing and from_block >= failing["from"]:
+            raise ConnectionError("connection reset by peer")
+        return get_batch_logs(w3, addresses, from_block, to_block)
+
+    monkeypatch.setattr(listener, "_get_batch_logs", flaky_get_batch_logs)
+
+    # Chunks 1-10, 11-20 and 21-30 are spooled and checkpointed; 31-40 fails
+    assert catch_up(0) == 30
+    assert load_checkpoint(config.CHECKPOINT_FILE) == 30
+    assert len(catch_up.queue) == 30
+    assert max(p["blockchain_block_number"] for p in catch_up.queue._pending.values()) == 30
+    assert all(p["installation_id"] == 7 for p in catch_up.queue._pending.values())
+
+    # The next pass resumes after the checkpoint instead of skipping the failed chunk
+    failing.clear()
+    assert catch_up(load_checkpoint(config.CHECKPOINT_FILE)) == 50
+    assert load_checkpoint(config.CHECKPOINT_FILE) == 50
+    assert len(catch_up.queue) == 50
@@ -0,0 +1,56 @@
+import json
+
+from RaspberryPi.listener import config
+from RaspberryPi.listener.confirmations import ConfirmationQueue, PermanentConfirmationError
+
+
+def payload(tx_hash, first_id):
+    return {"first_reading_id": first_id, "last_reading_id": first_id + 19, "blockchain_tx_hash": tx_hash,
+            "blockchain_block_number": 100}
+
+
+class RejectingSink:
+    """Rejects any bulk call containing the 0xbad confirmation"""
+
+    name = "test"
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, batches):
+        if any(b["blockchain_tx_hash"] == "0xbad" for b in batches):
+            raise PermanentConfirmationError("Backend rejected with 422: bad batch")
+        self.sent.extend(batches)
+        return [{**b, "status": "marked", "updated_count": 20} for b in batches]
+
+
+def test_rejected_confirmation_is_parked(state_files):
+    sink = RejectingSink()
+    queue = ConfirmationQueue(config.CONFIRMATION_SPOOL_FILE, sink, config.CONFIRMATION_REJECTED_FILE)
+    queue.extend([payload("0xaaa", 1), payload("0xbad", 21), payload("0xccc", 41), payload("0xddd", 61)])
+    queue.flush()
+
+    # The offending confirmation is isolated; the rest go through
+    assert [b["blockchain_tx_hash"] for b in sink.sent] == ["0xaaa", "0xccc", "0xddd"]
+    assert len(queue) == 0
+    with open(config.CONFIRMATION_REJECTED_FILE) as f:
+        rejected = json.load(f)
+    assert [r["payload"]["blockchain_tx_hash"] for r in rejected] == ["0xbad"]
+    assert "422" in rejected[0]["reason"]
+
+    # Parked confirmations are not resent after a restart
+    assert len(ConfirmationQueue(config.CONFIRMATION_SPOOL_FILE, sink, config.CONFIRMATION_REJECTED_FILE)) == 0
+
+
+def test_confirmations_are_kept_on_transport_error(state_files):
+    class DownSink:
+        name = "test"
+
+        def send(self, batches):
+            raise ConnectionError("backend unreachable")
+
+    queue = ConfirmationQueue(config.CONFIRMATION_SPOOL_FILE, DownSink(), config.CONFIRMATION_REJECTED_FILE)
+    queue.extend([payload("0xaaa", 1)])
+    queue.flush()
+    assert len(queue) == 1
+    assert len(ConfirmationQueue(config.CONFIRMATION_SPOOL_FILE, DownSink(), config.CONFIRMATION_REJECTED_FILE)) == 1
@@ -0,0 +1,80 @@
+import pytest
+import requests
+
+from RaspberryPi.listener.finality import FinalityTracker, fetch_block_hashes
+
+
+@pytest.fixture
+def fetch_hashes(rpc_url):
+    session = requests.Session()
+    return lambda numbers: fetch_block_hashes(session, rpc_url, numbers, 5)
+
+
+def mine_event(chain):
+    """Mine a block with one BatchProcessed log; returns its payload and block hash"""
+    number = chain.mine(1)
+    log = chain.logs[number][0]
+    payload = {"first_reading_id": 1, "last_reading_id": 20, "blockchain_tx_hash": log["transactionHash"],
+               "blockchain_block_number": number}
+    return payload, log["blockHash"]
+
+
+def test_pending_event_is_finalized_at_depth(chain, fetch_hashes, tmp_path):
+    chain.prefill(10, 0)
+    tracker = FinalityTracker(3, tmp_path / "finality.json")
+    payload, block_hash = mine_event(chain)
+    assert tracker.observe(payload, block_hash, chain.head)["finalized"] is False
+
+    chain.prefill(2, 0)
+    assert tracker.verify(chain.head, fetch_hashes) == ([], None)
+    chain.mine()
+    to_send, fork = tracker.verify(chain.head, fetch_hashes)
+    assert fork is None
+    assert to_send == [{**payload, "finalized": True}]
+    assert tracker.pending == {}
+
+
+def test_reorg_at_tracked_block_reverts_the_event(chain, fetch_hashes, tmp_path):
+    chain.prefill(10, 0)
+    tracker = FinalityTracker(3, tmp_path / "finality.json")
+    tracker.remember_block(chain.head, chain.hashes[chain.head])
+    payload, block_hash = mine_event(chain)
+    tracker.observe(payload, block_hash, chain.head)
+
+    # The event's block is replaced and its transaction dropped
+    chain.reorg(1, drop_rate=1.0)
+    to_send, fork = tracker.verify(chain.head, fetch_hashes)
+    assert fork == payload["blockchain_block_number"]
+    assert to_send == [{**payload, "finalized": False, "removed": True}]
+    assert tracker.pending == {}
+
+    # Pending events survive a restart
+    payload, block_hash = mine_event(chain)
+    tracker.observe(payload, block_hash, chain.head)
+    assert list(FinalityTracker(3, tmp_path / "finality.json").pending) == [payload["blockchain_tx_hash"]]
+
+
+def test_reorg_between_tracked_blocks_rewinds_past_the_last_matching_block(chain, fetch_hashes, tmp_path):
+    chain.prefill(10, 0)
+    tracker = FinalityTracker(10, tmp_path / "finality.json")
+    payload, block_hash = mine_event(chain)
+    tracker.observe(payload, block_hash, chain.head)
+    chain.prefill(5, 0)
+    tracker.remember_block(chain.head, chain.hashes[chain.head])
+
+    # Blocks 13-16 are replaced: the event's block 11 still matches, only the remembered head does not
+    chain.reorg(4)
+    to_send, fork = tracker.verify(chain.head, fetch_hashes)
+    assert fork == payload["blockchain_block_number"] + 1
+    assert to_send == []
+    assert list(tracker.pending) == [payload["blockchain_tx_hash"]]
+
+
+def test_reorg_below_every_tracked_block_assumes_the_deepest_reorg(chain, fetch_hashes, tmp_path):
+    chain.prefill(20, 0)
+    tracker = FinalityTracker(5, tmp_path / "finality.json")
+    tracker.remember_block(chain.head, chain.hashes[chain.head])
+
+    chain.reorg(3)
+    _, fork = tracker.verify(chain.head, fetch_hashes)
+    assert fork == chain.head - 5
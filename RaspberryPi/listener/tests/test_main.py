@@ -0,0 +1,30 @@
+import threading
+
+from RaspberryPi.listener import config
+from RaspberryPi.listener import main as listener
+
+
+def test_first_loggers_are_backfilled(w3, chain, rpc_url, state_files, sink, monkeypatch):
+    chain.prefill(20, 1)
+    monkeypatch.setattr(config, "RPC_URL", rpc_url)
+    monkeypatch.setattr(config, "WS_RPC_URL", "")
+    monkeypatch.setattr(config, "POLL_INTERVAL", 0.05)
+    monkeypatch.setattr(config, "INSTALLATIONS_REFRESH_INTERVAL", 0)
+    monkeypatch.setattr(config, "CONFIRMATION_DEPTH", 0)
+    # The fleet is empty on the first refresh; the checkpoint then moves past the logger's events
+    listings = iter([{}])
+    monkeypatch.setattr(listener, "_fetch_logger_addresses", lambda: next(listings, {chain.contracts[0]: 7}))
+
+    stop = threading.Event()
+    loop = threading.Thread(target=listener._event_loop, args=(w3, None, 1, sink, stop), daemon=True)
+    loop.start()
+    try:
+        for _ in range(100):
+            if len(sink.sent) >= 20:
+                break
+            stop.wait(0.05)
+    finally:
+        stop.set()
+        loop.join(timeout=5)
+    assert len(sink.sent) == 20
+    assert all(b["installation_id"] == 7 for b in sink.sent)
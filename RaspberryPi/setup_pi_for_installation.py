@@ -7,9 +7,13 @@ This script:
 2. Creates/updates the listener .env file with the correct logger contract address
 3. Optionally sets up the systemd service
 
+With --all-installations the listener is configured to watch the logger contracts of
+every installation known to the backend from a single process.
+
 Usage:
     python setup_pi_for_installation.py --installation-id 1 --api-url https://wattwitness-api.loca.lt
     python setup_pi_for_installation.py --installation-id 1 --setup-service
+    python setup_pi_for_installation.py --all-installations --api-url https://wattwitness-api.loca.lt
 """
 
 import argparse
@@ -95,6 +99,51 @@ REQUEST_TIMEOUT=10
     print(f"🔗 Monitoring logger contract: {logger_address}")
 
 
+def create_fleet_listener_env(api_url: str, rpc_url: str = None) -> None:
+    """Create/update the listener .env file for multi-contract mode (all installations)."""
+    listener_dir = Path(__file__).parent / "listener"
+    env_file = listener_dir / ".env"
+    
+    try:
+        response = requests.get(f"{api_url.rstrip('/')}/api/v1/installations/", timeout=10)
+        response.raise_for_status()
+        installations = response.json()
+    except requests.RequestException as e:
+        print(f"❌ Failed to fetch installations: {e}")
+        sys.exit(1)
+    
+    with_logger = [i for i in installations if i.get("logger_contract_address")]
+    print(f"📋 {len(with_logger)} of {len(installations)} installations have a logger contract")
+    
+    # Default RPC URL
+    if not rpc_url:
+        rpc_url = "https://avalanche-fuji.infura.io/v3/5988071a0489487a9507da0ba450cc23"
+    
+    env_content = f"""# WattWitness Listener Configuration
+# Generated for all installations (multi-contract mode)
+
+# Avalanche Fuji RPC endpoint
+RPC_URL={rpc_url}
+
+# Watch every installation's logger contract listed by the backend
+WATCH_ALL_INSTALLATIONS=1
+
+# Seconds between reloads of the installation list
+INSTALLATIONS_REFRESH_INTERVAL=300
+
+# Backend API URL
+API_BASE_URL={api_url}
+
+# Request timeout in seconds
+REQUEST_TIMEOUT=10
+"""
+    
+    print(f"📝 Writing listener configuration to {env_file}")
+    env_file.write_text(env_content)
+    
+    print("✅ Listener .env file created successfully!")
+
+
 def setup_systemd_service() -> None:
     """Setup the systemd service for the listener."""
     service_file = Path(__file__).parent / "listener" / "wattwitness-listener.service"
@@ -114,8 +163,10 @@ def setup_systemd_service() -> None:
 
 def main():
     parser = argparse.ArgumentParser(description="Setup Pi for WattWitness installation")
-    parser.add_argument("--installation-id", type=int, required=True, 
+    parser.add_argument("--installation-id", type=int,
                        help="Installation ID from backend database")
+    parser.add_argument("--all-installations", action="store_true",
+                       help="Configure one listener for every installation's logger contract")
     parser.add_argument("--api-url", default="https://wattwitness-api.loca.lt",
                        help="Backend API URL")
     parser.add_argument("--rpc-url", 
@@ -127,6 +178,18 @@ def main():
     
     args = parser.parse_args()
     
+    if args.all_installations:
+        create_fleet_listener_env(args.api_url, args.rpc_url)
+        if args.setup_service:
+            setup_systemd_service()
+        print("\n🎉 Pi setup complete!")
+        print("\n🚀 Start monitoring with:")
+        print("   cd RaspberryPi && python -m listener.main")
+        return
+    
+    if args.installation_id is None:
+        parser.error("--installation-id is required unless --all-installations is given")
+    
     print(f"🔍 Fetching installation {args.installation_id} from {args.api_url}")
     installation = fetch_installation_details(args.installation_id, args.api_url)
     
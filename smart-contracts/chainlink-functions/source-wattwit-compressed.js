@@ -7,6 +7,8 @@
 const WATTWIT_API_URL = "https://wattwitness-api.loca.lt";
 const INSTALLATION_ID = 1; // Hackathon Test 1
 const MAX_BATCH_SIZE = 20; // Target batch size
+// Lease key from the logger contract (args[0]), identical on every DON node of one request
+const LEASE_KEY = typeof args !== "undefined" && args.length > 0 ? args[0] : "";
 
 // Compression functions (inline for Functions execution)
 function compressReadings(readings) {
@@ -148,7 +150,12 @@ async function main() {
         let data;
         
         try {
-            const endpoint = `${WATTWIT_API_URL}/api/v1/readings/pending`;
+            // Only lease as many readings as this batch can carry; the shared lease key makes every
+            // node get the same range, so their responses agree
+            let endpoint = `${WATTWIT_API_URL}/api/v1/readings/pending?limit=${MAX_BATCH_SIZE}`;
+            if (LEASE_KEY) {
+                endpoint += `&lease_key=${encodeURIComponent(LEASE_KEY)}`;
+            }
             console.log(`Fetching from: ${endpoint}`);
             
             const apiRequest = Functions.makeHttpRequest({
@@ -33,6 +33,9 @@ contract WattWitnessDataLogger is FunctionsClient, ConfirmedOwner {
     // Default maximum readings per compressed batch
     uint16 public maxBatchSize = 20;
 
+    // Number of requests sent; makes each request's pending-readings lease key unique
+    uint256 public requestNonce;
+
     // Compressed batch metadata structure
     struct BatchMetadata {
         uint32 firstReadingId;
@@ -102,6 +105,12 @@ contract WattWitnessDataLogger is FunctionsClient, ConfirmedOwner {
     function requestWattWitnessData() external returns (bytes32 requestId) {
         FunctionsRequest.Request memory req;
         req.initializeRequestForInlineJavaScript(source);
+
+        // Every DON node fetches pending readings on its own; a shared lease key makes the
+        // backend hand all of them the same range
+        string[] memory args = new string[](1);
+        args[0] = _toHexString(keccak256(abi.encode(block.chainid, address(this), ++requestNonce)));
+        req.setArgs(args);
         
         if (encryptedSecretsUrls.length > 0) {
             req.addSecretsReference(encryptedSecretsUrls);
@@ -223,6 +232,19 @@ contract WattWitnessDataLogger is FunctionsClient, ConfirmedOwner {
 
     // ========== INTERNAL FUNCTIONS ==========
 
+    /**
+     * @notice Lowercase hex encoding of a bytes32, without 0x prefix
+     */
+    function _toHexString(bytes32 value) internal pure returns (string memory) {
+        bytes16 digits = "0123456789abcdef";
+        bytes memory out = new bytes(64);
+        for (uint256 i = 0; i < 32; i++) {
+            out[2 * i] = digits[uint8(value[i]) >> 4];
+            out[2 * i + 1] = digits[uint8(value[i]) & 0x0f];
+        }
+        return string(out);
+    }
+
     /**
      * @dev Internalised version of decompression loop to avoid external CALL overhead
      */